@@ -170,7 +170,8 @@ package body Completion.Python is
                    Label    => To_Unbounded_String (Label),
                    Documentation => To_Unbounded_String (Documentation),
                    Action_Name => To_Unbounded_String (Action_Name),
-                   Icon_Name => To_Unbounded_String (Icon_Name));
+                   Icon_Name => To_Unbounded_String (Icon_Name),
+                   Object    => No_Class_Instance);
 
       return Proposal;
    end Create_Simple_Proposal;
@@ -198,6 +199,12 @@ package body Completion.Python is
          Nth_Arg (Fields, 3),
          Nth_Arg (Fields, 4),
          Nth_Arg (Fields, 5));
+
+      --  An empty documentation might be computed on demand
+      if Proposal.Documentation = Null_Unbounded_String then
+         Proposal.Object := Object;
+      end if;
+
       Free (Args);
       Free (Sub);
       Free (Fields);
@@ -274,6 +281,22 @@ package body Completion.Python is
    overriding function Get_Documentation
      (Proposal : Simple_Python_Completion_Proposal) return String is
    begin
+      if Proposal.Documentation = Null_Unbounded_String
+        and then Proposal.Object /= No_Class_Instance
+      then
+         declare
+            Sub    : Subprogram_Type :=
+              Get_Method (Proposal.Object, "get_documentation");
+            Script : constant Scripting_Language := Get_Script (Sub.all);
+            Args   : Callback_Data'Class := Create (Script, 0);
+            Doc    : constant String := Execute (Sub, Args);
+         begin
+            Free (Args);
+            Free (Sub);
+            return Doc;
+         end;
+      end if;
+
       return To_String (Proposal.Documentation);
    end Get_Documentation;
 
@@ -352,7 +375,8 @@ package body Completion.Python is
          Label         => Proposal.Label,
          Documentation => Proposal.Documentation,
          Icon_Name     => Proposal.Icon_Name,
-         Action_Name   => Proposal.Action_Name);
+         Action_Name   => Proposal.Action_Name,
+         Object        => Proposal.Object);
    end Deep_Copy;
 
    -----------------
@@ -7658,10 +7658,12 @@ class MemoryUsageProviderVisitor(object):
 
         :param modules: a list of (obj_file, lib_file, origin, size,
 
-            region_name, section_name) tuples describing modules, which are
-            file based split of ressources consumed: obj_file and lib_file
-            repectively correspond to the full paths of the object file and, if
-            any, of the library file for which this artifact was compiled.
+            region_name, section_name[, symbols]) tuples describing modules,
+            which are file based split of ressources consumed: obj_file and
+            lib_file repectively correspond to the full paths of the object
+            file and, if any, of the library file for which this artifact was
+            compiled. The optional symbols are a list of (name, origin, size)
+            tuples describing the symbols of the module.
         """
         pass  # implemented in Ada
 
@@ -9795,6 +9797,30 @@ class Search(object):
         :param flags: an integer, see :func:`GPS.Search.set_pattern`
         """
 
+    @staticmethod
+    def stream(contexts, pattern, flags=SUBSTRINGS, limit=None):
+        """
+        Searches in the background, without blocking GPS, and returns an
+        object whose `next_batch` method returns a promise for the next
+        list of results (or None when the search is finished). This is
+        meant to be used from a workflow::
+
+            stream = GPS.Search.stream(GPS.Search.FILE_NAMES, "foo")
+            while True:
+                batch = yield stream.next_batch()
+                if batch is None:
+                    break
+
+        The object also has a `cancel` method, and provides statistics for
+        each provider in its `stats` attribute.
+
+        :param contexts: a string or a list of strings, for example
+           GPS.Search.SOURCES
+        :param pattern: a string
+        :param flags: an integer, see :func:`GPS.Search.set_pattern`
+        :param limit: the maximum number of results, or None
+        """
+
     def __next__(self):
         """
         Results the next non-null result. This might take longer than
@@ -1272,6 +1272,20 @@ class Predefined_Hooks:
 
         """
 
+    # vcs_file_status_progress = 'vcs_file_status_progress'
+    def vcs_file_status_progress(name,done,total):
+        """
+      Emitted while the statuses are being sent to GPS in the background, after
+      each slice of files. `done` is the number of files processed so far, out of
+      `total`. Views can use it to refresh incrementally rather than waiting for
+      vcs_file_status_finished.
+
+      :param str name:
+      :param int done:
+      :param int total:
+
+        """
+
     # vcs_refresh = 'vcs_refresh'
     def vcs_refresh(name,is_file_saved):
         """
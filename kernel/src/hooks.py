@@ -531,6 +531,11 @@ executed command line as list of arguments''')]),
          Param('files',     'FileSet'),
          Param('props',     'VCS_File_Properties')]),
 
+    'vcs_file_status_progress_hooks': Hook_Type(
+        [Param('name', '__hookname__'),
+         Param('done', 'Integer'),
+         Param('total', 'Integer')]),
+
     'vcs_refresh_hooks': Hook_Type(
         [Param('name', '__hookname__'),
          Param('is_file_saved', 'Boolean')]),
@@ -1064,6 +1069,13 @@ details.'''),
     Hook('vcs_file_status_finished', 'simple_hooks', descr='''
 Emitted when finishing to recompute the statuses.'''),
 
+    Hook('vcs_file_status_progress', 'vcs_file_status_progress_hooks',
+         descr='''
+Emitted while the statuses are being sent to GPS in the background, after
+each slice of files. `done` is the number of files processed so far, out of
+`total`. Views can use it to refresh incrementally rather than waiting for
+vcs_file_status_finished.'''),
+
     Hook('vcs_active_changed', 'simple_hooks', descr='''
 Emitted when the active VCS has changed. This is the VCS on which operations
 like commit and log happen.'''),
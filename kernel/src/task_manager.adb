@@ -244,11 +244,17 @@ package body Task_Manager is
          Queue : Task_Queue_Access := Manager.Queues (Index);
          New_Queues : Task_Queue_Array
            (Manager.Queues'First .. Manager.Queues'Last - 1);
+
+         Notify : constant Boolean := Queue.Status /= Completed;
+         --  Interrupted queues have already been notified, when their
+         --  commands were freed.
+
+         Continue : Boolean;
       begin
          if Manager.Queues'Length = 1 then
             Unchecked_Free (Queue);
             Unchecked_Free (Manager.Queues);
-            return False;
+            Continue := False;
 
          else
             New_Queues (Manager.Queues'First .. Index - 1) :=
@@ -263,8 +269,18 @@ package body Task_Manager is
             Unchecked_Free (Queue);
             Unchecked_Free (Manager.Queues);
             Manager.Queues := new Task_Queue_Array'(New_Queues);
-            return True;
+            Continue := True;
          end if;
+
+         --  Run the hook once the queue has been removed, so that the
+         --  callbacks no longer see it in the list of tasks. Keep running
+         --  if they have created new tasks.
+
+         if Notify then
+            GPS.Kernel.Hooks.Task_Finished_Hook.Run (Manager.Kernel);
+         end if;
+
+         return Continue or else Manager.Queues /= null;
       end Free_Queue;
 
       Lowest        : Integer := Integer'Last;
@@ -351,15 +351,39 @@ package body Memory_Usage_Views.Scripts is
                                    Modules_List.Nth_Arg (J);
                   Region_Name  : constant String := Current.Nth_Arg (5);
                   Section_Name : constant String := Current.Nth_Arg (6);
+                  Module       : Module_Description :=
+                    Module_Description'
+                      (Obj_File => Create
+                         (Current.Nth_Arg (1), Normalize => True),
+                       Lib_File => Create
+                         (Current.Nth_Arg (2), Normalize => True),
+                       Origin   => Current.Nth_Arg (3),
+                       Size     => Current.Nth_Arg (4),
+                       Symbols  => <>);
                begin
+                  --  The list of symbols of the module is optional
+                  if Current.Number_Of_Arguments >= 7 then
+                     declare
+                        Symbols_List : constant List_Instance'Class :=
+                                         Current.Nth_Arg (7);
+                     begin
+                        for K in 1 .. Symbols_List.Number_Of_Arguments loop
+                           declare
+                              Symbol : constant List_Instance'Class :=
+                                         Symbols_List.Nth_Arg (K);
+                           begin
+                              Module.Symbols.Append
+                                (Symbol_Description'
+                                   (Name   => Symbol.Nth_Arg (1),
+                                    Origin => Symbol.Nth_Arg (2),
+                                    Size   => Symbol.Nth_Arg (3)));
+                           end;
+                        end loop;
+                     end;
+                  end if;
+
                   Regions (Region_Name).Sections (Section_Name).Modules.Append
-                    (Module_Description'
-                       (Obj_File => Create
-                           (Current.Nth_Arg (1), Normalize => True),
-                        Lib_File => Create
-                           (Current.Nth_Arg (2), Normalize => True),
-                        Origin   => Current.Nth_Arg (3),
-                        Size     => Current.Nth_Arg (4)));
+                    (Module);
                end;
             end loop;
 
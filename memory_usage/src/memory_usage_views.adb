@@ -20,6 +20,7 @@ with Ada.Strings.Maps.Constants;            use Ada.Strings.Maps.Constants;
 
 with Gdk.RGBA;
 with Glib;                                  use Glib;
+with Glib.Convert;
 with Glib.Values;                           use Glib.Values;
 with Glib_Values_Utils;                     use Glib_Values_Utils;
 with Gtk.Box;                               use Gtk.Box;
@@ -151,6 +152,7 @@ package body Memory_Usage_Views is
       Region_Iter  : Gtk_Tree_Iter;
       Section_Iter : Gtk_Tree_Iter;
       Module_Iter  : Gtk_Tree_Iter;
+      Symbol_Iter  : Gtk_Tree_Iter;
 
       function Get_Icon_Name
         (Memory_Region_Name : Unbounded_String) return String;
@@ -277,6 +279,18 @@ package body Memory_Usage_Views is
                for Module of Section.Modules loop
                   Self.Memory_Tree_Model.Append (Module_Iter, Section_Iter);
 
+                  for Symbol of Module.Symbols loop
+                     Self.Memory_Tree_Model.Append (Symbol_Iter, Module_Iter);
+
+                     Set_Values
+                       (Iter      => Symbol_Iter,
+                        Name      => Glib.Convert.Escape_Text
+                          (To_String (Symbol.Name)),
+                        Origin    => To_String (Symbol.Origin),
+                        Used_Size => Symbol.Size,
+                        Length    => Module.Size);
+                  end loop;
+
                   Set_Values
                     (Iter      => Module_Iter,
                      Name      => Get_Markup_For_Module (Module),
@@ -610,6 +610,18 @@ package body Python_Module is
         Kernel.Scripts.Lookup_Scripting_Language (Python_Name);
       Errors : Boolean;
 
+      function Is_Startup_Profiler (File : Virtual_File) return Boolean;
+      --  Whether File is the startup profiler, loaded before the others
+
+      -------------------------
+      -- Is_Startup_Profiler --
+      -------------------------
+
+      function Is_Startup_Profiler (File : Virtual_File) return Boolean is
+      begin
+         return File.Base_Name = "startup_profiler.py";
+      end Is_Startup_Profiler;
+
    begin
       --  Register GPS as GS to use both in transition period
       Script.Execute_Command
@@ -618,6 +630,13 @@ package body Python_Module is
          Errors       => Errors);
       pragma Assert (not Errors);
 
+      --  Import the startup profiler before any other plugin, so that it
+      --  can measure their loading when the STARTUP_PROFILE trace is active.
+      --  It is not loaded again by the Load_Dir below.
+      Load_Directory
+        (Script, Support_Core_Dir (Kernel),
+         Is_Startup_Profiler'Unrestricted_Access);
+
       Load_Dir (Kernel, Support_Core_Dir (Kernel), Default_Autoload => True,
                 Ignore_User_Config => True);
       Load_Dir (Kernel, Support_UI_Dir (Kernel), Default_Autoload => True,
@@ -30,6 +30,7 @@ graphical tree widget, which you can dynamically manipulate.
 
 from GPS import Console, EditorBuffer, File, Preference, Project, XMLViewer
 from gs_utils import interactive
+import import_graph
 import traceback
 import re
 import os
@@ -174,14 +175,14 @@ def compute_project_dependencies(output):
     try:
         depends_on = dict()
         current_deps = dict()
+        graph = import_graph.get_graph(include_implicit=True)
         for p in Project.root().dependencies(recursive=True):
             current_deps[p] = [cur for cur in p.dependencies(recursive=False)]
             tmp = dict()
             previous = p
             for s in p.sources(recursive=False):
-                for imp in s.imports(include_implicit=True,
-                                     include_system=False):
-                    ip = imp.project(default_to_root=False)
+                for imp in graph.imports(s):
+                    ip = graph.project(imp)
                     if ip and ip != p:
                         if show_single_file:
                             if ip != previous:
@@ -22,9 +22,13 @@ they might show references to entities even though these entities are in fact
 no longer used (which means GPS will not correctly report all cases of unused
 entities).
 
-Executing this script blocks the whole GPS interface, so it is normal that
-GPS becomes unresponsive. Depending of the size of your project, this can
-take a while to execute.
+The references are queried from the language server in the background,
+several at a time, and the unused entities are listed as soon as they are
+found. The progress is visible in the Task Manager. Depending of the size
+of your project, this can take a while to execute. The results are cached:
+running the search again only queries the entities declared in the files
+that were modified since, unless another file was modified in which case
+only the entities found to be used are kept from the previous search.
 Note that you can save the contents of the Locations window, after execution,
 through the GPS.Locations.dump() method in the python console.
 """
@@ -33,6 +37,15 @@ through the GPS.Locations.dump() method in the python console.
 # No user customization below this line
 #############################################################################
 
+import GPS
+import collections
+import os.path
+import re
+import time
+import urllib.parse
+import urllib.request
+import workflows
+import workflows.promises as promises
 from GPS import Preference, Project, Console, Editor, File, Locations, \
     EditorBuffer, MDI
 from gs_utils import interactive
@@ -51,6 +64,21 @@ Preference("Plugins/unused_entities/ignoreprj").create(
     select that project specifically.""",
     ",".join(xmlada_projects + aws_projects))
 
+MAX_REQUESTS = 16
+# Maximum number of references requests sent at once to the language server
+
+SYNC_BUDGET_MS = 50
+# Maximum time spent checking entities with is_unused, which is synchronous,
+# before giving back control to the interface
+
+_end_label_re = re.compile(r"\bend\s+([\w.]+\.)?$", re.IGNORECASE)
+# Matches the text before a reference which is the label of an "end"
+
+_verdicts = {}
+# (declaration file, line, column) -> (declaration file timestamp, file
+# referencing the entity or None if unused, timestamp that file or, for
+# unused entities, the most recent timestamp of the project sources)
+
 
 def EntityIterator(where):
     """Return all entities from WHERE"""
@@ -113,22 +141,215 @@ def UnusedIterator(where, globals_only):
             yield e
 
 
+def _stamp(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _uri_to_path(uri):
+    return urllib.request.url2pathname(urllib.parse.urlparse(uri).path)
+
+
+def _declaration_key(entity):
+    decl = entity.declaration()
+    return (decl.file().path, decl.line(), decl.column())
+
+
+def _location_key(location):
+    """A key for a GPS.FileLocation, comparable to LSP locations"""
+    return (location.file().path, location.line() - 1, location.column() - 1)
+
+
+class Unused_Entities_Search(object):
+    """
+    Search unused entities in the background, and list them in the
+    Locations view as soon as they are found.
+
+    The references of the entities are queried from the language server,
+    with at most MAX_REQUESTS requests at a time. The entities whose
+    language has no server use is_unused instead.
+    """
+
+    category = "Unused entity"
+
+    def __init__(self, where, globals_only):
+        self.where = where
+        self.globals_only = globals_only
+        self.newest = max(
+            [_stamp(f.path) or 0
+             for f in Project.root().sources(recursive=True)] or [0])
+        self.in_flight = 0
+        self.wake = None   # Resolved when a request completes
+        self.lines = {}    # The lines of the files searched for end labels
+        self.done = 0
+        self.total = 0
+
+    def start(self):
+        """Start the search, and return the GPS.Task monitoring it"""
+        return workflows.task_workflow("Unused entities", self.__run)
+
+    def report(self, entity):
+        decl = entity.declaration()
+        Locations.add(category=self.category,
+                      file=decl.file(),
+                      line=decl.line(),
+                      column=decl.column(),
+                      message="unused entity " + entity.name(),
+                      highlight="Unused_Entities",
+                      length=len(entity.name()))
+
+    def cached_verdict(self, key):
+        """
+        The cached verdict for the entity declared at `key`: True if it is
+        unused, False if it is used, None if unknown
+        """
+        cached = _verdicts.get(key)
+        if cached is None or _stamp(key[0]) != cached[0]:
+            return None
+        decl_stamp, used_in, stamp = cached
+        if used_in is None:
+            return True if stamp >= self.newest else None
+        return False if _stamp(used_in) == stamp else None
+
+    def set_verdict(self, entity, used_in):
+        """
+        Record whether the entity is used, and report it if not.
+
+        :param str used_in: the path of a file referencing the entity, or
+           None if it is unused.
+        """
+        if used_in is None and entity.primitive_of():
+            # If we have a primitive operation, do not report it for now,
+            # since it might actually be called through dispatching. We do
+            # not know yet how to test that
+            used_in = entity.declaration().file().path
+
+        key = _declaration_key(entity)
+        _verdicts[key] = (
+            _stamp(key[0]), used_in,
+            self.newest if used_in is None else _stamp(used_in))
+        if used_in is None:
+            self.report(entity)
+
+    def is_end_label(self, path, line, column):
+        """
+        Whether the reference at the given 0-based line and column is the
+        label of an "end", as in "end Foo;"
+        """
+        lines = self.lines.get(path)
+        if lines is None:
+            try:
+                with open(path, errors="replace") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                lines = []
+            self.lines[path] = lines
+        return line < len(lines) and \
+            _end_label_re.search(lines[line][:column]) is not None
+
+    def check_synchronously(self, entity):
+        self.set_verdict(
+            entity,
+            None if is_unused(entity)
+            else entity.declaration().file().path)
+
+    def __on_references(self, entity, result):
+        self.in_flight -= 1
+        self.done += 1
+
+        if result.is_valid:
+            # The declaration, the body and the end labels are not uses of
+            # the entity
+            ignored = {_location_key(entity.declaration())}
+            try:
+                ignored.add(_location_key(entity.body()))
+            except GPS.Exception:
+                pass
+
+            used_in = None
+            for loc in result.data or []:
+                start = loc["range"]["start"]
+                path = _uri_to_path(loc["uri"])
+                if (path, start["line"], start["character"]) not in ignored \
+                   and not self.is_end_label(
+                       path, start["line"], start["character"]):
+                    used_in = path
+                    break
+            self.set_verdict(entity, used_in)
+
+        else:
+            # The request was rejected or failed
+            self.check_synchronously(entity)
+
+        self.wake.resolve()
+
+    def __query(self, entity):
+        """
+        Send the references request for entity. Return False if there is
+        no language server for it, in which case nothing is sent.
+        """
+        decl = entity.declaration()
+        server = GPS.LanguageServer.get_by_file(decl.file())
+        if server is None:
+            return False
+
+        self.in_flight += 1
+        params = {"textDocument": {"uri": decl.file().uri},
+                  "position": {"line": decl.line() - 1,
+                               "character": decl.column() - 1},
+                  "context": {"includeDeclaration": True}}
+        server.request_promise("textDocument/references", params).then(
+            lambda result: self.__on_references(entity, result))
+        return True
+
+    def __run(self, task):
+        iter = GlobalIterator if self.globals_only else EntityIterator
+
+        # Only query the entities whose verdict is unknown
+        queue = collections.deque()
+        previous_file = None
+        for e in iter(self.where):
+            key = _declaration_key(e)
+            verdict = self.cached_verdict(key)
+            if verdict is None:
+                queue.append(e)
+            elif verdict:
+                self.report(e)
+
+            # Keep the interface responsive while listing entities
+            if key[0] != previous_file:
+                previous_file = key[0]
+                yield None
+
+        self.total = len(queue)
+        while queue or self.in_flight:
+            self.wake = promises.Promise()
+            deadline = time.time() + SYNC_BUDGET_MS / 1000.0
+            while queue and self.in_flight < MAX_REQUESTS:
+                e = queue.popleft()
+                if not self.__query(e):
+                    self.done += 1
+                    self.check_synchronously(e)
+                    if time.time() >= deadline:
+                        task.set_progress(self.done, self.total)
+                        yield None
+                        deadline = time.time() + SYNC_BUDGET_MS / 1000.0
+
+            task.set_progress(self.done, self.total)
+            if self.in_flight:
+                yield self.wake
+
+        Console().write("Done searching for unused entities\n")
+
+
 def show_unused_entities(where, globals_only):
     """List all unused global entities from WHERE in the locations window"""
     Editor.register_highlighting("Unused_Entities", "blue")
-    Locations.remove_category("Unused entity")
+    Locations.remove_category(Unused_Entities_Search.category)
     MDI.get("Messages").raise_window()
-
-    for e in UnusedIterator(where, globals_only=globals_only):
-        Locations.add(category="Unused entity",
-                      file=e.declaration().file(),
-                      line=e.declaration().line(),
-                      column=e.declaration().column(),
-                      message="unused entity " + e.name(),
-                      highlight="Unused_Entities",
-                      length=len(e.name()))
-
-    Console().write("Done searching for unused entities\n")
+    Unused_Entities_Search(where, globals_only).start()
 
 
 @interactive(name='show unused entities from file',
@@ -10,6 +10,8 @@ import os
 import os_utils
 import shutil
 import datetime
+import hashlib
+import json
 import yaml
 import glob
 import tool_output
@@ -24,12 +26,99 @@ GPS.Preference(NB_MAX_PREF).create(
     """Number of runs saved in the artifacts directory.""", 2, 1, 10)
 
 
+class Blob_Store(object):
+    """A content-addressed store for the files of the saved runs.
+
+       Each file is stored once in the blobs directory, under the SHA-256
+       of its contents, and the runs only record manifests which map the
+       relative path of each of their files to its hash. Blobs are never
+       modified once written.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.blobs_dir = os.path.join(root, 'blobs')
+        self._hashes = {}
+        # path -> ((size, mtime), sha256), so that only the files modified
+        # since the last save are read again
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def file_hash(self, path):
+        """Return the SHA-256 of the contents of the file at path"""
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        h = hashlib.sha256()
+        with open(path, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._hashes[path] = (stamp, digest)
+        return digest
+
+    def add_tree(self, directory):
+        """Store the files of directory which are not stored yet, and
+           return its manifest.
+        """
+        manifest = {}
+        for dirpath, _, filenames in os.walk(directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                digest = self.file_hash(path)
+                blob = self._blob_path(digest)
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    shutil.copyfile(path, blob + '.tmp')
+                    os.replace(blob + '.tmp', blob)
+                manifest[os.path.relpath(path, directory)] = digest
+        return manifest
+
+    def restore_tree(self, manifest, directory):
+        """Make directory contain the files of manifest. Only the files
+           whose contents differ are written.
+        """
+        for dirpath, _, filenames in os.walk(directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.relpath(path, directory) not in manifest:
+                    os.remove(path)
+
+        for rel, digest in manifest.items():
+            target = os.path.join(directory, rel)
+            if os.path.exists(target) and self.file_hash(target) == digest:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(self._blob_path(digest), target + '.tmp')
+            os.replace(target + '.tmp', target)
+
+    def collect_garbage(self, manifests):
+        """Remove the blobs that are not referenced by manifests"""
+        referenced = set()
+        for m in manifests:
+            referenced.update(m.values())
+
+        if not os.path.isdir(self.blobs_dir):
+            return
+        for prefix in os.listdir(self.blobs_dir):
+            d = os.path.join(self.blobs_dir, prefix)
+            for digest in os.listdir(d):
+                if digest not in referenced:
+                    os.remove(os.path.join(d, digest))
+
+
 class SavedRunManager(object):
     """A singleton which handles the global list of saved runs"""
 
     def __init__(self):
         self.widget = None  # The view
         self.runs = {}  # The saved runs, indexed by their timestamp
+        self.stores = {}  # The Blob_Store of each artifacts directory
+        self.log_records = 0  # The number of records in the archive log
         self.reload_from_disk()
 
         def on_project_changed(*args):
@@ -37,43 +126,87 @@ class SavedRunManager(object):
         GPS.Hook("project_view_changed").add(on_project_changed)
 
     def _get_archive_file(self):
+        # The archive written by previous versions, replaced by the log
         return os.path.join(
             GPS.Project.root().artifacts_dir(),
             'runs.yaml')
 
+    def _get_log_file(self):
+        return os.path.join(
+            GPS.Project.root().artifacts_dir(),
+            'runs.log')
+
+    def _store(self):
+        root = os.path.join(
+            GPS.Project.root().artifacts_dir(), 'saved_runs')
+        if root not in self.stores:
+            self.stores[root] = Blob_Store(root)
+        return self.stores[root]
+
     def reload_from_disk(self):
+        self.runs = {}
+        self.log_records = 0
         f = self._get_archive_file()
         if os.path.exists(f):
             with open(f, 'rb') as fd:
-                self.runs = yaml.load(fd.read(), Loader=yaml.FullLoader)
+                self.runs = yaml.load(fd.read(), Loader=yaml.FullLoader) or {}
+
+        # The log contains one json record per line: either {"add": run}
+        # or {"remove": timestamp}
+        f = self._get_log_file()
+        if os.path.exists(f):
+            with open(f, 'r') as fd:
+                for line in fd:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Interrupted while writing the last record
+                        continue
+                    self.log_records += 1
+                    if 'add' in record:
+                        run = record['add']
+                        self.runs[run['timestamp']] = run
+                    else:
+                        self.runs.pop(record['remove'], None)
 
         # Refresh the widget
         if self.widget:
             self.widget.refresh()
 
+    def _append_to_log(self, records):
+        with open(self._get_log_file(), 'a') as fd:
+            for r in records:
+                fd.write(json.dumps(r) + '\n')
+        self.log_records += len(records)
+
     def _save_to_disk(self):
-        with open(self._get_archive_file(), 'w') as fd:
-            fd.write(yaml.dump(self.runs))
+        """Rewrite the log with only the current runs"""
+        f = self._get_log_file()
+        with open(f + '.tmp', 'w') as fd:
+            for run in self.runs.values():
+                fd.write(json.dumps({'add': run}) + '\n')
+        os.replace(f + '.tmp', f)
+        self.log_records = len(self.runs)
+
+        if os.path.exists(self._get_archive_file()):
+            os.remove(self._get_archive_file())
 
     def _purge_old_runs(self):
-        search_dir = os.path.join(
-            GPS.Project.root().artifacts_dir(), 'saved_runs')
-        full_dirs = [
-            os.path.join(search_dir, d) for d in os.listdir(search_dir)]
-        full_dirs.sort(key=lambda x: os.path.getmtime(x))
-
-        cpt = 1
-        for d in reversed(full_dirs):
-            if cpt > GPS.Preference(NB_MAX_PREF).get():
-                try:
-                    del self.runs[os.path.basename(d).replace('_', ':')]
-                except KeyError:
-                    # Corruption somewhere: the dir is not listed anymore in
-                    # the runs.
-                    pass
-                shutil.rmtree(d)
-            else:
-                cpt += 1
+        timestamps = sorted(self.runs, reverse=True)
+        removed = timestamps[GPS.Preference(NB_MAX_PREF).get():]
+        for t in removed:
+            run = self.runs.pop(t)
+            if 'manifests' not in run:
+                # Saved by a previous version, as a copy of the files
+                d = self._save_dir(run)
+                if os.path.exists(d):
+                    shutil.rmtree(d)
+
+        if removed:
+            self._append_to_log([{'remove': t} for t in removed])
+            self._store().collect_garbage(
+                m for run in self.runs.values()
+                for m in run.get('manifests', {}).values())
 
     def _save_dir(self, run):
         base = os.path.join(
@@ -82,17 +215,29 @@ class SavedRunManager(object):
             os.mkdir(base)
         return os.path.join(base, run['timestamp'].replace(':', '_'))
 
-    def restore_run(self, run_timestamp):
+    def materialize(self, run_timestamp):
+        """Restore the files saved with the given run"""
         run = self.runs[run_timestamp]
+        dest = GPS.Project.root().artifacts_dir()
+
+        if 'manifests' in run:
+            for name, manifest in run['manifests'].items():
+                self._store().restore_tree(
+                    manifest, os.path.join(dest, name))
+            return
+
         # Restore the files from the saved dir
         src = self._save_dir(run)
-        dest = GPS.Project.root().artifacts_dir()
         for f in glob.glob(os.path.join(src, '*')):
             tgt = os.path.join(dest, os.path.basename(f))
             if os.path.exists(tgt):
                 shutil.rmtree(tgt)
             shutil.copytree(f, tgt)
 
+    def restore_run(self, run_timestamp):
+        run = self.runs[run_timestamp]
+        self.materialize(run_timestamp)
+
         # Clear the Messages view
         GPS.Console("Messages").clear()
         # Clear the locations
@@ -115,19 +260,20 @@ class SavedRunManager(object):
                'files': files,
                'output': output,
                'timestamp': datetime.datetime.now().isoformat()}
-        self.runs[run['timestamp']] = run
 
-        # Copy the files to the save dir
-        dest = self._save_dir(run)
-        if os.path.exists(dest):
-            shutil.rmtree(dest)
-        os.mkdir(dest)
-        for f in files:
-            shutil.copytree(f, os.path.join(dest, os.path.basename(f)))
+        # Store the files which changed since the previous runs
+        store = self._store()
+        run['manifests'] = {
+            os.path.basename(f): store.add_tree(f) for f in files}
+
+        self.runs[run['timestamp']] = run
+        self._append_to_log([{'add': run}])
 
-        # Purge the old runs and save the list to disk
+        # Purge the old runs, and compact the log when it mostly contains
+        # obsolete records
         self._purge_old_runs()
-        self._save_to_disk()
+        if self.log_records > 2 * len(self.runs) + 10:
+            self._save_to_disk()
 
         # Refresh the widget
         if self.widget:
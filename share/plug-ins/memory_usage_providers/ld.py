@@ -1,13 +1,269 @@
 import GPS
+import bisect
+import mmap
 import os.path
 import re
+import time
 from . import core
-from os_utils import locate_exec_on_path
+from os_utils import locate_exec_on_path, probe_output
 import traceback
 from workflows import run_as_workflow
+from workflows.promises import timeout
 
 MAP_FILE_BASE_NAME = "map.txt"
 
+PARSING_BUDGET_MS = 20
+# The maximum time spent parsing a map file before letting the main loop
+# process its events.
+
+_parsed_map_files = {}
+# The data parsed from map files: map file name -> ((mtime, size), data)
+
+# The regexps used to match the information we want to fetch. Regions and
+# sections start at the beginning of a line, modules and symbols are
+# indented.
+_region_r = re.compile(
+    br'^(?P<name>\*?\w+\*?)\s+(?P<origin>0x[0-9a-f]+)' +
+    br'\s+(?P<length>0x[0-9a-f]+)\s+x?r?w?')
+_section_r = re.compile(br'^(?P<name>[\w.]+)\s+(?P<origin>0x[0-9a-f]+)' +
+                        br'\s+(?P<length>0x[0-9a-f]+)')
+_module_r = re.compile(br'^\s+[\w.]*\s+(?P<origin>0x[0-9a-f]+)\s+' +
+                       br'(?P<size>0x[0-9a-f]+) (?P<files>.+\.o\)?)')
+_symbol_r = re.compile(br'^\s+(?P<origin>0x[0-9a-f]+)\s+' +
+                       br'(?P<name>[A-Za-z_.$][\w.$]*)\s*$')
+
+
+def is_section_allocated(section):
+    """
+    Return True if the given section tuple is going to be allocated in
+    memory, False otherwise.
+
+    An allocated section is a memory section that will actually be
+    loaded by the target. Sections related with debug information,
+    code comments or that have null size are typically not allocated
+    and should be ignored.
+    """
+
+    not_alloc_sections_prefixes = ('.debug', '.comment')
+
+    return (section[2] != 0
+            and not section[0].startswith(not_alloc_sections_prefixes))
+
+
+class Region_Index(object):
+    """
+    Find the memory region that contains an address with a binary search.
+
+    Regions may overlap (e.g. the '*default*' region), in which case the
+    first one in the map file wins, so the regions are first split into
+    disjoint intervals.
+    """
+
+    def __init__(self, regions):
+        """
+        :param regions: a list of (name, origin, length) tuples, where
+           origin is a hexadecimal string.
+        """
+        ranges = [(int(origin, 16), int(origin, 16) + length, name)
+                  for name, origin, length in regions]
+        bounds = sorted(set([b for r in ranges for b in r[:2]]))
+        self.__starts = []
+        self.__names = []
+
+        for start, end in zip(bounds, bounds[1:]):
+            name = next((r[2] for r in ranges if r[0] <= start < r[1]), "")
+            if self.__names and self.__names[-1] == name:
+                continue
+            self.__starts.append(start)
+            self.__names.append(name)
+
+        if bounds:
+            self.__starts.append(bounds[-1])
+            self.__names.append("")
+
+    def region_name(self, addr):
+        """
+        Return the name of the region associated with the given address or
+        an empty string if not found.
+        """
+        idx = bisect.bisect_right(self.__starts, addr) - 1
+        return self.__names[idx] if idx >= 0 else ""
+
+
+class Map_File_Data(object):
+    """
+    The data parsed from an ld map file.
+
+    :ivar regions: a list of (name, origin, length) tuples
+    :ivar sections: a list of (name, origin, length, region_name) tuples,
+       for the allocated sections
+    :ivar modules: a list of (obj_file, lib_file, origin, size,
+       region_name, section_name, symbols) tuples, giving the size taken by
+       an object file in a section. symbols is a list of (name, origin,
+       size) tuples: the size of a symbol is the distance to the next
+       symbol of the same input section, or to the end of this input
+       section.
+    """
+
+    def __init__(self, regions, sections, modules):
+        self.regions = regions
+        self.sections = sections
+        self.modules = modules
+
+
+def parse_map_file(map_file_name):
+    """
+    A workflow that parses the given map file, and returns a
+    `Map_File_Data`.
+
+    The file is memory mapped and parsed by slices of PARSING_BUDGET_MS,
+    so that GPS stays responsive on large map files. The result is kept
+    until the map file's mtime or size changes.
+    """
+
+    stat = os.stat(map_file_name)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _parsed_map_files.get(map_file_name)
+    if cached is not None and cached[0] == key:
+        yield cached[1]
+        return
+
+    map_dir = os.path.dirname(map_file_name)
+    regions = []
+    sections = []
+    modules_dict = {}
+    region_index = Region_Index(regions)
+
+    # The (origin, size, module) of the input section of the last matched
+    # module, and its symbols as (address, name) tuples.
+    input_section = None
+    input_symbols = []
+
+    def add_symbols():
+        """
+        Compute the size of the symbols of the current input section.
+        """
+        origin, size, module = input_section
+        ends = [addr for addr, _ in input_symbols[1:]] + [origin + size]
+
+        for (addr, name), end in zip(input_symbols, ends):
+            module[6].append((name, '0x%08x' % addr, end - addr))
+
+    def match_module(m):
+        """
+        Record the module described by the given match of _module_r, and
+        return the corresponding input section if it contains allocated
+        data.
+        """
+
+        files_info = m.group('files').decode(errors='replace')
+        files = re.split(r"\(|\)", files_info)
+
+        # Get the object file name and, if any, information about
+        # the library for which this file has been compiled.
+
+        obj_file = files[0] if len(files) == 1 else files[1]
+        lib_file = files[0] if len(files) > 1 else ""
+        module_size = int(m.group('size'), 16)
+        section = sections[-1]
+
+        # Do nothing if the module belongs to a section that will not
+        # be allocated or if it's size is null.
+
+        if module_size == 0 or not is_section_allocated(section):
+            return None
+
+        section_name = section[0]
+        region_name = section[3]
+        module = modules_dict.get((files_info, section_name), None)
+
+        # If the object file name does not contain any directory
+        # information assume that this file is located in the same
+        # directory as the map file.
+
+        if not os.path.dirname(obj_file) and not lib_file:
+            obj_file = os.path.join(map_dir, obj_file)
+
+        # If a previous module decription has been found for the same
+        # key, just add the size of this one to the previously found
+        # one.
+
+        if module:
+            module[3] += module_size
+        else:
+            module = [obj_file, lib_file, m.group('origin').decode(),
+                      module_size, region_name, section_name, []]
+            modules_dict[(files_info, section_name)] = module
+
+        return (int(m.group('origin'), 16), module_size, module)
+
+    if stat.st_size:
+        with open(map_file_name, 'rb') as f:
+            content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            deadline = time.time() + PARSING_BUDGET_MS / 1000.0
+
+            for count, line in enumerate(iter(content.readline, b'')):
+                if count % 1000 == 0 and time.time() > deadline:
+                    yield timeout(0)
+                    deadline = time.time() + PARSING_BUDGET_MS / 1000.0
+
+                if line[:1].isspace():
+                    # Don't try to match a module if sections have not
+                    # been parsed yet
+                    if not sections:
+                        continue
+
+                    m = _module_r.match(line)
+                    if m:
+                        if input_section:
+                            add_symbols()
+                        input_section = match_module(m)
+                        input_symbols = []
+                        continue
+
+                    m = input_section and _symbol_r.match(line)
+                    if m:
+                        addr = int(m.group('origin'), 16)
+                        if 0 <= addr - input_section[0] < input_section[1]:
+                            input_symbols.append(
+                                (addr, m.group('name').decode()))
+                    continue
+
+                m = _region_r.match(line)
+                if m:
+                    regions.append((m.group('name').decode(),
+                                    m.group('origin').decode(),
+                                    int(m.group('length'), 16)))
+                    region_index = Region_Index(regions)
+                    continue
+
+                m = _section_r.match(line)
+                if m:
+                    if input_section:
+                        add_symbols()
+                        input_section = None
+                    section_addr = m.group('origin').decode()
+                    sections.append(
+                        (m.group('name').decode(), section_addr,
+                         int(m.group('length'), 16),
+                         region_index.region_name(int(section_addr, 16))))
+
+            if input_section:
+                add_symbols()
+        finally:
+            content.close()
+
+    # Keep only the sections that will be allocated in memory
+    data = Map_File_Data(
+        regions=regions,
+        sections=[s for s in sections if is_section_allocated(s)],
+        modules=[tuple(m) for m in modules_dict.values()])
+    _parsed_map_files[map_file_name] = (key, data)
+    yield data
+
+
 xml = """
 <filter name="ld_supports_map_file" shell_lang="python"
         shell_cmd="memory_usage_providers.ld.LD.map_file_is_supported(
@@ -68,9 +324,11 @@ class LD(core.MemoryUsageProvider):
         if not locate_exec_on_path(ld_exe):
             v = False
         else:
+            def on_update(output):
+                LD._cache[(target, build_mode)] = '-map' in output
+
             try:
-                process = GPS.Process([ld_exe, '--help'])
-                output = process.get_result()
+                output = probe_output([ld_exe, '--help'], on_update)
                 v = '-map' in output
             except Exception:
                 v = False
@@ -99,173 +357,10 @@ class LD(core.MemoryUsageProvider):
             visitor.on_memory_usage_data_fetched([], [], [])
             return
 
-        # The information we want to fetch: memory regions and memory sections
-        # ??? Find a way to have a finer grain view (symbols? compilation
-        # units?)
-        regions = []
-        sections = []
-        modules_dict = {}
-        modules = []
-
-        # The regexps used to match the information we want to fetch
-        region_r = re.compile(
-            r'^(?P<name>\*?\w+\*?)\s+(?P<origin>0x[0-9a-f]+)' +
-            r'\s+(?P<length>0x[0-9a-f]+)\s+x?r?w?')
-        section_r = re.compile(r'^(?P<name>[\w.]+)\s+(?P<origin>0x[0-9a-f]+)' +
-                               r'\s+(?P<length>0x[0-9a-f]+)')
-        module_r = re.compile(r'^\s+[\w.]*\s+(?P<origin>0x[0-9a-f]+)\s+' +
-                              r'(?P<size>0x[0-9a-f]+) (?P<files>.+\.o\)?)')
-
-        def region_name_from_address(addr):
-            """
-            Return the name of the region associated with the given address or
-            an empty string if not found.
-            """
-
-            for region in regions:
-                region_addr = int(region[1], 16)
-                region_size = region[2]
-
-                if addr >= region_addr and addr < (region_addr + region_size):
-                    return region[0]
-
-            return ""
-
-        def is_section_allocated(section):
-            """
-            Return True if the given section tuple is going to be allocated in
-            memory, False otherwise.
-
-            An allocated section is a memory section that will actually be
-            loaded by the target. Sections related with debug information,
-            code comments or that have null size are typically not allocated
-            and should be ignored.
-            """
-
-            not_alloc_sections_prefixes = ['.debug', '.comment']
-
-            for prefix in not_alloc_sections_prefixes:
-                if section[0].startswith(prefix):
-                    return False
-
-            if section[2] == 0:
-                return False
-
-            return True
-
-        def try_match_region(line):
-            """
-            Try to match a region description in the given line.
-
-            Return a tuple (name, origin, length) if a region was matched
-            and None otherwise.
-            """
-
-            m = region_r.search(line)
-            if m:
-                return (m.group('name'), m.group('origin'),
-                        int(m.group('length'), 16))
-            else:
-                return None
-
-        def try_match_section(line):
-            """
-            Try to match an allocated section description in the given live.
-
-            Return a tuple (name, origin, length, region_name) if a section was
-            matched and None otherwise.
-            """
-
-            m = section_r.search(line)
-
-            if m:
-                section_addr = m.group('origin')
-                region_name = region_name_from_address(int(section_addr, 16))
-                section = (m.group('name'), section_addr,
-                           int(m.group('length'), 16), region_name)
-
-                return section
-            else:
-                return None
-
-        def try_match_module(line):
-            """
-            Try to match a module description in the given line.
-
-            A module description gives information about the size taken by
-            an object file in a given section.
-            """
-
-            # Don't try to match a module if sections have not been parsed yet
-            if not sections:
-                return
-
-            m = module_r.search(line)
-            if m:
-                files_info = m.group('files')
-                files = re.split(r"\(|\)", files_info)
-
-                # Get the object file name and, if any, information about
-                # the library for which this file has been compiled.
-
-                obj_file = files[0] if len(files) == 1 else files[1]
-                lib_file = files[0] if len(files) > 1 else ""
-                module_size = int(m.group('size'), 16)
-                section = sections[-1]
-
-                # Do nothing if the module belongs to a section that will not
-                # be allocated or if it's size is null.
-
-                if module_size == 0 or not is_section_allocated(section):
-                    return
-
-                section_name = section[0]
-                module = modules_dict.get((files_info, section_name), None)
-
-                # If the object file name does not contain any directory
-                # information assume that this file is located in the same
-                # directory as the map file.
-
-                if not os.path.dirname(obj_file) and not lib_file:
-                    obj_file = os.path.join(map_dir, obj_file)
-
-                # If a previous module decription has been found for the same
-                # key, just add the size of this one to the previously found
-                # one.
-
-                if module:
-                    module[3] += int(m.group('size'), 16)
-                else:
-                    region_name = section[3]
-                    module = [obj_file, lib_file, m.group('origin'),
-                              int(m.group('size'), 16),
-                              region_name, section_name]
-                    modules_dict[(files_info, section_name)] = module
-
-        # Parse the memory map file to retrieve the memory regions and
-        # the path of the linked executable.
-
         try:
-            with open(map_file_name, 'r') as f:
-                for line in f:
-                    region = try_match_region(line)
-                    if not region:
-                        section = try_match_section(line)
-                        if section:
-                            sections.append(section)
-                        else:
-                            try_match_module(line)
-                    else:
-                        regions.append(region)
-
-            for module in modules_dict.values():
-                modules.append(tuple(module))
-
-            # Keep only the sections that will be allocated in memory
-
-            sections = [s for s in sections if is_section_allocated(s)]
-
-            visitor.on_memory_usage_data_fetched(regions, sections, modules)
+            data = yield parse_map_file(map_file_name)
+            visitor.on_memory_usage_data_fetched(
+                data.regions, data.sections, data.modules)
 
         except Exception:
             logger = GPS.Logger("GPS.MEMORY_USAGE.SCRIPTS.LD")
@@ -52,6 +52,7 @@ import sys
 import re
 import workflows
 import constructs
+from collections import deque
 from workflows.promises import Promise, TargetWrapper, timeout
 from .project_support import Project_Support
 from .sig_utils import Signal
@@ -145,25 +146,23 @@ class MDL_Language(GPS.Language):
             offset = 0
             item, children = viewer.diags.index[0]
             items_len = len(children)
-            item_stack = [(item, item, children, 0)]
+            item_stack = [(item, item, deque(children), 0)]
             item, item_id, children, start_offset = item_stack[-1]
             # The index entry contains a JSON_Array of entries with
             # a 'name' and 'diagram' fields. They respectively correspond
             # to the simulink name of the item and its corresponding JSON id
             while item_stack:
-                children_cpy = list(children)
-                for child in children_cpy:
+                while children:
+                    child = children.popleft()
                     child_name = child["name"]
                     child_id = child["diagram"]
-                    for child_entry_name, child_children in viewer.diags.index:
-                        # Look for the child diagram in the index table
-                        if child_entry_name == child_id:
-                            offset = offset + 1
-                            items_len += len(child_children)
-                            item_stack.append((child_name, child_id,
-                                               list(child_children), offset))
-                            break
-                    children.remove(child)
+                    # Look for the child diagram in the index table
+                    child_children = viewer.diags.get_children(child_id)
+                    if child_children is not None:
+                        offset = offset + 1
+                        items_len += len(child_children)
+                        item_stack.append((child_name, child_id,
+                                           deque(child_children), offset))
                     # If the subsystem has no child, add the construct as a
                     # leaf
                     if not item_stack[-1][2]:
@@ -819,8 +818,7 @@ class QGEN_Diagram_Viewer(GPS.Browsers.View):
                     open(f), diagramFactory=QGEN_Diagram,
                     load_styles=style)
                 logger.log("Done loading")
-                viewer.diags.index.extend(loaded_diag.index)
-                viewer.diags.diagrams.extend(loaded_diag.diagrams)
+                viewer.diags.add_diagrams(loaded_diag)
 
     @staticmethod
     def get_or_create_from_model(model, on_loaded=None):
@@ -1327,6 +1325,7 @@ else:
         def cancel_workflows():
             for t in QGEN_Module.display_tasks:
                 logger.log("Canceling running display workflows\n")
+                t.workflow.cancel()
                 t.interrupt()
             QGEN_Module.display_tasks = []
 
@@ -10,6 +10,7 @@ import os
 import GPS
 from gs_utils import in_ada_file, interactive
 import libadalang as lal
+import lal_utils
 import os_utils
 
 
@@ -63,15 +64,10 @@ def get_subp_decl(buf, line, column):
     """ Return the subprogram declaration node at line, column.
     Return None if none is found.
     """
-    unit = buf.get_analysis_unit()
-    decl = unit.root.find(lambda x: x.sloc_range.start.line == line and
-                          x.sloc_range.start.column == column and
-                          isinstance(x, (lal.SubpDecl, lal.ExprFunction,
-                                         lal.SingleTaskDecl,
-                                         lal.TaskTypeDecl, lal.EntryDecl,
-                                         lal.SubpBody)))
-
-    return decl
+    return lal_utils.declaration(
+        buf.file(), line, column,
+        (lal.SubpDecl, lal.ExprFunction, lal.SingleTaskDecl,
+         lal.TaskTypeDecl, lal.EntryDecl, lal.SubpBody))
 
 
 def has_aspects(subp_decl_node):
@@ -13,6 +13,8 @@ import tool_output
 import json
 import re
 import sys
+import time
+from gi.repository import GLib
 from lal_utils import get_enclosing_subprogram
 from functools import reduce
 
@@ -509,6 +511,17 @@ def get_compunit_for_message(text, fn):
     return os.path.splitext(fname)[0]
 
 
+spark_files_cache = {}
+# Maps the path of a .spark file to (mtime, size, extra info entries), so
+# that files not modified since the last run are not parsed again.
+
+ingestion_budget_ms = 20
+# Time spent adding messages to the Locations view per main loop iteration
+
+ingestion_interval_ms = 10
+# Delay between two batches of messages
+
+
 class GNATprove_Parser(tool_output.OutputParser):
 
     """Class that parses messages of the gnatprove tool, and creates
@@ -572,6 +585,18 @@ class GNATprove_Parser(tool_output.OutputParser):
         self.extra_info = {}
         self.has_analysis_messages = False
 
+        # The directories where .spark files are searched, computed on the
+        # first output of this run
+        self.artifact_dirs = None
+        # map from unit to corresponding object directory, for this run
+        self.imported_units = {}
+
+        # (line, command) for the output lines not processed yet. They are
+        # processed in batches, to avoid freezing GPS on large projects.
+        self.pending_lines = []
+        self.pending_index = 0
+        self.pending_timeout = None
+
         # Create a GPS.AnalysisTool instance to collect the messages that will
         # be shown in the report.
         self.analysis_tool = GPS.AnalysisTool(messages_category)
@@ -583,8 +608,15 @@ class GNATprove_Parser(tool_output.OutputParser):
         self.analysis_tool.add_rule('errors', 'ERRORS')
 
         # create the SPARK rules from the '--list-categories' switch
-        process = GPS.Process("gnatprove --list-categories")
-        output = process.get_result()
+        self.add_category_rules(os_utils.probe_output(
+            ["gnatprove", "--list-categories"],
+            on_update=self.add_category_rules))
+
+    def add_category_rules(self, output):
+        """
+        Create the SPARK rules from the output of
+        'gnatprove --list-categories'.
+        """
         for line in output.split('\n'):
             split_line = line.split(' - ')
             if len(split_line) == 4:
@@ -614,18 +646,18 @@ class GNATprove_Parser(tool_output.OutputParser):
                                              1))
         return lines
 
-    def handle_entry(self, unit, list, session_map=None):
+    def handle_entry(self, entries, list, session_map=None):
         """code do handle one entry of the JSON file. See :func:`parsejson()`
-           for the details of the format.
+           for the details of the format. Fill the mapping "entries" from
+           msg_id to extra info.
         """
 
         for entry in list:
             if 'msg_id' in entry:
-                full_id = unit, entry['msg_id']
                 ent = entry
                 if session_map is not None and 'session_dir' in ent:
                     ent['session_dir'] = session_map[ent['session_dir']]
-                self.extra_info[full_id] = ent
+                entries[entry['msg_id']] = ent
 
     def parsejson(self, unit, fn):
         """parse the json file "fn", which belongs to unit "unit" and fill
@@ -639,8 +671,16 @@ class GNATprove_Parser(tool_output.OutputParser):
              (unit, id) -> extra_info
            which is later used to act on this extra information for each
            message.
+           The result is cached as long as the file is not modified.
         """
-        if os.path.isfile(fn):
+        try:
+            st = os.stat(fn)
+        except OSError:
+            return
+
+        cached = spark_files_cache.get(fn)
+        if cached is None or cached[0:2] != (st.st_mtime, st.st_size):
+            entries = {}
             with open(fn, 'r') as f:
                 try:
                     dict = json.load(f)
@@ -650,11 +690,16 @@ class GNATprove_Parser(tool_output.OutputParser):
                         session_map = {int(k): v for k,
                                        v in session_map.items()}
                     if 'flow' in dict:
-                        self.handle_entry(unit, dict['flow'])
+                        self.handle_entry(entries, dict['flow'])
                     if 'proof' in dict:
-                        self.handle_entry(unit, dict['proof'], session_map)
+                        self.handle_entry(entries, dict['proof'], session_map)
                 except ValueError:
                     pass
+            cached = (st.st_mtime, st.st_size, entries)
+            spark_files_cache[fn] = cached
+
+        for msg_id, ent in cached[2].items():
+            self.extra_info[unit, msg_id] = ent
 
     def get_rule_id(self, output, extra):
         """return the rule ID associated to the output.
@@ -745,6 +790,12 @@ class GNATprove_Parser(tool_output.OutputParser):
 
         self.command = command
 
+        # All messages must be created before showing the report
+        if self.pending_timeout is not None:
+            GLib.source_remove(self.pending_timeout)
+            self.pending_timeout = None
+        self.process_pending_lines(budget_ms=None)
+
         if (GPS.Preference(Display_Analysis_Report).get() and
                 self.has_analysis_messages):
             GPS.Analysis.display_report(self.analysis_tool)
@@ -826,59 +877,95 @@ class GNATprove_Parser(tool_output.OutputParser):
                 messages_category, GPS.Message.Flags.INVISIBLE)
             self.previous_messages_removed = True
 
-        artifact_dirs = (
-            [os.path.join(f, obj_subdir_name)
-             for f in GPS.Project.root().object_dirs(recursive=True)])
-        imported_units = {}  # map from unit to corresponding object directory
+        if self.artifact_dirs is None:
+            self.artifact_dirs = (
+                [os.path.join(f, obj_subdir_name)
+                 for f in GPS.Project.root().object_dirs(recursive=True)])
 
         lines = text.splitlines()
-        for line in lines:
-            msg_match = re.match(self.message_re, line)
-            self.print_output(line)
-
-            if msg_match:
-                text = msg_match.group('text')
-                fn = GPS.File(msg_match.group('filename'))
-                lineno = int(msg_match.group('line'))
-                if msg_match.group('column'):
-                    column = int(msg_match.group('column'))
-                else:
-                    column = 1
-
-                # Refined the output if extra information
-                extra_match = re.match(self.extra_re, text)
-                if extra_match:
-                    text = extra_match.group('text')
-                    extra, unit = self.get_extra_info(
-                        extra_match.group('extra'), text, fn, command,
-                        imported_units, artifact_dirs)
-                else:
-                    extra = {}
-
-                if msg_match.group('importance'):
-                    importance = self.to_importance(
-                        msg_match.group('importance'))
-                    text = msg_match.group('importance') + ": " + text
-                else:
-                    importance = GPS.Message.Importance.HIGH
-
-                # Add action to the message
-                if extra:
-                    self.has_analysis_messages = True
-                    # Create the message and its secondaries
-                    message = self.split_in_secondary_messages(
-                        fn, lineno, column, text, importance, extra)
-                    self.act_on_extra_info(
-                        message, extra, imported_units[unit], command)
-                else:
-                    # Let the "location parser" handle non-spark messages
-                    GPS.Locations.add(messages_category, fn, lineno,
-                                      column, text, look_for_secondary=True,
-                                      importance=importance)
-
-                    # Collect the non-spark output to detect potential
-                    # codefixes later
-                    self.non_spark_output += line + "\n"
+        self.print_output("\n".join(line for line in lines if line))
+        self.pending_lines.extend((line, command) for line in lines)
+
+        if self.pending_timeout is None:
+            self.pending_timeout = GLib.timeout_add(
+                ingestion_interval_ms, self.on_pending_timeout)
+
+    def on_pending_timeout(self):
+        """Process a batch of pending lines, and return whether there are
+           more to process.
+        """
+        if self.process_pending_lines(budget_ms=ingestion_budget_ms):
+            return True
+        self.pending_timeout = None
+        return False
+
+    def process_pending_lines(self, budget_ms):
+        """Create the messages for the pending output lines, stopping after
+           budget_ms milliseconds if it is not None.
+           :return: whether some lines remain to be processed
+        """
+        if budget_ms is not None:
+            deadline = time.time() + budget_ms / 1000.0
+
+        pending = self.pending_lines
+        while self.pending_index < len(pending):
+            line, command = pending[self.pending_index]
+            self.pending_index += 1
+            self.process_line(line, command)
+            if budget_ms is not None and time.time() >= deadline:
+                return True
+
+        self.pending_lines = []
+        self.pending_index = 0
+        return False
+
+    def process_line(self, line, command):
+        """Create the message for one line of output, if any"""
+        msg_match = self.message_re.match(line)
+
+        if msg_match:
+            text = msg_match.group('text')
+            fn = GPS.File(msg_match.group('filename'))
+            lineno = int(msg_match.group('line'))
+            if msg_match.group('column'):
+                column = int(msg_match.group('column'))
+            else:
+                column = 1
+
+            # Refined the output if extra information
+            extra_match = self.extra_re.match(text)
+            if extra_match:
+                text = extra_match.group('text')
+                extra, unit = self.get_extra_info(
+                    extra_match.group('extra'), text, fn, command,
+                    self.imported_units, self.artifact_dirs)
+            else:
+                extra = {}
+
+            if msg_match.group('importance'):
+                importance = self.to_importance(
+                    msg_match.group('importance'))
+                text = msg_match.group('importance') + ": " + text
+            else:
+                importance = GPS.Message.Importance.HIGH
+
+            # Add action to the message
+            if extra:
+                self.has_analysis_messages = True
+                # Create the message and its secondaries
+                message = self.split_in_secondary_messages(
+                    fn, lineno, column, text, importance, extra)
+                self.act_on_extra_info(
+                    message, extra, self.imported_units[unit], command)
+            else:
+                # Let the "location parser" handle non-spark messages
+                GPS.Locations.add(messages_category, fn, lineno,
+                                  column, text, look_for_secondary=True,
+                                  importance=importance)
+
+                # Collect the non-spark output to detect potential
+                # codefixes later
+                self.non_spark_output += line + "\n"
 
     def get_extra_info(self, id, text, fn, command,
                        imported_units, artifact_dirs):
@@ -136,7 +136,10 @@ class CompletionProposal(object):
                         the same as name.
                 - documentation: text appearing in the documentation window
                         when this proposal is selected in the list.
-                        In pango markup language.
+                        In pango markup language. This can also be a
+                        function with no argument returning that text,
+                        which is only called when the documentation is
+                        displayed.
                 - icon_name: (optional) the name of a named icon in the icon
                         theme.
                 - action_name: (optional) the name of an action to execute
@@ -150,8 +153,22 @@ class CompletionProposal(object):
         self.action_name = action_name
         self.language_category = language_category
 
+    def get_documentation(self):
+        """
+            Return the documentation, computing it on the first call if
+            it was given as a function.
+        """
+        if callable(self.documentation):
+            try:
+                self.documentation = self.documentation() or ""
+            except Exception:
+                self.documentation = ""
+        return self.documentation
+
     def get_data_as_list(self):
-        return [self.name, self.label, self.documentation,
+        # A lazy documentation is retrieved via get_documentation
+        return [self.name, self.label,
+                "" if callable(self.documentation) else self.documentation,
                 self.icon_name, self.action_name, self.language_category]
 
 
@@ -21,7 +21,8 @@ import GPS
 import os
 import re
 from gs_utils import interactive
-from GPS import MDI, Project, Process, CodeAnalysis
+from GPS import MDI, Project, CodeAnalysis
+from os_utils import probe_output
 
 # A class to display the output of gcov in a separate console.
 
@@ -83,8 +84,7 @@ def run_gcov():
     # files and reading of .gc?? data in multiple directories.
 
     try:
-        p = Process("gcov --version")
-        out = p.get_result()
+        out = probe_output(["gcov", "--version"])
         p = re.compile("[1-9][0-9][0-9][0-9][0-1][0-9][0-3][0-9]")
         found = p.findall(out)
         if not found:
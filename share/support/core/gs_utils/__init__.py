@@ -6,6 +6,7 @@ from collections import MutableMapping as DictMixin
 import types
 import GPS
 import GPS.Browsers
+import hook_stats
 
 # The autodoc may not have visibility on gi.repository
 try:
@@ -138,7 +139,11 @@ class hook:
         def do_work(hook, *args, **kwargs):
             return fn(*args, **kwargs)
         do_work.__name__ = fn.__name__   # Reset name for interactive()
+        do_work.__qualname__ = fn.__qualname__   # and for hook_stats
+        do_work.__module__ = fn.__module__
         do_work.__doc__ = fn.__doc__
+        do_work = hook_stats.instrument(
+            self.name, hook_stats.callback_label(fn), do_work)
         GPS.Hook(self.name).add(do_work, last=self.last)
         return do_work
 
@@ -405,6 +410,39 @@ def make_interactive(callback, category="General", filter="", menu="", key="",
     return a, m
 
 
+def make_lazy_interactive(module_name, callback_name, name, **kwargs):
+    """
+    Declare a new GPS action whose code lives in a plugin that is only
+    imported the first time the action is executed. This keeps costly
+    plugins (large imports, XML parsing, hooks,...) out of GPS startup.
+
+    The plugin is a python module found on sys.path but not loaded
+    automatically (for instance in the no-autoload directory). When the
+    action is first executed, `module_name` is imported and the Module
+    classes it defines are set up (see modules.load_plugin), then the
+    function `callback_name` of that module is called. The module should
+    not declare the action itself.
+
+    :param str module_name: the name of the python module to import.
+    :param str callback_name: the name of the function to call in that
+      module, as for the callback of make_interactive.
+    :param str name: the name of the action.
+    :param kwargs: the other parameters of make_interactive, which are
+      applied immediately. The `filter` and `contextual` parameters must
+      not come from the lazy module. The description should be given
+      explicitly, since the callback's documentation is not available.
+    :return: a tuple (GPS.Action, GPS.Menu), as for make_interactive
+    """
+
+    def callback():
+        import modules
+        module = modules.load_plugin(module_name)
+        return getattr(module, callback_name)()
+
+    callback.__name__ = callback_name
+    return make_interactive(callback, name=name, **kwargs)
+
+
 # noinspection PyPep8Naming
 class interactive:
     """
@@ -431,12 +431,22 @@ class gnatMakeProc:
             # The behavior is then to try getting a valid gnat make command
             # from the local machine, and fallback to the default switches if
             # not found.
-            process = GPS.Process(
-                "\"\"\"" + gnatCmd + "\"\"\" " + args,
-                "^.+\r?$",
-                on_match=self.__add_switch_callback,
-                remote_server="Build_Server")
-            process.get_result()
+            if GPS.is_server_local("Build_Server"):
+                # The output of the help does not change until the tool
+                # does: replay it from the cache of tool probes.
+                output = os_utils.probe_output([gnatCmd] + args.split())
+                pos = 0
+                for m in re.finditer("^.+\r?$", output, re.MULTILINE):
+                    self.__add_switch_callback(
+                        None, m.group(0), output[pos:m.start()])
+                    pos = m.end()
+            else:
+                process = GPS.Process(
+                    "\"\"\"" + gnatCmd + "\"\"\" " + args,
+                    "^.+\r?$",
+                    on_match=self.__add_switch_callback,
+                    remote_server="Build_Server")
+                process.get_result()
         return True
 
 # Constant definitions: those are switches that we define for all versions of
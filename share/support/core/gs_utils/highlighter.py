@@ -4,6 +4,7 @@ files.
 """
 
 import GPS
+import re
 import time
 import traceback
 
@@ -653,7 +654,178 @@ class Location_Highlighter(Background_Highlighter):
                             continue
 
 
-class Regexp_Highlighter(On_The_Fly_Highlighter):
+class Pattern_Scanner(On_The_Fly_Highlighter):
+
+    """
+    The service shared by all the instances of Regexp_Highlighter and
+    Text_Highlighter. Rather than each highlighter searching the editor on
+    its own, every batch of lines is fetched once with
+    `GPS.EditorBuffer.get_chars`, and the patterns of all the registered
+    highlighters are matched in memory, in a single pass over the batch.
+
+    The patterns are also merged in a single alternation, which is used to
+    skip the batches where none of them matches. It is not used to find the
+    matches themselves, since an alternation would not report the matches of
+    a highlighter that overlap the matches of another one.
+
+    Highlighters whose pattern cannot be compiled as a Python regular
+    expression fall back to searching the editor (see their process method).
+    """
+
+    def __init__(self):
+        self.highlighters = []
+        self.__combined = None
+        On_The_Fly_Highlighter.__init__(self, style=None)
+
+    def register(self, highlighter):
+        """
+        Start highlighting all buffers with highlighter.
+
+        :param Pattern_Highlighter highlighter:
+        """
+        if highlighter not in self.highlighters:
+            self.highlighters.append(highlighter)
+            self.context_lines = max(
+                self.context_lines, highlighter.context_lines)
+            self.__combined = None
+
+        for buffer in GPS.EditorBuffer.list():
+            if highlighter.must_highlight(buffer):
+                self.start_highlight(buffer)
+
+    def unregister(self, highlighter):
+        """
+        Stop highlighting buffers with highlighter.
+
+        :param Pattern_Highlighter highlighter:
+        """
+        if highlighter in self.highlighters:
+            self.highlighters.remove(highlighter)
+            self.context_lines = max(
+                [h.context_lines for h in self.highlighters] + [0])
+            self.__combined = None
+
+    def __highlighters_for(self, buffer):
+        return [h for h in self.highlighters if h.must_highlight(buffer)]
+
+    def combined_pattern(self):
+        """
+        The alternation of the patterns of all the registered highlighters.
+
+        :return: the compiled regular expression, or None if one of the
+           patterns cannot be compiled.
+        """
+        if self.__combined is None:
+            patterns = [h.pattern() for h in self.highlighters]
+            try:
+                if None in patterns:
+                    raise re.error("pattern not supported")
+                self.__combined = re.compile(
+                    "|".join("(?:{0})".format(p.pattern) for p in patterns),
+                    re.IGNORECASE | re.MULTILINE)
+            except re.error:
+                self.__combined = False
+
+        return self.__combined or None
+
+    def must_highlight(self, buffer):  # overriding
+        return bool(self.__highlighters_for(buffer))
+
+    def start_highlight(self, buffer=None, line=None, context=None):
+        # overriding
+        if buffer is not None:
+            for h in self.__highlighters_for(buffer):
+                if h.style.use_messages():
+                    h.style.remove(buffer)
+        On_The_Fly_Highlighter.start_highlight(self, buffer, line, context)
+
+    def process(self, start, end):  # overriding
+        buffer = start.buffer()
+        highlighters = self.__highlighters_for(buffer)
+
+        for h in highlighters:
+            h.style.remove(start, end)
+
+        scanned = [h for h in highlighters if h.pattern() is not None]
+        for h in highlighters:
+            if h.pattern() is None:
+                h.process(start, end)
+
+        if not scanned:
+            return
+
+        text = buffer.get_chars(start, end)
+
+        if len(scanned) > 1:
+            combined = self.combined_pattern()
+            if combined is not None and not combined.search(text):
+                return
+
+        matches = []
+        for h in scanned:
+            matches.extend(
+                (m.start(), m.end(), h)
+                for m in h.pattern().finditer(text) if m.end() > m.start())
+
+        if not matches:
+            return
+
+        # Apply all the styles in a single pass over the batch, moving the
+        # location forward from match to match.
+        matches.sort(key=lambda m: m[0])
+        loc = start
+        offset = 0
+        for match_start, match_end, h in matches:
+            loc = loc + (match_start - offset)
+            offset = match_start
+            h.highlighted += 1
+            h.style.apply(loc, loc + (match_end - match_start - 1))
+
+
+# The instance of Pattern_Scanner, created when the first highlighter is
+# started.
+_scanner = None
+
+
+def pattern_scanner():
+    """
+    Return the service used by Regexp_Highlighter and Text_Highlighter.
+
+    :rtype: Pattern_Scanner
+    """
+    global _scanner
+    if _scanner is None:
+        _scanner = Pattern_Scanner()
+    return _scanner
+
+
+class Pattern_Highlighter(On_The_Fly_Highlighter):
+
+    """
+    An abstract highlighter for a pattern, which is matched by the shared
+    Pattern_Scanner rather than by searching the editor.
+    """
+
+    def pattern(self):
+        """
+        The regular expression used by the Pattern_Scanner.
+
+        :return: the compiled regular expression, or None if the pattern
+           cannot be compiled by Python, in which case process is called.
+        """
+        return None
+
+    def start(self):  # overriding
+        pattern_scanner().register(self)
+
+    def stop(self):  # overriding
+        pattern_scanner().unregister(self)
+        for buffer in GPS.EditorBuffer.list():
+            if self.must_highlight(buffer):
+                self.style.remove(buffer)
+
+
+class Regexp_Highlighter(Pattern_Highlighter):
 
     """
     The Regexp_Highlighter is a concrete implementation to highlight
@@ -690,6 +862,9 @@ class Regexp_Highlighter(On_The_Fly_Highlighter):
             style=OverlayStyle(
                 name="spark", foreground="red"))
 
+    All the instances share a single Pattern_Scanner, which reads each part
+    of the editors once for all of them.
+
     :param string regexp: the regular expression to search for.
        It should preferrably apply to a single line, since highlighting
        is done on small sections of the editor at a time, and it might
@@ -700,10 +875,24 @@ class Regexp_Highlighter(On_The_Fly_Highlighter):
 
     def __init__(self, regexp, style, context_lines=0):
         self.regexp = regexp
+        self.__pattern = None
         On_The_Fly_Highlighter.__init__(
             self, context_lines=context_lines, style=style)
 
+    def pattern(self):  # overriding
+        if self.__pattern is None:
+            try:
+                self.__pattern = re.compile(
+                    self.regexp, re.IGNORECASE | re.MULTILINE)
+            except re.error:
+                self.__pattern = False
+        return self.__pattern or None
+
     def process(self, start, end):
+        """
+        Search the editor for the regular expression. This is only used when
+        the regular expression is not supported by Python.
+        """
         while True:
             start = start.search(
                 self.regexp, regexp=True, dialog_on_failure=False)
@@ -713,7 +902,7 @@ class Regexp_Highlighter(On_The_Fly_Highlighter):
             start = start[1] + 1
 
 
-class Text_Highlighter(On_The_Fly_Highlighter):
+class Text_Highlighter(Pattern_Highlighter):
 
     """
     Similar to Regexp_Highlighter, but highlights constant text instead of
@@ -731,10 +920,23 @@ class Text_Highlighter(On_The_Fly_Highlighter):
     def __init__(self, text, style, whole_word=False, context_lines=0):
         self.text = text
         self.whole_word = whole_word
+        self.__pattern = None
         On_The_Fly_Highlighter.__init__(
             self, context_lines=context_lines, style=style)
 
+    def pattern(self):  # overriding
+        if self.__pattern is None:
+            regexp = re.escape(self.text)
+            if self.whole_word:
+                regexp = r"(?<!\w){0}(?!\w)".format(regexp)
+            self.__pattern = re.compile(regexp, re.IGNORECASE)
+        return self.__pattern
+
     def process(self, start, end):
+        """
+        Search the editor for the text. This is not used by the
+        Pattern_Scanner, but can be called to highlight a range directly.
+        """
         while True:
             start = start.search(
                 self.text, regexp=False, dialog_on_failure=False,
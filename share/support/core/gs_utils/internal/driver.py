@@ -12,6 +12,7 @@ from gs_utils.internal.asserts import SUCCESS, FAILURE, NOT_RUN, XFAIL, get_exit
 
 # Some of the imports here are necessary for some of the tests
 from workflows.promises import hook, timeout, wait_tasks, wait_idle
+import workflows.promises as promises
 
 
 def do_exit(timeout):
@@ -72,6 +73,16 @@ def run_test_driver(action_fn):
                    traceback.format_exc()))
 
         finally:
+            # Report the time spent in the workflows waits, for the
+            # testsuite to display
+            GPS.Logger('TESTSUITE').log(
+                "Total wait time: %.3fs" % promises.wait_time)
+            try:
+                with open('wait_time.out', 'w') as f:
+                    f.write(str(promises.wait_time))
+            except IOError:
+                pass
+
             if "GPS_PREVENT_EXIT" not in os.environ:
                 if last_result in (SUCCESS, FAILURE, NOT_RUN, XFAIL):
                     status = last_result
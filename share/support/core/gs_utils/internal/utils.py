@@ -14,7 +14,7 @@ from pygps.project import *
 import traceback
 import platform
 import workflows
-from workflows.promises import Promise, timeout, known_tasks
+from workflows.promises import Promise, timeout, known_tasks, wait_until
 
 
 system_is_cygwin = ('uname' in os.__dict__ and
@@ -183,14 +183,11 @@ def safe_exit(expected_commands=[], delay=0, force=1):
 def wait_for_mdi_child(name, step=500, n=10):
     """
     Wait for the MDI child designated by :param str name: to be added
-    to the MDI, waiting for the time specified in :param int step: n
-    times.
+    to the MDI, waiting at most :param int step: times n milliseconds.
     """
 
-    k = 0
-    while GPS.MDI.get(name) is None and k < n:
-        yield timeout(step)
-        k += 1
+    yield wait_until(lambda: GPS.MDI.get(name) is not None,
+                     timeout=step * n)
 
 class TimeoutExceeded(Exception):
     pass
@@ -208,22 +205,17 @@ def wait_until_true(test_func, *args, **kwargs):
     wait until X milliseconds at most; if the timeout is exceeded,
     raise TimeoutExceeded.
     """
-    k = 0
-    n = 30
-    increment = 500
-    total_waited = 0
+    max_wait = 15000
     timeout = None
     if "timeout" in kwargs:
         timeout = kwargs["timeout"]
         del(kwargs["timeout"])
 
-    while not test_func(*args, **kwargs) and k < n:
-        # Check for the timeout
-        if timeout is not None and total_waited > timeout:
-            raise TimeoutExceeded
-        yield workflows.promises.timeout(increment)
-        total_waited += increment
-        k += 1
+    found = yield wait_until(
+        lambda: test_func(*args, **kwargs),
+        timeout=max_wait if timeout is None else min(timeout, max_wait))
+    if not found and timeout is not None and timeout < max_wait:
+        raise TimeoutExceeded
 
 
 @workflows.run_as_workflow
@@ -255,23 +247,22 @@ def wait_DAP_server(method=""):
 @workflows.run_as_workflow
 def wait_until_not_busy(debugger, t=100):
     """
-    Wait until the given GPS.Debugger is not busy
+    Wait until the given GPS.Debugger is not busy.
+    The state is checked each time the debugger's state changes, so `t` is
+    no longer used.
     """
 
-    while debugger.is_busy():
-        yield timeout(t)
+    yield wait_until(lambda: not debugger.is_busy(),
+                     hooks=["debugger_state_changed"])
 
 
 def wait_for_entities(cb, *args, **kwargs):
     """Execute cb when all entities have finished loading.
        This function is not blocking"""
 
-    def on_timeout(timeout):
-        if GPS.Command.list() == []:
-            timeout.remove()
-            cb(*args, **kwargs)
-
-    GPS.Timeout(200, on_timeout)
+    wait_until(lambda: GPS.Command.list() == [],
+               hooks=["task_finished"]).then(
+        lambda result: cb(*args, **kwargs))
 
 
 def wait_for_tasks(cb, *args, **kwargs):
@@ -280,17 +271,15 @@ def wait_for_tasks(cb, *args, **kwargs):
     def internal_on_idle():
         cb(*args, **kwargs)
 
-    def internal_wait_until_no_tasks(timeout):
-        if GPS.Task.list() == []:
-            timeout.remove()
-
-            # Tasks can update locations view, so wait until locations view
-            # has completed its operations also.
+    def internal_on_no_tasks(result):
+        # Tasks can update locations view, so wait until locations view
+        # has completed its operations also.
 
-            process_all_events()
-            GLib.idle_add(internal_on_idle)
+        process_all_events()
+        GLib.idle_add(internal_on_idle)
 
-    GPS.Timeout(400, internal_wait_until_no_tasks)
+    wait_until(lambda: GPS.Task.list() == [],
+               hooks=["task_finished"]).then(internal_on_no_tasks)
 
 
 def wait_for_idle(cb, *args, **kwargs):
@@ -0,0 +1,194 @@
+"""
+Instrumentation of the python hook callbacks.
+
+When the HOOK_STATS trace is active, the callbacks connected through
+modules.Module (methods named after a hook) and through the gs_utils.hook
+decorator are wrapped, so that the number of calls, the cumulative time
+and the maximum latency of each of them are recorded, per hook.
+Otherwise, callbacks are connected unchanged and this module costs
+nothing.
+
+The statistics are available through get_stats(), and are displayed in
+the "Hook Statistics" view.
+
+Calling set_latency_budget() makes callbacks of the hooks listed in
+DEMOTABLE_HOOKS that repeatedly exceed the budget run from a timeout
+instead, which only processes the last call received for each of their
+parameters (a file for instance). This is the same as connecting them
+with GPS.Hook.add_debounce.
+"""
+
+import GPS
+import functools
+import time
+
+try:
+    # While building the doc, we might not have access to this module
+    from gi.repository import GLib
+except ImportError:
+    pass
+
+DEMOTABLE_HOOKS = ("location_changed", "context_changed", "buffer_edited",
+                   "semantic_tree_updated")
+# Hooks run on every cursor move or keystroke, whose callbacks return no
+# value, and which can therefore be demoted
+
+DEMOTE_AFTER = 3
+# Number of consecutive calls over the budget before a callback is demoted
+
+DEMOTED_DELAY_MS = 100
+# How long a demoted callback waits for more calls before it runs
+
+_log = GPS.Logger("HOOK_STATS")
+
+enabled = _log.active
+# Whether new callbacks are instrumented
+
+latency_budget_ms = None
+# The latency budget for the callbacks of DEMOTABLE_HOOKS, or None
+
+_stats = {}
+# (hook name, callback label) -> Hook_Stats
+
+
+class Hook_Stats(object):
+    """
+    The statistics for one callback of one hook. Times are in seconds.
+    """
+
+    __slots__ = ("hook", "label", "calls", "total", "max", "over_budget",
+                 "demotable", "demoted")
+
+    def __init__(self, hook, label, demotable):
+        self.hook = hook
+        self.label = label
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.over_budget = 0   # consecutive calls over the budget
+        self.demotable = demotable and hook in DEMOTABLE_HOOKS
+        self.demoted = False
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+
+def get_stats():
+    """
+    Return the statistics of all instrumented callbacks.
+
+    :return: a list of Hook_Stats, sorted by decreasing cumulative time
+    """
+    return sorted(_stats.values(), key=lambda s: s.total, reverse=True)
+
+
+def reset():
+    """
+    Reset the statistics. Demoted callbacks remain demoted.
+    """
+    for s in _stats.values():
+        s.calls = 0
+        s.total = 0.0
+        s.max = 0.0
+        s.over_budget = 0
+
+
+def set_latency_budget(budget_ms):
+    """
+    Set the latency budget, in milliseconds, above which the callbacks of
+    DEMOTABLE_HOOKS get demoted. None disables automatic demotion.
+    """
+    global latency_budget_ms
+    latency_budget_ms = budget_ms
+
+
+def demote(hook, label, demoted=True):
+    """
+    Demote (or restore) the given callback.
+
+    :param str hook: the name of the hook
+    :param str label: the label of the callback, as in Hook_Stats
+    """
+    s = _stats.get((hook, label))
+    if s is not None and s.demotable:
+        s.demoted = demoted
+
+
+def callback_label(fn):
+    """
+    A label identifying the callback `fn` in the statistics.
+    """
+    return "%s.%s" % (
+        getattr(fn, "__module__", None) or "?",
+        getattr(fn, "__qualname__", None) or getattr(fn, "__name__", "?"))
+
+
+def instrument(hook, label, fn, demotable=True):
+    """
+    Wrap the callback `fn`, which is about to be connected to `hook`, so
+    that its calls are recorded. `fn` receives the hook name as its first
+    parameter. When the instrumentation is disabled, `fn` is returned
+    unchanged.
+
+    :param str label: identifies the callback in the statistics.
+    :param bool demotable: false if the callback must always be run
+       immediately, for instance because it is already debounced.
+    :return: the function to connect to the hook
+    """
+    if not enabled:
+        return fn
+
+    s = _stats.get((hook, label))
+    if s is None:
+        s = _stats[(hook, label)] = Hook_Stats(hook, label, demotable)
+
+    pending = {}   # parameter -> the last arguments received for it
+    timeout = []
+
+    def run(args, kwargs):
+        start = time.time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            s.calls += 1
+            s.total += elapsed
+            if elapsed > s.max:
+                s.max = elapsed
+
+            if s.demotable and not s.demoted and latency_budget_ms:
+                if elapsed * 1000 > latency_budget_ms:
+                    s.over_budget += 1
+                    if s.over_budget >= DEMOTE_AFTER:
+                        s.demoted = True
+                        _log.log("Demoting %s on %s: %.1fms" % (
+                            label, hook, elapsed * 1000))
+                else:
+                    s.over_budget = 0
+
+    def run_pending():
+        del timeout[:]
+        calls = list(pending.values())
+        pending.clear()
+        for args, kwargs in calls:
+            run(args, kwargs)
+        return False
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not s.demoted:
+            return run(args, kwargs)
+
+        # Only keep the last call for the first parameter after the
+        # hook name
+        key = args[1] if len(args) > 1 else None
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+        pending[key] = (args, kwargs)
+        if not timeout:
+            timeout.append(GLib.timeout_add(DEMOTED_DELAY_MS, run_pending))
+
+    return wrapper
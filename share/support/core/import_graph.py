@@ -0,0 +1,292 @@
+"""
+An index of the dependencies between the source files of the project, as
+reported by GPS.File.imports (the 'with' clauses and '#include'
+directives found in the cross-reference information).
+
+The imports of a file are only queried once, the first time they are
+needed, and are kept until the project view changes. When the
+cross-reference information is updated, the files modified since their
+imports were queried are queried again. So are the files for which no
+import was known before the first update (for instance because the project
+was not compiled yet): after it, a file without imports is a leaf.
+
+The graph supports shortest paths (the "why is this file imported"
+question), all paths up to a given length, reverse dependencies and
+strongly connected components, to detect import cycles.
+"""
+
+import GPS
+import collections
+import os.path
+
+
+def _stamp(file):
+    try:
+        return os.path.getmtime(file.path)
+    except OSError:
+        return None
+
+
+def _is_ada_body(file):
+    base, ext = os.path.splitext(file.path)
+    return ext == ".adb" or (ext == ".ada" and base.endswith(".2"))
+
+
+class Import_Graph(object):
+    """
+    The import graph of the project, with or without the implicit
+    dependencies. Use get_graph() rather than creating instances.
+
+    Ada bodies are considered to import their spec, which imports() does
+    not report.
+    """
+
+    def __init__(self, include_implicit):
+        self.include_implicit = include_implicit
+
+        self._imports = {}
+        # GPS.File -> list of the GPS.File it imports
+
+        self._stamps = {}
+        # GPS.File -> modification time when its imports were queried
+
+        self._no_xref = set()
+        # The files for which no import was known before the first update
+        # of the cross-reference information
+
+        self._xref_loaded = False
+        # Whether the cross-reference information was updated since the
+        # graph was created
+
+        self._projects = {}
+        # GPS.File -> its GPS.Project, or None
+
+        self._importers = None
+        # GPS.File -> list of the GPS.File importing it, only computed
+        # when needed and reset when imports change
+
+        self._complete = False
+        # Whether the imports of all project sources were queried
+
+    def imports(self, file):
+        """
+        The files imported by `file`, excluding system files.
+
+        :param GPS.File file: the importing file
+        :rtype: list of GPS.File
+        """
+        result = self._imports.get(file)
+        if result is None:
+            result = [f for f in file.imports(
+                include_implicit=self.include_implicit,
+                include_system=False) if f]
+            if not result and not self._xref_loaded:
+                self._no_xref.add(file)
+            if _is_ada_body(file):
+                spec = file.other_file()
+                if spec and spec != file and spec not in result:
+                    result.append(spec)
+            self._imports[file] = result
+            self._stamps[file] = _stamp(file)
+            self._importers = None
+        return result
+
+    def project(self, file):
+        """
+        The project that `file` belongs to, or None.
+
+        :rtype: GPS.Project
+        """
+        try:
+            return self._projects[file]
+        except KeyError:
+            p = self._projects[file] = file.project(default_to_root=False)
+            return p
+
+    def build(self):
+        """Query the imports of all the sources of the project"""
+        if not self._complete:
+            for s in GPS.Project.root().sources(recursive=True):
+                self.imports(s)
+            self._complete = True
+
+    def invalidate(self, files):
+        """
+        Forget the imports of `files`, which will be queried again when
+        needed.
+        """
+        for f in files:
+            self._imports.pop(f, None)
+            self._stamps.pop(f, None)
+            self._projects.pop(f, None)
+            self._no_xref.discard(f)
+        self._importers = None
+        self._complete = False
+
+    def stale_files(self):
+        """
+        The files modified since their imports were queried, and those for
+        which no import was known before the first update of the
+        cross-reference information
+        """
+        return [f for f, stamp in self._stamps.items()
+                if f in self._no_xref or _stamp(f) != stamp]
+
+    def xref_updated(self):
+        """
+        Forget the imports of the stale files, after the cross-reference
+        information was updated
+        """
+        stale = self.stale_files()
+        if stale:
+            self.invalidate(stale)
+        self._xref_loaded = True
+
+    def importers(self, file):
+        """
+        The files that import `file`, among all the sources of the project.
+
+        :rtype: list of GPS.File
+        """
+        if self._importers is None or not self._complete:
+            self.build()
+            self._importers = collections.defaultdict(list)
+            for f, imports in self._imports.items():
+                for imp in imports:
+                    self._importers[imp].append(f)
+        return self._importers.get(file, [])
+
+    def shortest_path(self, from_file, to_file):
+        """
+        One of the shortest chains of imports from `from_file` to
+        `to_file`, found with a breadth-first search.
+
+        :return: the list of files from from_file to to_file (included), or
+           None if from_file does not depend on to_file.
+        """
+        parents = {from_file: None}
+        queue = collections.deque([from_file])
+        while queue:
+            file = queue.popleft()
+            if file == to_file:
+                path = []
+                while file is not None:
+                    path.append(file)
+                    file = parents[file]
+                path.reverse()
+                return path
+
+            for f in self.imports(file):
+                if f not in parents:
+                    parents[f] = file
+                    queue.append(f)
+        return None
+
+    def all_paths(self, from_file, to_file, max_length):
+        """
+        All the chains of imports from `from_file` to `to_file` with at most
+        max_length imports, without cycles.
+
+        :return: a list of lists of files, from from_file to to_file
+        """
+        result = []
+        path = [from_file]
+        on_path = {from_file}
+        stack = [iter(self.imports(from_file))]
+        while stack:
+            f = next(stack[-1], None)
+            if f is None:
+                stack.pop()
+                on_path.discard(path.pop())
+            elif f == to_file:
+                result.append(path + [f])
+            elif f not in on_path and len(path) < max_length:
+                path.append(f)
+                on_path.add(f)
+                stack.append(iter(self.imports(f)))
+        return result
+
+    def strongly_connected_components(self):
+        """
+        The strongly connected components of the graph of all the project
+        sources, computed with Tarjan's algorithm. Each component with more
+        than one file is a cycle of imports.
+
+        :return: a list of lists of files
+        """
+        self.build()
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        result = []
+
+        for root in list(self._imports):
+            if root in index:
+                continue
+
+            # Iterative version of the recursive algorithm, to support deep
+            # graphs
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.imports(root)))]
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.imports(child))))
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        f = stack.pop()
+                        on_stack.discard(f)
+                        component.append(f)
+                        if f == node:
+                            break
+                    result.append(component)
+        return result
+
+
+_graphs = {}
+# include_implicit -> Import_Graph
+
+
+def get_graph(include_implicit=True):
+    """
+    The import graph of the current project view.
+
+    :param bool include_implicit: whether implicit dependencies are part of
+       the graph, as in GPS.File.imports
+    :rtype: Import_Graph
+    """
+    g = _graphs.get(include_implicit)
+    if g is None:
+        g = _graphs[include_implicit] = Import_Graph(include_implicit)
+    return g
+
+
+def _on_project_view_changed(hook):
+    _graphs.clear()
+
+
+def _on_xref_updated(hook):
+    for g in _graphs.values():
+        g.xref_updated()
+
+
+GPS.Hook("project_view_changed").add(_on_project_view_changed)
+GPS.Hook("xref_updated").add(_on_xref_updated)
@@ -3,19 +3,147 @@ import ctypes
 import libadalang as lal
 
 
+_indexes = {}
+# File name -> (version, characters count, _Decl_Index) for the buffers
+# whose declarations have been indexed
+
+_versions = {}
+# File name -> number of times the buffer was edited or reloaded
+
+
+def _invalidate(hook, file):
+    name = file.name()
+    _versions[name] = _versions.get(name, 0) + 1
+    _indexes.pop(name, None)
+
+
+def _forget(hook, file):
+    _versions.pop(file.name(), None)
+    _indexes.pop(file.name(), None)
+
+
+GPS.Hook("buffer_edited").add(_invalidate)
+GPS.Hook("file_reloaded").add(_invalidate)
+GPS.Hook("file_closed").add(_forget)
+
+
+def _start(node):
+    start = node.sloc_range.start
+    return (start.line, start.column)
+
+
+def _matcher(kind):
+    """Return a predicate for the nodes of the given kind, which is either
+    a kind name (an exact match, as for node.kind_name), or a class or tuple
+    of classes (as for isinstance).
+    """
+    if isinstance(kind, str):
+        return lambda x: x.kind_name == kind
+    return lambda x: isinstance(x, kind)
+
+
+def _is_declaration_kind(kind):
+    """Whether all the nodes of the given kind are declarations"""
+    if isinstance(kind, str):
+        kind = getattr(lal, kind, None)
+        if not isinstance(kind, type):
+            return False
+    if not isinstance(kind, tuple):
+        kind = (kind, )
+    return all(issubclass(k, lal.BasicDecl) for k in kind)
+
+
+class _Decl_Index(object):
+    """The declarations of an analysis unit, indexed by start location"""
+
+    def __init__(self, unit):
+        self.by_start = {}
+        if unit.root:
+            for decl in unit.root.findall(lal.BasicDecl):
+                self.by_start.setdefault(_start(decl), []).append(decl)
+
+    def find(self, line, column, matches):
+        for decl in self.by_start.get((line, column), ()):
+            if matches(decl):
+                return decl
+        return None
+
+
+def _decl_index(buf):
+    """Return the declarations index for the buffer, computing it if the
+    buffer was modified since it was last computed.
+    """
+    name = buf.file().name()
+    version = (_versions.get(name, 0), buf.characters_count())
+    cached = _indexes.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+    index = _Decl_Index(buf.get_analysis_unit())
+    _indexes[name] = (version, index)
+    return index
+
+
+def _node_at(unit, line, column, matches):
+    """Return the outermost node starting at line, column for which
+    matches returns True, or None, as a preorder traversal would find.
+    All the nodes that start at this location are either the deepest node
+    that contains it, or parents of that node, so this only looks at as
+    many nodes as the depth of the tree.
+    """
+    if not unit.root:
+        return None
+    sloc = (line, column)
+    result = None
+    node = unit.root.lookup(lal.Sloc(line, column))
+    while node is not None and _start(node) == sloc:
+        if matches(node):
+            result = node
+        node = node.parent
+    return result
+
+
 def node(file, line, column, kind_name):
     """Return the node at the given coordinates and with the given kind.
 
     If the buffer for this file is not open, or the node doesn't exist,
     return None.
     """
+    return nodes(file, [(line, column, kind_name)])[0]
+
+
+def nodes(file, queries):
+    """Return the nodes for a list of (line, column, kind) triples, where
+    kind is either a kind name or a class or tuple of classes of nodes.
+    This is the same as calling node() for each triple, but only gets the
+    analysis unit once, and looks up declarations in an index that is kept
+    until the buffer is modified.
+
+    :return: a list with the node for each query, or None if the node
+        doesn't exist or the buffer for this file is not open.
+    """
     buf = GPS.EditorBuffer.get(file, open=False)
     if not buf:
-        return None
+        return [None] * len(queries)
+
     unit = buf.get_analysis_unit()
-    return unit.root.find(lambda x: x.sloc_range.start.line == line and
-                          x.sloc_range.start.column == column and
-                          x.kind_name == kind_name)
+    index = None
+    result = []
+    for line, column, kind in queries:
+        if _is_declaration_kind(kind):
+            if index is None:
+                index = _decl_index(buf)
+            result.append(index.find(line, column, _matcher(kind)))
+        else:
+            result.append(_node_at(unit, line, column, _matcher(kind)))
+    return result
+
+
+def declaration(file, line, column, kinds=lal.BasicDecl):
+    """Return the declaration of one of the given kinds (a class or tuple
+    of classes, subclasses of lal.BasicDecl) which starts at the given
+    coordinates, or None.
+    """
+    return nodes(file, [(line, column, kinds)])[0]
 
 
 def get_enclosing_subprogram(node):
@@ -14,6 +14,64 @@ COL_START_LINE = 2
 COL_START_COLUMN = 3
 COL_END_LINE = 4
 COL_END_COLUMN = 5
+COL_NODE = 6
+
+
+def _sloc_start(node):
+    start = node.sloc_range.start
+    return (start.line, start.column)
+
+
+def _sloc_end(node):
+    end = node.sloc_range.end
+    return (end.line, end.column)
+
+
+def _node_key(node):
+    """A key to compare nodes across calls"""
+    return (node.kind_name, _sloc_start(node), _sloc_end(node))
+
+
+def _child_at(node, sloc):
+    """Return the last child of node that encompasses sloc, a (line, column)
+       tuple, or None. The children are sorted by location, so this is a
+       binary search.
+    """
+    found = None
+    lo = 0
+    hi = len(node)
+    while lo < hi:
+        mid = (lo + hi) // 2
+
+        # Skip null children
+        j = mid
+        child = node[j]
+        while child is None and j + 1 < hi:
+            j += 1
+            child = node[j]
+
+        if child is None or _sloc_start(child) > sloc:
+            hi = mid
+        else:
+            found = child
+            lo = j + 1
+
+    if found is not None and sloc <= _sloc_end(found):
+        return found
+    return None
+
+
+def _path_to(root, sloc):
+    """Return the list of nodes, starting at root, that encompass sloc,
+       a (line, column) tuple.
+    """
+    path = []
+    node = root
+    if node is not None and _sloc_start(node) <= sloc <= _sloc_end(node):
+        while node is not None:
+            path.append(node)
+            node = _child_at(node, sloc)
+    return path
 
 
 class LAL_View_Widget():
@@ -35,7 +93,7 @@ class LAL_View_Widget():
         self.message_label.set_ellipsize(Pango.EllipsizeMode.END)
 
         # The model: see COL_* constants above
-        self.store = Gtk.TreeStore(str, Gdk.RGBA, int, int, int, int)
+        self.store = Gtk.TreeStore(str, Gdk.RGBA, int, int, int, int, object)
 
         # Initialize the tree view
         self.view = Gtk.TreeView(self.store)
@@ -47,6 +105,7 @@ class LAL_View_Widget():
         self.node_col.add_attribute(cell, "foreground-rgba", COL_FOREGROUND)
         self.view.append_column(self.node_col)
         self.view.connect("button_press_event", self._on_view_button_press)
+        self.view.connect("test-expand-row", self._on_test_expand_row)
 
         full_mode_toggle = Gtk.CheckButton("full tree (slow)")
         full_mode_toggle.set_name("lal_view full toggle")
@@ -80,6 +139,9 @@ class LAL_View_Widget():
         # The list of iters that are currently highlighted
         self.highlighted_iters = []
 
+        # Identifies the deepest node shown in compact mode
+        self.compact_key = None
+
         # The colors to highlight the tree with
         self.default_fg = Gdk.RGBA()
         self.highlight_fg = Gdk.RGBA()
@@ -159,76 +221,90 @@ class LAL_View_Widget():
         self.highlight_fg.parse(highlight.split('@')[1])
 
         if prev != (self.default_fg, self.highlight_fg):
+            self.compact_key = None
             self.show_current_location(self.line, self.column)
 
-    def _add_node(self, parent, node):
-        """Add a node as child of parent. parent can be None"""
-        if not node:
-            return
-
+    def _add_row(self, parent, node, expandable):
+        """Add a row for node as child of parent, which can be None.
+           If expandable, the row for the children of node are only created
+           when the row is expanded, see _on_test_expand_row.
+        """
         start_line = node.sloc_range.start.line
         start_column = node.sloc_range.start.column
         end_line = node.sloc_range.end.line
         end_column = node.sloc_range.end.column
 
-        if not self.compact_mode or (
-            (start_line, start_column) <=
-                (self.line, self.column) <=
-                (end_line, end_column)):
-
-            it = self.store.append(parent)
-            text = "<b>{}</b>{}".format(
-                # Uncomment this for a representation useful for debug:
-                # GLib.markup_escape_text(repr(node)),
-                node.kind_name,
-                " {}".format(GLib.markup_escape_text(node.text))
-                if start_line == end_line else "")
-
-            self.store[it] = [
-                text,
-                self.default_fg,
-                start_line,
-                start_column,
-                end_line,
-                end_column,
-            ]
-
-            for n in node.children:
-                self._add_node(it, n)
-
-    def _traverse_and_highlight(self, it, line, column):
-        """Traverse the subtree starting at iter it, and highlight the
-           nodes that encompass the location at line/column.
-
-           Return the deepest iter found that matches.
+        it = self.store.append(parent)
+        text = "<b>{}</b>{}".format(
+            # Uncomment this for a representation useful for debug:
+            # GLib.markup_escape_text(repr(node)),
+            node.kind_name,
+            " {}".format(GLib.markup_escape_text(node.text))
+            if start_line == end_line else "")
+
+        self.store[it] = [
+            text,
+            self.default_fg,
+            start_line,
+            start_column,
+            end_line,
+            end_column,
+            node,
+        ]
+
+        if expandable and len(node) > 0:
+            # A placeholder, so that the row can be expanded
+            self.store.append(it, ["", self.default_fg, 0, 0, 0, 0, None])
+
+        return it
+
+    def _populate(self, it):
+        """Create the rows for the children of the node at iter it, if
+           this was not done yet.
         """
-        lowest_found = None
         child = self.store.iter_children(it)
-        while child:
-            row = self.store[child]
-
-            if row[COL_START_LINE] > line:
-                # We are past the point where the nodes will match the
-                # location: we can stop traversing.
-                return lowest_found
+        if child is None or self.store[child][COL_NODE] is not None:
+            return
 
-            if ((row[COL_START_LINE], row[COL_START_COLUMN]) <=
-                (line, column) <=
-                    (row[COL_END_LINE], row[COL_END_COLUMN])):
+        self.store.remove(child)
+        for node in self.store[it][COL_NODE].children:
+            if node is not None:
+                self._add_row(it, node, True)
 
-                # This node encompasses the location: highlight it...
-                lowest_found = child
-                self.highlighted_iters.append(child)
-                row[COL_FOREGROUND] = self.highlight_fg
+    def _on_test_expand_row(self, view, it, path):
+        self._populate(it)
+        return False
 
-                # ... and look below it for more
-                below = self._traverse_and_highlight(child, line, column)
-                if below:
-                    lowest_found = below
+    def _row_of(self, parent, node):
+        """Return the iter for the row of node, among the children of the
+           iter parent (None for the root). The rows are sorted by start
+           location, so this is a binary search.
+        """
+        if parent is not None:
+            self._populate(parent)
+
+        start = _sloc_start(node)
+        lo = 0
+        hi = self.store.iter_n_children(parent)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = self.store[self.store.iter_nth_child(parent, mid)]
+            if (row[COL_START_LINE], row[COL_START_COLUMN]) < start:
+                lo = mid + 1
+            else:
+                hi = mid
 
+        # Several nodes, for instance empty lists, may start at the same
+        # location.
+        child = self.store.iter_nth_child(parent, lo)
+        while child is not None:
+            row = self.store[child]
+            if (row[COL_START_LINE], row[COL_START_COLUMN]) != start:
+                return None
+            if row[COL_NODE] == node:
+                return child
             child = self.store.iter_next(child)
-
-        return lowest_found
+        return None
 
     def show_current_location(self, line, column):
         """Highlight the given location in the tree and scroll to it"""
@@ -238,24 +314,40 @@ class LAL_View_Widget():
 
         self.line = line
         self.column = column
+        path = _path_to(self.unit.root, (line, column))
 
         if self.compact_mode:
-            self.store.clear()
-            self._add_node(None, self.unit.root)
-            self.view.expand_all()
+            # Only rebuild the tree when the deepest node has changed
+            key = _node_key(path[-1]) if path else None
+            if key != self.compact_key:
+                self.compact_key = key
+                self.store.clear()
+                it = None
+                for node in path:
+                    it = self._add_row(it, node, False)
+                self.view.expand_all()
         else:
             # Clear all previous highlighting
             for j in self.highlighted_iters:
                 self.store[j][COL_FOREGROUND] = self.default_fg
             self.highlighted_iters = []
 
-            lowest_found = self._traverse_and_highlight(None, line, column)
+            # Highlight the nodes that encompass the location, creating
+            # their rows as needed
+            lowest_found = None
+            for node in path:
+                it = self._row_of(lowest_found, node)
+                if it is None:
+                    break
+                lowest_found = it
+                self.highlighted_iters.append(it)
+                self.store[it][COL_FOREGROUND] = self.highlight_fg
 
-            # If we have finished iterating, scroll to the lowest found
             if lowest_found:
+                tree_path = self.store.get_path(lowest_found)
+                self.view.expand_to_path(tree_path)
                 self.view.scroll_to_cell(
-                    self.store.get_path(lowest_found),
-                    self.node_col, True, 0.5, 0.5)
+                    tree_path, self.node_col, True, 0.5, 0.5)
 
         # Display the current token in the label
         self.token = self.unit.lookup_token(libadalang.Sloc(line, column))
@@ -300,16 +392,17 @@ class LAL_View_Widget():
             self.message_label.set_text("{} loaded ok".format(
                 os.path.basename(buf.file().name())))
 
+        self.compact_key = None
         if self.compact_mode:
             # In compact mode, the view is regenerated when we change
             # locations
-            pass
+            self.view.set_model(self.store)
         else:
-            # In full mode, display the whole tree now
-            self._add_node(None, unit.root)
-
-        self.view.set_model(self.store)
-        self.view.expand_all()
+            # In full mode, display the top of the tree now. The rows are
+            # created as they are expanded.
+            it = self._add_row(None, unit.root, True)
+            self.view.set_model(self.store)
+            self.view.expand_row(self.store.get_path(it), False)
 
 
 class LAL_View(Module):
@@ -50,6 +50,9 @@ underscore) as a parameter to :func:`GPS.Browsers.View.create`.
 
 
 import GPS
+import hook_stats
+import importlib
+import startup_profiler
 import traceback
 import sys
 
@@ -74,6 +77,9 @@ class Module_Metaclass(type):
     modules = []
     modules_instances = []
 
+    pending_setup = []
+    # Instances created after "gps_started", and not set up yet
+
     def __new__(cls, name, bases, attrs):
         new_class = type.__new__(cls, name, bases, attrs)
 
@@ -85,7 +91,9 @@ class Module_Metaclass(type):
             if Module_Metaclass.gps_started:
                 inst = new_class()
                 Module_Metaclass.modules_instances.append(inst)
-                GLib.idle_add(lambda: inst._setup())
+                if not Module_Metaclass.pending_setup:
+                    GLib.idle_add(Module_Metaclass.setup_pending)
+                Module_Metaclass.pending_setup.append(inst)
 
                 # Simulate running the gps_started hook
                 pref = getattr(inst, "gps_started", None)
@@ -103,6 +111,24 @@ class Module_Metaclass(type):
                 Module_Metaclass.modules_instances.append(inst)
                 inst._setup()
 
+    @staticmethod
+    def setup_pending():
+        """
+        Set up the modules created since "gps_started" was run. This is
+        done in an idle callback, unless you call this function first.
+        """
+        pending = Module_Metaclass.pending_setup
+        Module_Metaclass.pending_setup = []
+        for inst in pending:
+            # A failure must not prevent setting up the other modules
+            try:
+                inst._setup()
+            except Exception as e:
+                GPS.Logger('MODULES').log(
+                    'While setting up module %s: %s\n%s' % (
+                        inst.name(), e, traceback.format_exc()))
+        return False
+
     @staticmethod
     def load_desktop(name, data):
         """
@@ -118,6 +144,22 @@ class Module_Metaclass(type):
 GPS.Hook("gps_started").add(Module_Metaclass.setup_all_modules)
 
 
+def load_plugin(module_name):
+    """
+    Import the python module `module_name` if needed, and set up the
+    Module classes it defines right away, rather than in an idle callback.
+    This is used for plugins whose loading is deferred until one of their
+    actions is executed (see gs_utils.make_lazy_interactive).
+
+    :return: the python module
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = importlib.import_module(module_name)
+    Module_Metaclass.setup_pending()
+    return module
+
+
 class Module(object, metaclass=Module_Metaclass):
 
     """
@@ -267,6 +309,9 @@ class Module(object, metaclass=Module_Metaclass):
                         return pref(hook, *args, **kwargs)
                 else:
                     return pref(*args, **kwargs)
+            internal = hook_stats.instrument(
+                hook_name, hook_stats.callback_label(pref), internal,
+                demotable=hook_name != "context_changed")
             setattr(self, "__%s" % hook_name, internal)
             p = getattr(self, "__%s" % hook_name)
             if hook_name == "context_changed":
@@ -311,6 +356,10 @@ class Module(object, metaclass=Module_Metaclass):
         Internal version of setup
         """
 
+        with startup_profiler.measure_setup(self.__class__.__module__):
+            self.__setup()
+
+    def __setup(self):
         self.__connect_hooks()
         if not self.view_title:
             self.view_title = self.__class__.__name__.replace("_", " ")
@@ -3,15 +3,63 @@
 # No user customization below this line
 ###########################################################################
 
+import GPS
+import json
 import os
 import os.path
+import time
 
+PROBES_CACHE_FILE = "tool_probes.json"
+# The name of the file, in GPS's home directory, where the outputs of the
+# tool probes are saved between sessions.
 
-def locate_exec_on_path(prog):
-    """Utility function to locate an executable on path."""
+_located = {}
+# The cache for locate_exec_on_path: (prog, PATH, PATHEXT) ->
+#    (path, path with extension, mtimes of the PATH directories)
+
+_probes = None
+# The cached outputs of the tool probes (see probe_output), loaded on
+# first use: key -> {"mtime": ..., "size": ..., "output": ...}
+
+_refreshing = set()
+# The keys of the probes being refreshed in the background
+
+_log = GPS.Logger("TOOL_PROBES")
+
+
+def _dir_mtimes(dirs):
+    """
+    Return the modification times of dirs, which change whenever a file
+    is added to or removed from one of them.
+    """
+    result = []
+    for dir in dirs:
+        try:
+            result.append(os.stat(dir).st_mtime)
+        except OSError:
+            result.append(None)
+    return result
+
+
+def _locate(prog):
+    """
+    Return a tuple (file, file with extension) for prog, or ("", "") if it
+    is not on the PATH.
+    The result is cached until PATH changes or a file is added to or
+    removed from one of its directories.
+    """
+
+    path = os.getenv('PATH') or ""
+    pathext = os.getenv('PATHEXT') if os.name == 'nt' else None
+    alldirs = str.split(path, os.pathsep)
+    key = (prog, path, pathext)
+
+    mtimes = _dir_mtimes(alldirs)
+    cached = _located.get(key)
+    if cached is not None and cached[2] == mtimes:
+        return cached[:2]
 
     if os.name == 'nt':
-        pathext = os.getenv('PATHEXT')
         if pathext:
             extensions = str.split(pathext, os.pathsep)
         else:
@@ -19,12 +67,126 @@ def locate_exec_on_path(prog):
     else:
         extensions = [""]
 
-    alldirs = str.split(os.getenv('PATH'), os.pathsep)
+    result = ("", "")
     for file in [os.path.join(dir, prog) for dir in alldirs]:
         for ext in extensions:
             if os.path.isfile(file + ext):
-                return file
-    return ""
+                result = (file, file + ext)
+                break
+        if result[0]:
+            break
+
+    _located[key] = result + (mtimes, )
+    return result
+
+
+def locate_exec_on_path(prog):
+    """Utility function to locate an executable on path."""
+
+    return _locate(prog)[0]
+
+
+def _load_probes():
+    global _probes
+    if _probes is None:
+        try:
+            with open(os.path.join(
+                    GPS.get_home_dir(), PROBES_CACHE_FILE)) as f:
+                _probes = json.load(f)
+        except (IOError, ValueError):
+            _probes = {}
+    return _probes
+
+
+def _save_probes():
+    filename = os.path.join(GPS.get_home_dir(), PROBES_CACHE_FILE)
+    try:
+        with open(filename + ".tmp", "w") as f:
+            json.dump(_probes, f)
+        os.replace(filename + ".tmp", filename)
+    except (IOError, OSError):
+        _log.log("Could not save %s" % filename)
+
+
+def _run_probe(cmd, key, stat):
+    start = time.time()
+    output = GPS.Process(cmd).get_result()
+    _log.log("%s: ran in %.3fs" % (" ".join(cmd), time.time() - start))
+    _load_probes()[key] = {"mtime": stat.st_mtime, "size": stat.st_size,
+                           "output": output}
+    _save_probes()
+    return output
+
+
+def _refresh_probe(cmd, key, stat, on_update):
+    """
+    Run the probe in the background, and call on_update with its new
+    output if it has changed.
+    """
+
+    from workflows import run_as_workflow
+    from workflows.promises import ProcessWrapper
+
+    @run_as_workflow
+    def refresh():
+        start = time.time()
+        status, output = yield ProcessWrapper(
+            cmd, ignore_error=True).wait_until_terminate()
+        _refreshing.discard(key)
+        _log.log("%s: refreshed in %.3fs" % (
+            " ".join(cmd), time.time() - start))
+
+        previous = _load_probes().get(key, {}).get("output")
+        _load_probes()[key] = {"mtime": stat.st_mtime, "size": stat.st_size,
+                               "output": output}
+        _save_probes()
+        if output != previous:
+            on_update(output)
+
+    if key not in _refreshing:
+        _refreshing.add(key)
+        refresh()
+
+
+def probe_output(cmd, on_update=None):
+    """
+    Return the output of cmd, a list of arguments whose first element is
+    a tool that does not depend on the project, like "gnatcov --help" or
+    "gnatprove --list-categories".
+
+    The output is saved in GPS's home directory, and reused as long as the
+    executable found on the PATH has the same location, modification time
+    and size, so that the tool is not spawned again in the common case.
+
+    When the executable has changed and on_update is given, the previous
+    output is returned immediately, and the tool is run in the background:
+    on_update is then called with the new output if it is different.
+    Otherwise the tool is run synchronously.
+    """
+
+    start = time.time()
+    exe = cmd[0]
+    resolved = exe if os.path.isabs(exe) else _locate(exe)[1]
+
+    try:
+        stat = os.stat(resolved)
+    except OSError:
+        # Not found: let GPS.Process report the error as usual
+        return GPS.Process(cmd).get_result()
+
+    key = "\0".join([os.path.abspath(resolved)] + list(cmd[1:]))
+    entry = _load_probes().get(key)
+
+    if entry is None or (on_update is None and (
+            entry["mtime"] != stat.st_mtime
+            or entry["size"] != stat.st_size)):
+        return _run_probe(cmd, key, stat)
+
+    if entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size:
+        _refresh_probe(cmd, key, stat, on_update)
+
+    _log.log("%s: cached (%.3fs)" % (" ".join(cmd), time.time() - start))
+    return entry["output"]
 
 
 def display_name(filename):
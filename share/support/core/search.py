@@ -6,6 +6,12 @@ python constructs. See the documentation of GPS.Search for more information.
 import GPS
 import time
 
+try:
+    # While building the doc, we might not have access to this module
+    from gi.repository import GLib
+except ImportError:
+    pass
+
 GPS.Search.FUZZY = 1
 GPS.Search.SUBSTRINGS = 2
 GPS.Search.REGEXP = 4
@@ -47,12 +53,205 @@ def search(context, pattern, flags=GPS.Search.SUBSTRINGS):
     """
     s = GPS.Search.lookup(context)
     if s:
+        # Do not wait for is_result_ready() here: the providers progress
+        # from the main loop, that we would block. Use stream() instead to
+        # get the results as they are computed.
         s.set_pattern(pattern, flags)
-        while not s.is_result_ready:
-            time.sleep(10)
     return s
 
 
+TICK_BUDGET_MS = 20
+# Time spent searching in each idle callback of a Search_Stream
+
+POLL_MS = 50
+# Delay before checking again when no provider has results ready
+
+
+class Provider_Stats(object):
+    """
+    Statistics about one provider of a Search_Stream. Times are in seconds.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.calls = 0        # Number of calls to get()
+        self.results = 0      # Number of results returned
+        self.time = 0.0       # Time spent in get()
+        self.first_result = None
+        # Time from the start of the search to the provider's first result
+        self.done = False
+
+    def __repr__(self):
+        return "%s: %d results, %d calls, %.1fms" % (
+            self.context, self.results, self.calls, self.time * 1000)
+
+
+class Search_Stream(object):
+    """
+    Searches one or more contexts in the background, and makes the results
+    available in batches as the providers produce them. The providers are
+    queried from idle callbacks, each limited to TICK_BUDGET_MS, so that
+    GPS remains responsive.
+
+    This is meant to be used from a workflow::
+
+        stream = Search_Stream([GPS.Search.FILE_NAMES], "foo")
+        while True:
+            batch = yield stream.next_batch()
+            if batch is None:
+                break
+            for result in batch:
+                print(result.short)
+    """
+
+    def __init__(self, contexts, pattern, flags=GPS.Search.SUBSTRINGS,
+                 limit=None, budget_ms=None):
+        """
+        :param contexts: a string or list of strings, for instance
+           GPS.Search.SOURCES
+        :param pattern: a string
+        :param flags: an integer, see :func:`GPS.Search.set_pattern`
+        :param limit: the maximum number of results, or None
+        :param budget_ms: the time spent searching in each idle callback,
+           TICK_BUDGET_MS by default
+        """
+        if isinstance(contexts, str):
+            contexts = [contexts]
+
+        self.limit = limit
+        self.budget = (budget_ms or TICK_BUDGET_MS) / 1000.0
+        self.start = time.time()
+        self.first_result = None
+        # Time from the start of the search to the first result, in seconds
+        self.elapsed = None
+        # Total time of the search, in seconds, once it is finished
+        self.count = 0
+        self.stats = []
+
+        self.__providers = []
+        for context in contexts:
+            provider = GPS.Search.lookup(context)
+            if provider:
+                provider.set_pattern(pattern, flags)
+                self.__providers.append((provider, Provider_Stats(context)))
+                self.stats.append(self.__providers[-1][1])
+
+        self.__pending = []     # results not returned by next_batch yet
+        self.__waiting = None   # the promise returned by next_batch
+        self.__finished = False
+        self.__source = GLib.idle_add(self.__tick)
+
+    @property
+    def finished(self):
+        """Whether all results have been computed, or the search was
+        cancelled."""
+        return self.__finished
+
+    def next_batch(self):
+        """
+        Return a promise resolved with the list of results found since the
+        previous call, as soon as there is at least one, or with None when
+        there are no more results.
+
+        :rtype: workflows.promises.Promise
+        """
+        from workflows.promises import Promise
+
+        self.__waiting = Promise()
+        p = self.__waiting
+        self.__deliver()
+        return p
+
+    def cancel(self):
+        """
+        Stop the search. A pending call to next_batch gets None.
+        """
+        if self.__source is not None:
+            GLib.source_remove(self.__source)
+            self.__source = None
+        self.__pending = []
+        self.__finish()
+
+    def __finish(self):
+        if not self.__finished:
+            self.__finished = True
+            self.elapsed = time.time() - self.start
+        self.__deliver()
+
+    def __deliver(self):
+        """Resolve the promise returned by next_batch if possible"""
+        p = self.__waiting
+        if p is None:
+            return
+        if self.__pending:
+            batch = self.__pending
+            self.__pending = []
+            self.__waiting = None
+            p.resolve(batch)
+        elif self.__finished:
+            self.__waiting = None
+            p.resolve(None)
+
+    def __schedule(self, delay):
+        if delay:
+            self.__source = GLib.timeout_add(delay, self.__tick)
+        else:
+            self.__source = GLib.idle_add(self.__tick)
+
+    def __tick(self):
+        self.__source = None
+        deadline = time.time() + self.budget
+        active = [p for p in self.__providers if not p[1].done]
+
+        while active:
+            ready = False
+            for provider, stats in active:
+                if not provider.is_result_ready():
+                    continue
+                ready = True
+                start = time.time()
+                has_next, result = provider.get()
+                now = time.time()
+                stats.calls += 1
+                stats.time += now - start
+
+                if result:
+                    if stats.first_result is None:
+                        stats.first_result = now - self.start
+                    if self.first_result is None:
+                        self.first_result = now - self.start
+                    stats.results += 1
+                    self.count += 1
+                    self.__pending.append(result)
+                    if self.limit is not None and self.count >= self.limit:
+                        self.__finish()
+                        return False
+
+                if not has_next:
+                    stats.done = True
+
+            active = [p for p in active if not p[1].done]
+            if not ready or time.time() > deadline:
+                break
+
+        self.__deliver()
+        if not active:
+            self.__finish()
+        elif ready:
+            self.__schedule(0)
+        else:
+            self.__schedule(POLL_MS)
+        return False
+
+
+def stream(contexts, pattern, flags=GPS.Search.SUBSTRINGS, limit=None):
+    """
+    See documentation in the GPS user's guide.
+    """
+    return Search_Stream(contexts, pattern, flags, limit=limit)
+
+
 GPS.Search.__iter__ = __iter__
 GPS.Search.__next__ = __next__
 GPS.Search.search = staticmethod(search)
+GPS.Search.stream = staticmethod(stream)
@@ -0,0 +1,254 @@
+"""
+Startup profiler for the python plugins.
+
+When the STARTUP_PROFILE trace is active, this module measures, for each
+python module loaded while GPS starts, the time spent importing it, running
+the setup() of its modules.Module classes and parsing its XML
+customization, as well as the number of hook callbacks it registers.
+
+Once GPS has started and the modules have been set up, a report sorted by
+cost is written to the log and to startup_profile.txt in the user's
+GNAT Studio directory, and the profiler uninstalls itself.
+
+This file is imported by GPS before any other plugin, so that the imports
+of all plugins can be measured. To enable it, add the following line to
+the traces.cfg file in the GNAT Studio home directory::
+
+    STARTUP_PROFILE=yes
+"""
+
+import GPS
+import contextlib
+import os
+import sys
+import time
+
+try:
+    # While building the doc, we might not have access to this module
+    from gi.repository import GLib
+except ImportError:
+    pass
+
+REPORT_FILE = "startup_profile.txt"
+REPORT_MAX_LINES = 40
+
+_log = GPS.Logger("STARTUP_PROFILE")
+
+
+class _Stats(object):
+    """
+    The costs attributed to one python module. Times are in seconds.
+    """
+
+    __slots__ = ("import_total", "import_self", "setup", "xml", "hooks")
+
+    def __init__(self):
+        self.import_total = 0.0
+        self.import_self = 0.0
+        self.setup = 0.0
+        self.xml = 0.0
+        self.hooks = 0
+
+    def cost(self):
+        return self.import_self + self.setup + self.xml
+
+
+class _Profiler(object):
+
+    def __init__(self):
+        self.stats = {}       # module name -> _Stats
+        self.current = []     # stack of [module name, start, nested time]
+        self.finder = None
+        self.originals = []   # (owner, attribute, original value)
+        self.start = time.time()
+
+    def get(self, name):
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = _Stats()
+        return s
+
+    def owner(self):
+        """
+        The module to which the current operation is attributed: the module
+        being imported or set up, or the module of the caller otherwise.
+        """
+        if self.current:
+            return self.current[-1][0]
+
+        # Skip the profiler's own frames
+        frame = sys._getframe(2)
+        return frame.f_globals.get("__name__", "?")
+
+    def push(self, name):
+        self.current.append([name, time.time(), 0.0])
+
+    def pop(self):
+        """
+        Terminate the innermost measure, and return its (total, self) times.
+        """
+        name, start, nested = self.current.pop()
+        total = time.time() - start
+        if self.current:
+            self.current[-1][2] += total
+        return total, total - nested
+
+    def patch(self, owner, attribute, make_wrapper):
+        original = getattr(owner, attribute)
+        setattr(owner, attribute, make_wrapper(original))
+        self.originals.append((owner, attribute, original))
+
+    def install(self):
+        GPS.Hook("gps_started").add(self.on_gps_started, last=True)
+        self.finder = _Timing_Finder(self)
+        sys.meta_path.insert(0, self.finder)
+
+        def wrap_parse_xml(parse_xml):
+            def wrapper(*args, **kwargs):
+                start = time.time()
+                try:
+                    return parse_xml(*args, **kwargs)
+                finally:
+                    elapsed = time.time() - start
+                    self.get(self.owner()).xml += elapsed
+                    if self.current:
+                        # Not part of the import or setup's own time
+                        self.current[-1][2] += elapsed
+            return wrapper
+
+        def wrap_hook_add(add):
+            def wrapper(hook, *args, **kwargs):
+                self.get(self.owner()).hooks += 1
+                return add(hook, *args, **kwargs)
+            return wrapper
+
+        try:
+            self.patch(GPS, "parse_xml", wrap_parse_xml)
+            self.patch(GPS.Hook, "add", wrap_hook_add)
+            self.patch(GPS.Hook, "add_debounce", wrap_hook_add)
+        except Exception:
+            _log.log("Cannot measure XML parsing and hooks")
+
+    def uninstall(self):
+        if self.finder in sys.meta_path:
+            sys.meta_path.remove(self.finder)
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+
+    def on_gps_started(self, hook):
+        # The modules that were not imported yet when "gps_started" was
+        # run are set up in idle callbacks: report after those.
+        GLib.idle_add(self.report, priority=GLib.PRIORITY_LOW)
+
+    def report(self):
+        self.uninstall()
+        elapsed = time.time() - self.start
+        entries = sorted(self.stats.items(),
+                         key=lambda e: e[1].cost(), reverse=True)
+
+        lines = [
+            "Python startup profile: %.0fms since the first import" % (
+                elapsed * 1000),
+            "%-40s %9s %9s %9s %9s %6s" % (
+                "module", "import", "self", "setup", "xml", "hooks")]
+        for name, s in entries[:REPORT_MAX_LINES]:
+            lines.append("%-40s %9.1f %9.1f %9.1f %9.1f %6d" % (
+                name, s.import_total * 1000, s.import_self * 1000,
+                s.setup * 1000, s.xml * 1000, s.hooks))
+        lines.append("%-40s %9s %9.1f %9.1f %9.1f %6d" % (
+            "total (%d modules)" % len(entries), "",
+            sum(s.import_self for _, s in entries) * 1000,
+            sum(s.setup for _, s in entries) * 1000,
+            sum(s.xml for _, s in entries) * 1000,
+            sum(s.hooks for _, s in entries)))
+
+        text = "\n".join(lines)
+        _log.log(text)
+        try:
+            with open(os.path.join(GPS.get_home_dir(), REPORT_FILE),
+                      "w") as f:
+                f.write(text + "\n")
+        except (OSError, IOError):
+            _log.log("Cannot write %s" % REPORT_FILE)
+
+        return False
+
+
+class _Timing_Loader(object):
+    """
+    Wraps the loader found for a module, to measure the execution of the
+    module's code.
+    """
+
+    def __init__(self, profiler, loader):
+        self.__profiler = profiler
+        self.__loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self.__loader, name)
+
+    def create_module(self, spec):
+        return self.__loader.create_module(spec)
+
+    def exec_module(self, module):
+        profiler = self.__profiler
+        profiler.push(module.__name__)
+        try:
+            self.__loader.exec_module(module)
+        finally:
+            total, own = profiler.pop()
+            s = profiler.get(module.__name__)
+            s.import_total += total
+            s.import_self += own
+
+
+class _Timing_Finder(object):
+    """
+    A meta path finder which delegates to the other finders, and wraps the
+    loaders they return.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(
+                        spec.loader, "exec_module"):
+                    spec.loader = _Timing_Loader(self.profiler, spec.loader)
+                return spec
+        return None
+
+
+_profiler = None
+
+
+@contextlib.contextmanager
+def measure_setup(module_name):
+    """
+    A context manager to attribute the time spent in its body to the
+    setup of the python module `module_name`. This does nothing unless
+    the profiler is running.
+    """
+    p = _profiler
+    if p is None or p.finder not in sys.meta_path:
+        yield
+        return
+
+    p.push(module_name)
+    try:
+        yield
+    finally:
+        _, own = p.pop()
+        p.get(module_name).setup += own
+
+
+if _log.active:
+    _profiler = _Profiler()
+    _profiler.install()
@@ -35,38 +35,174 @@ SUBPROGRAM_BLOCKS = set(["CAT_PROCEDURE", "CAT_FUNCTION", "CAT_ENTRY",
 # The block_types that are considered to be "subprogram" blocks
 
 
+PAIRS = {"(": ")", "[": "]", "{": "}"}
+# The matching parentheses
+
+_brackets_re = re.compile(r"[\(\)\[\]\{\}]")
+
+CHECKPOINT_LINES = 200
+# Number of lines between two saved parentheses states of a buffer
+
+
+class Editor_Lines(object):
+    """
+    The lines of an editor, up to and including location `to`, as a
+    read-only sequence. Lines are fetched on demand, CHECKPOINT_LINES at a
+    time, so that only the lines actually read are copied from the editor.
+    Indexes are 0-based.
+    """
+
+    def __init__(self, editor, to):
+        self.editor = editor
+        self.to = to
+        self.count = to.line()
+        self.lines = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        if index not in self.lines:
+            first = index - index % CHECKPOINT_LINES
+            last = min(first + CHECKPOINT_LINES, self.count)
+            if last == self.count:
+                to = self.to
+            else:
+                to = self.editor.at(last, 1).end_of_line()
+            text = self.editor.get_chars(self.editor.at(first + 1, 1), to)
+            for i, line in enumerate(
+                    text.split("\n")[:last - first], first):
+                self.lines[i] = line
+        return self.lines[index]
+
+
+class _Checkpoints(object):
+    """
+    The parentheses states saved for one buffer, every CHECKPOINT_LINES
+    lines. The state at line L only depends on the lines before L, so
+    an edit on line N invalidates all states after N.
+    """
+
+    def __init__(self, gtk_buffer):
+        self.gtk_buffer = gtk_buffer
+        self.states = {}
+        # line -> (stack, last) at the start of this line. stack contains
+        # (line, column, char) tuples, last is the line of the last closed
+        # parenthesis or None
+
+        self.valid_until = 0
+        # All checkpoints up to this line (included) are valid
+
+        self.handlers = [
+            gtk_buffer.connect(
+                "insert-text",
+                lambda buf, loc, text, length: self.invalidate(
+                    loc.get_line())),
+            gtk_buffer.connect(
+                "delete-range",
+                lambda buf, start, end: self.invalidate(start.get_line()))]
+
+    def invalidate(self, line):
+        """Forget the states that depend on the given 0-based line"""
+        if line < self.valid_until:
+            self.valid_until = line - line % CHECKPOINT_LINES
+            for k in [k for k in self.states if k > self.valid_until]:
+                del self.states[k]
+
+    def disconnect(self):
+        for h in self.handlers:
+            self.gtk_buffer.disconnect(h)
+
+
+_checkpoints = {}
+# file name -> _Checkpoints
+
+
+def _forget_checkpoints(hook, file):
+    c = _checkpoints.pop(file.name(), None)
+    if c is not None:
+        c.disconnect()
+
+
+GPS.Hook("file_closed").add(_forget_checkpoints)
+
+
+def _get_checkpoints(editor):
+    name = editor.file().name()
+    gtk_buffer = editor.gtk_text_buffer()
+    c = _checkpoints.get(name)
+    if c is None or c.gtk_buffer is not gtk_buffer:
+        if c is not None:
+            c.disconnect()
+        c = _checkpoints[name] = _Checkpoints(gtk_buffer)
+    return c
+
+
+def _scan_parentheses(lines, first, stack, last, checkpoint=None):
+    """
+    Update the parentheses `stack` and `last` with the given lines, the
+    first of which is the 0-based line `first`. Comment lines are ignored.
+    If `checkpoint` is set, the states at the start of each checkpoint
+    line are saved in it.
+    """
+    for i, line in enumerate(lines, first):
+        if checkpoint is not None and i % CHECKPOINT_LINES == 0 \
+           and i > checkpoint.valid_until:
+            checkpoint.states[i] = (tuple(stack), last)
+            checkpoint.valid_until = i
+
+        if line.lstrip(" ").startswith("#"):
+            continue
+        for m in _brackets_re.finditer(line):
+            c = m.group()
+            if c in PAIRS:
+                stack.append((i, m.start(), c))
+            elif stack and PAIRS[stack[-1][2]] == c:
+                # when parenthesis is closed, remember its line number
+                last = stack.pop()[0]
+    return last
+
+
 def parse_parentheses(editor, begin=None, end=None):
     """
     Parse parentheses of editor
     range: begin to end inclusive.
     Returns the parenthesis stack. Each element is parentheses: location int
+
+    When parsing from the beginning of the buffer, the parsing starts from
+    the nearest state saved for this buffer, and states are saved every
+    CHECKPOINT_LINES lines, so that the cost does not depend on the
+    position of `end` in the buffer.
     """
     # set the default begin and end if not provided
-    if begin is None:
-        begin = editor.beginning_of_buffer()
     if end is None:
         end = editor.end_of_buffer()
 
-    pairs = {"(": ")", "[": "]", "{": "}"}
-    h = list(pairs.keys())
-    t = list(pairs.values())
     stack = []
-    source = editor.get_chars(begin, end).rstrip("\n").splitlines()
-    last = end.line()-1
-
-    # parse all parentheses, find open parentheses
-    for i in range(0, len(source)):
-        if source[i].lstrip(" ").startswith("#"):
-            source[i] = ""
-        for j, c in enumerate(source[i]):
-            if c in h:
-                stack.append((i, j))
-            elif c in t:
-                if not stack:
-                    continue
-                elif pairs[source[stack[-1][0]][stack[-1][1]]] == c:
-                    # when parenthesis is closed, remember its line number
-                    last = stack.pop()[0]
+    last = None
+
+    if begin is None:
+        checkpoint = _get_checkpoints(editor)
+        first = min(checkpoint.valid_until,
+                    (end.line() - 1) - (end.line() - 1) % CHECKPOINT_LINES)
+        if first:
+            saved, last = checkpoint.states[first]
+            stack = list(saved)
+        begin = editor.at(first + 1, 1)
+    else:
+        checkpoint = None
+        first = 0
+
+    source = editor.get_chars(begin, end).rstrip("\n").split("\n")
+    last = _scan_parentheses(source, first, stack, last, checkpoint)
+    if last is None:
+        last = end.line() - 1
+    stack = [(i, j) for i, j, _ in stack]
 
     closed = (len(stack) == 0)
     # get the last char of parsed text
@@ -75,8 +211,11 @@ def parse_parentheses(editor, begin=None, end=None):
     # if the parsed text is ending a parenthesis -->
     # last char is a closing parentheses, then the cursor should
     # return to where the openning counterparts's line start
-    if tail in t and closed:
-        tmp = source[last]
+    if tail in PAIRS.values() and closed:
+        if last >= first:
+            tmp = source[last - first]
+        else:
+            tmp = Editor_Lines(editor, end)[last]
         start = len(tmp) - len(tmp.lstrip(" "))
         stack.append((last, start-1))
     return (stack, closed)
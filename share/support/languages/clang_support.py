@@ -6,6 +6,7 @@ GPS.Libclang API.
 """
 
 import GPS
+import collections
 from gi.repository import GLib
 from modules import Module
 import colorschemes
@@ -35,6 +36,184 @@ if not GPS.Logger("GPS.LSP.CPP_SUPPORT").active:
         False
     )
 
+    cache_size_pref = GPS.Preference(
+        "Editor/C & C++:Clang advanced settings/Diagnostics cache size")
+    cache_size_pref.create(
+        "Diagnostics cache size (MB)", "integer",
+        "Memory used to remember the diagnostics of the translation units"
+        " already parsed, so that they are not requested again when the"
+        " buffers and switches have not changed, for C/C++",
+        16, 0, 1024
+    )
+
+    SEVERITY_WARNING = 2
+    # Diagnostics with a lower or equal severity are warnings
+
+    ##########################
+    # Translation unit cache #
+    ##########################
+
+    class Translation_Unit_Cache(object):
+        """
+        A LRU cache of the diagnostics of translation units.
+
+        The translation units themselves are owned by GNAT Studio, so only
+        their diagnostics are kept here. An entry is keyed by the file, its
+        compiler switches and a hash of the unsaved C/C++ buffers, which
+        are what libclang parses. The size of the cache is estimated from
+        the text of these buffers and of the diagnostics, and is capped by
+        the "Diagnostics cache size" preference.
+        """
+
+        def __init__(self):
+            self.entries = collections.OrderedDict()
+            # key -> (size, diagnostics)
+
+            self.size = 0
+
+        @staticmethod
+        def key(ed_buffer):
+            """
+            The key of the translation unit of `ed_buffer`, and the size of
+            the text it depends on.
+            """
+            f = ed_buffer.file()
+            switches = tuple(f.project().get_attribute_as_list(
+                "default_switches", package="compiler", index=f.language()))
+            unsaved = []
+            size = 0
+            for b in GPS.EditorBuffer.list():
+                if b.file() == f or (
+                        b.is_modified()
+                        and b.file().language() in ("c", "c++")):
+                    text = b.get_chars()
+                    size += len(text)
+                    unsaved.append((b.file().name(), hash(text)))
+            return (f.name(), switches, tuple(sorted(unsaved))), size
+
+        def get(self, key):
+            """The diagnostics cached for `key`, or None"""
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+        def add(self, key, text_size, diagnostics):
+            size = text_size + sum(len(d[4]) for d in diagnostics)
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            self.entries[key] = (size, diagnostics)
+            self.size += size
+
+            cap = cache_size_pref.get() * 1024 * 1024
+            while self.size > cap and self.entries:
+                self.size -= self.entries.popitem(last=False)[1][0]
+
+        def clear(self):
+            self.entries.clear()
+            self.size = 0
+
+    ###########################
+    # Diagnostics reconciler #
+    ###########################
+
+    class Diagnostics_Reconciler(object):
+        """
+        Keeps the messages of the "Clang live diagnostics" category in sync
+        with the diagnostics of the last refreshed translation unit.
+
+        Only the messages that changed are removed or created, so that the
+        editors and the Locations view do not flicker, and all the changes
+        are applied at once from an idle callback.
+        """
+
+        CATEGORY = "Clang live diagnostics"
+
+        def __init__(self):
+            self.messages = {}
+            # (file, line, column, severity, text hash) ->
+            #    (GPS.Message, (path, line, column, text) of the message)
+
+            self.pending = None
+            # The diagnostics to display at the next idle callback
+
+            self.idle = None
+
+        @staticmethod
+        def key(diag):
+            file, line, column, severity, text = diag
+            return (file, line, column, severity, hash(text))
+
+        def update(self, diagnostics):
+            """
+            Display `diagnostics`, a list of
+            (file, line, column, severity, text) tuples, instead of the
+            current ones.
+            """
+            self.pending = diagnostics
+            if self.idle is None:
+                self.idle = GLib.idle_add(self.__apply)
+
+        def __apply(self):
+            self.idle = None
+            diagnostics, self.pending = self.pending, None
+            if diagnostics is None:
+                return False
+
+            # Forget the messages removed outside of the reconciler, for
+            # instance when the user cleared the category, so that they are
+            # created again below
+            alive = set(
+                (m.get_file().path, m.get_line(), m.get_column(),
+                 m.get_text())
+                for m in GPS.Message.list(category=self.CATEGORY))
+            for key in [k for k, (_, loc) in self.messages.items()
+                        if loc not in alive]:
+                # Does nothing if the message no longer exists
+                self.messages.pop(key)[0].remove()
+
+            wanted = {self.key(d): d for d in diagnostics}
+            for key in [k for k in self.messages if k not in wanted]:
+                self.messages.pop(key)[0].remove()
+
+            show_in_locations = show_diags_pref.get() == EDITOR_LOCATIONS
+            for key, (file, line, column, severity, text) in \
+                    wanted.items():
+                if key in self.messages:
+                    continue
+                m = GPS.Message(
+                    category=self.CATEGORY,
+                    file=GPS.File(file),
+                    line=line,
+                    column=column,
+                    text=GLib.markup_escape_text(text),
+                    show_in_locations=show_in_locations,
+                    allow_auto_jump_to_first=False
+                )
+
+                if severity <= SEVERITY_WARNING:
+                    m.set_action("", "gps-emblem-build-warning", text)
+                    m.set_style(colorschemes.STYLE_WARNING, 1)
+                else:
+                    m.set_action("", "gps-emblem-build-error", text)
+                    m.set_style(colorschemes.STYLE_ERROR, 1)
+
+                # As listed by GPS.Message.list: get_text() returns the text
+                # without markup
+                self.messages[key] = (
+                    m, (m.get_file().path, m.get_line(), m.get_column(),
+                        m.get_text()))
+            return False
+
+        def clear(self):
+            """Remove all the messages immediately"""
+            self.pending = None
+            for m in GPS.Message.list(category=self.CATEGORY):
+                m.remove()
+            self.messages.clear()
+
     ####################
     # Main clang class #
     ####################
@@ -42,7 +221,8 @@ if not GPS.Logger("GPS.LSP.CPP_SUPPORT").active:
     class Clang(object):
 
         def __init__(self):
-            self.messages = []
+            self.diagnostics = Diagnostics_Reconciler()
+            self.cache = Translation_Unit_Cache()
 
         def get_translation_unit(self, ed_buffer, update=False):
             return GPS.Libclang.get_translation_unit(ed_buffer.file())
@@ -57,52 +237,49 @@ if not GPS.Logger("GPS.LSP.CPP_SUPPORT").active:
             if f.language() in ("c", "c++") and GPS.SemanticTree(f).is_ready():
                 self.add_diagnostics(ed_buffer)
 
-        def add_diagnostics(self, ed_buffer):
-            """Add diagnostic information to the side of the buffer
+        def get_diagnostics(self, ed_buffer):
+            """
+            Return the diagnostics of the translation unit of ed_buffer, as
+            a list of (file, line, column, severity, text) tuples, or None
+            if the translation unit is not available.
 
-                This will request a Translation_Unit, and therefore will be
+                This will request a Translation_Unit, unless its
+                diagnostics are already cached, and therefore will be
                 blocking if the Translation_Unit is not ready.
             """
-            f = ed_buffer.file()
+            key, text_size = self.cache.key(ed_buffer)
+            diagnostics = self.cache.get(key)
+            if diagnostics is not None:
+                return diagnostics
 
             tu = self.get_translation_unit(ed_buffer)
 
             # If none was got, don't do anything
             if not tu:
-                return
+                return None
 
-            for m in self.messages:
-                m.remove()
-            self.messages = []
-
-            for d in tu.diagnostics:
-                # Skip diagnostics that are not in the current file. If
-                # diagnostic has no file, it might be a config error (bad
-                # switch for example) so we want to show it
-                # ??? Did we mean 'name()' (or path) below, instead of just
-                # 'name'
-                if not show_all_diags_pref.get() and \
-                  (not d.location.file or d.location.file.name != f.path):
-                    continue
-                m = GPS.Message(
-                    category="Clang live diagnostics",
-                    file=GPS.File(d.location.file.name),
-                    line=d.location.line,
-                    column=d.location.column,
-                    text=GLib.markup_escape_text(d.spelling),
-                    show_in_locations=(
-                        show_diags_pref.get() == EDITOR_LOCATIONS),
-                    allow_auto_jump_to_first=False
-                )
+            diagnostics = [
+                (d.location.file.name if d.location.file else "",
+                 d.location.line, d.location.column, d.severity, d.spelling)
+                for d in tu.diagnostics]
+            self.cache.add(key, text_size, diagnostics)
+            return diagnostics
 
-                if d.severity < 3:
-                    m.set_action("", "gps-emblem-build-warning", d.spelling)
-                    m.set_style(colorschemes.STYLE_WARNING, 1)
-                else:
-                    m.set_action("", "gps-emblem-build-error", d.spelling)
-                    m.set_style(colorschemes.STYLE_ERROR, 1)
+        def add_diagnostics(self, ed_buffer):
+            """Add diagnostic information to the side of the buffer"""
+            f = ed_buffer.file()
+
+            diagnostics = self.get_diagnostics(ed_buffer)
+            if diagnostics is None:
+                return
 
-                self.messages.append(m)
+            # Skip diagnostics that are not in the current file, and those
+            # that have no file and therefore cannot be displayed
+            show_all = show_all_diags_pref.get()
+            diagnostics = [d for d in diagnostics
+                           if d[0] and (show_all or d[0] == f.path)]
+
+            self.diagnostics.update(diagnostics)
 
 
 #######################
@@ -139,9 +316,17 @@ if not GPS.Logger("GPS.LSP.CPP_SUPPORT").active:
         def preferences_changed(self, *args):
             if show_diags_pref.get() != self.show_diags_pref_val:
                 self.show_diags_pref_val = show_diags_pref.get()
-                for m in self.clang_instance.messages:
-                    m.remove()
-                    self.refresh_current_editor()
+                self.clang_instance.diagnostics.clear()
+                self.refresh_current_editor()
+
+        def file_saved(self, f):
+            # Saving a header might change the diagnostics of all the
+            # translation units that include it
+            self.clang_instance.cache.clear()
+
+        def project_view_changed(self):
+            # The switches might have changed
+            self.clang_instance.cache.clear()
 
     # We want to remove the del methods on TranslationUnit and Index, because
     # in GS, GS has ownership of those
@@ -4,11 +4,18 @@ from modules import Module
 try:
     # While building the doc, we might not have gi.repository
     from gi.repository import Gtk, GLib, Gdk, Pango
-    from pygps import get_gtk_buffer, is_editor_visible
+    from pygps import get_gtk_buffer, is_editor_visible, \
+        get_widgets_by_type
 except ImportError:
     pass
 
+import bisect
+import random
 import re
+import sys
+import time
+
+logger = GPS.Logger("HIGHLIGHTER")
 
 
 class HighlighterModule(Module):
@@ -25,7 +32,7 @@ class HighlighterModule(Module):
                 gtk_ed = get_gtk_buffer(ed)
                 if gtk_ed and not gtk_ed.highlighting_initialized:
                     highlighter.init_highlighting(ed)
-                    highlighter.gtk_highlight(gtk_ed)
+                    highlighter.gtk_highlight(gtk_ed, visible_lines(ed))
 
     def setup(self):
         for ed in GPS.EditorBuffer.list():
@@ -293,12 +300,170 @@ class RegionRef(BaseMatcher):
 ########################
 
 
+class StackRun(object):
+    """
+    A node of the tree of runs stored by HighlighterStacks: a run of
+    consecutive lines which all start with the same stack of highlighters.
+
+    The tree is a treap ordered by line (the key of a node is implicit: it is
+    the number of lines in the runs on its left), so that looking up,
+    inserting and deleting lines is done in O(log n), where n is the number
+    of runs.
+    """
+
+    __slots__ = ("stack", "length", "size", "priority", "left", "right")
+
+    def __init__(self, stack, length, priority=None):
+        self.stack = stack
+        self.length = length
+        self.size = length
+        self.priority = (random.random() if priority is None else priority)
+        self.left = None
+        self.right = None
+
+    def update(self):
+        self.size = (self.length
+                     + (self.left.size if self.left else 0)
+                     + (self.right.size if self.right else 0))
+
+
+def _split(run, nb_lines):
+    """
+    Split the tree of runs in two trees, the first one containing the first
+    nb_lines lines. A run is split in two if needed.
+
+    :type run: StackRun|None
+    :type nb_lines: int
+    :rtype: (StackRun|None, StackRun|None)
+    """
+    if run is None:
+        return None, None
+
+    left_size = run.left.size if run.left else 0
+
+    if nb_lines <= left_size:
+        left, run.left = _split(run.left, nb_lines)
+        run.update()
+        return left, run
+
+    elif nb_lines >= left_size + run.length:
+        run.right, right = _split(run.right,
+                                  nb_lines - left_size - run.length)
+        run.update()
+        return run, right
+
+    else:
+        offset = nb_lines - left_size
+        right = StackRun(run.stack, run.length - offset, run.priority)
+        right.right = run.right
+        right.update()
+        run.length = offset
+        run.right = None
+        run.update()
+        return run, right
+
+
+def _merge(left, right):
+    """
+    Concatenate two trees of runs.
+
+    :type left: StackRun|None
+    :type right: StackRun|None
+    :rtype: StackRun|None
+    """
+    if left is None:
+        return right
+    elif right is None:
+        return left
+    elif left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.update()
+        return left
+    else:
+        right.left = _merge(left, right.left)
+        right.update()
+        return right
+
+
+def _first(run):
+    while run.left:
+        run = run.left
+    return run
+
+
+def _last(run):
+    while run.right:
+        run = run.right
+    return run
+
+
 class HighlighterStacks(object):
+    """
+    The stack of highlighters at the start of each line of a buffer.
+
+    Most consecutive lines start with the same stack, so the stacks are
+    stored as runs of lines in a tree (see StackRun), and stacks are
+    interned, so that the same stack is shared by all the runs. Inserting or
+    deleting any number of lines costs the same as for a single line.
+    """
 
     def __init__(self):
         # The stack of highlighter at (0, 0) is necessarily the empty stack,
         # so the stack list comes prepopulated with one empty stack
-        self.stacks_list = [()]
+        self.root = StackRun((), 1)
+
+        # Lines appended at the end of the buffer, during the initial
+        # highlighting, are accumulated here before being added to the tree.
+        self.tail_stack = None
+        self.tail_length = 0
+
+        # The interned stacks
+        self.interned = {(): ()}
+
+    def __len__(self):
+        return (self.root.size if self.root else 0) + self.tail_length
+
+    def __flush(self):
+        if self.tail_length:
+            self.root = self.__join(
+                self.root, StackRun(self.tail_stack, self.tail_length))
+            self.tail_length = 0
+
+    def __join(self, left, right):
+        """
+        Concatenate two trees of runs, coalescing the runs at the junction
+        if they have the same stack.
+        """
+        if left is not None and right is not None:
+            last = _last(left)
+            first = _first(right)
+            if last.stack is first.stack:
+                left, _ = _split(left, left.size - last.length)
+                _, right = _split(right, first.length)
+                return _merge(
+                    _merge(left, StackRun(last.stack,
+                                          last.length + first.length)),
+                    right)
+        return _merge(left, right)
+
+    def __find(self, index):
+        """
+        Return the run containing line index.
+
+        :type index: int
+        :rtype: StackRun
+        """
+        run = self.root
+        while run:
+            left_size = run.left.size if run.left else 0
+            if index < left_size:
+                run = run.left
+            elif index < left_size + run.length:
+                return run
+            else:
+                index -= left_size + run.length
+                run = run.right
+        return None
 
     def set(self, index, stack):
         """
@@ -309,47 +474,176 @@ class HighlighterStacks(object):
         :type stack: tuple[Struct]
         @rtype:      bool
         """
-        assert 0 <= index <= len(self.stacks_list)
+        length = len(self)
+        assert 0 <= index <= length
 
         tpstack = tuple(stack)
-        if index == len(self.stacks_list):
-            self.stacks_list.append(tpstack)
+        tpstack = self.interned.setdefault(tpstack, tpstack)
+
+        if index == length:
+            if self.tail_length and self.tail_stack is not tpstack:
+                self.__flush()
+            self.tail_stack = tpstack
+            self.tail_length += 1
             return False
-        else:
-            current_stack = self.stacks_list[index]
-            self.stacks_list[index] = tpstack
-            return tpstack == current_stack
+
+        self.__flush()
+        current = self.__find(index)
+        if current.stack is tpstack:
+            return True
+
+        left, right = _split(self.root, index)
+        _, right = _split(right, 1)
+        self.root = self.__join(
+            self.__join(left, StackRun(tpstack, 1)), right)
+        return False
 
     def get(self, start_line):
         """
         :type start_line: int
         @rtype:           tuple[Struct]|None
         """
-        if start_line < len(self.stacks_list):
-            return self.stacks_list[start_line][:]
-        else:
+        if start_line >= len(self):
             return None
 
+        self.__flush()
+        return self.__find(start_line).stack
+
     def insert_newlines(self, nb_lines, after_line):
         """
         :type after_line: int
         :type nb_lines:   int
         """
-        for _ in range(nb_lines):
-            self.stacks_list.insert(after_line + 1, ())
+        # Lines past the last known stack have not been highlighted yet:
+        # there is nothing to shift.
+        if nb_lines and after_line + 1 < len(self):
+            self.__flush()
+            left, right = _split(self.root, after_line + 1)
+            self.root = _merge(_merge(left, StackRun((), nb_lines)), right)
 
     def delete_lines(self, nb_deleted_lines, at_line):
         """
         :param nb_deleted_lines: int
         :param at_line: int
         """
-        del self.stacks_list[at_line + 1:at_line + nb_deleted_lines + 1]
+        if nb_deleted_lines and at_line + 1 < len(self):
+            self.__flush()
+            left, right = _split(self.root, at_line + 1)
+            _, right = _split(right, nb_deleted_lines)
+            self.root = self.__join(left, right)
+
+    def runs(self):
+        """
+        Return the list of (stack, number of lines) of all the runs, in
+        order.
+
+        :rtype: list[(tuple[Struct], int)]
+        """
+        self.__flush()
+        result = []
+        todo = []
+        run = self.root
+        while todo or run:
+            if run:
+                todo.append(run)
+                run = run.left
+            else:
+                run = todo.pop()
+                result.append((run.stack, run.length))
+                run = run.right
+        return result
+
+    def memory_usage(self):
+        """
+        Return an estimation of the memory used to store the stacks, in
+        bytes.
+
+        :rtype: int
+        """
+        runs = self.runs()
+        return (sys.getsizeof(StackRun((), 1)) * len(runs)
+                + sum(sys.getsizeof(s) for s in self.interned))
 
     def __str__(self):
-        return "{0}".format(
-            "\n".join(["{0}\t{1}".format(num, [c for c in stack])
-                       for num, stack in enumerate(self.stacks_list)])
-        )
+        line = 0
+        result = []
+        for stack, length in self.runs():
+            result.append("{0}-{1}\t{2}".format(
+                line, line + length - 1, [c for c in stack]))
+            line += length
+        return "\n".join(result)
+
+
+class ScratchStacks(object):
+    """
+    Stacks used to speculatively highlight a range of lines from the root
+    state, without recording anything. This is used to highlight the visible
+    part of a buffer before the lines above it have been processed.
+    """
+
+    def __init__(self, root_highlighter):
+        self.root_highlighter = root_highlighter
+
+    def set(self, index, stack):
+        return False
+
+    def get(self, start_line):
+        return (self.root_highlighter, )
+
+
+class HighlighterSpans(object):
+    """
+    The tokens applied to each line of the buffer, as tuples of
+    (tag, start column, end column). This is compared with the result of a
+    new lexing of the line, so that the tags are only updated on the lines
+    whose tokens have changed.
+    """
+
+    def __init__(self, nb_lines):
+        # None means that the tags of the line are unknown: the line was
+        # never highlighted, or its text was modified.
+        self.spans_list = [None] * nb_lines
+
+        # All the tags that were applied to the buffer
+        self.tags = set()
+
+    def set(self, index, spans):
+        """
+        :type index: int
+        :type spans: tuple[(Gtk.TextTag, int, int)]
+        """
+        if index >= len(self.spans_list):
+            self.spans_list.extend(
+                [None] * (index + 1 - len(self.spans_list)))
+        self.spans_list[index] = spans
+        self.tags.update(tag for tag, _, _ in spans)
+
+    def get(self, index):
+        """
+        :type index: int
+        @rtype: tuple[(Gtk.TextTag, int, int)]|None
+        """
+        if index < len(self.spans_list):
+            return self.spans_list[index]
+        else:
+            return None
+
+    def insert_newlines(self, nb_lines, after_line):
+        """
+        The line where the text was inserted is invalidated, as well as the
+        new lines.
+
+        :type after_line: int
+        :type nb_lines:   int
+        """
+        self.spans_list[after_line:after_line + 1] = [None] * (nb_lines + 1)
+
+    def delete_lines(self, nb_deleted_lines, at_line):
+        """
+        :param nb_deleted_lines: int
+        :param at_line: int
+        """
+        self.spans_list[at_line:at_line + nb_deleted_lines + 1] = [None]
 
 
 class SubHighlighter(object):
@@ -392,26 +686,44 @@ class SubHighlighter(object):
 
 class Highlighter(object):
 
-    def __init__(self, spec=(), igncase=False, nb_lines=100):
+    def __init__(self, spec=(), igncase=False, nb_lines=100,
+                 idle_budget_ms=10):
         """
         :type spec: Iterable[BaseMatcher]
-        :return:
+        :param int nb_lines: The number of lines lexed at once. After a
+           modification, windows of that many lines are lexed until the
+           highlighting is synchronized with the rest of the buffer.
+        :param int idle_budget_ms: The time spent highlighting at each
+           iteration of the main loop, when the buffer is first highlighted.
         """
         self.root_highlighter = SubHighlighter(spec, igncase=igncase)
         self.sync_stop = False
-        # Nb lines we will rehighlight after a modification
+        self.stop_line = 0
         self.nb_lines = nb_lines
+        self.idle_budget = idle_budget_ms / 1000.0
 
-    def highlight_info_gen(self, gtk_ed, start_line, end_line=0):
+    def highlight_info_gen(self, gtk_ed, start_line, end_line=0,
+                           stacks=None):
         """
-        Returns a generator that will highlight the buffer, one token at a
-        time, every time the generator is consumed.
+        Lex the buffer from start_line to end_line, and return the list of
+        (tag, start offset, end offset) to apply.
+
+        Lexing stops early when the stack of highlighters at the start of a
+        line is the same as the one computed previously: the rest of the
+        buffer is then known to be correctly highlighted. In that case,
+        self.sync_stop is set to True. self.stop_line is set to the first
+        line that was not lexed.
 
         :type gtk_ed: Gtk.TextBuffer
         :type start_line: int
+        :param HighlighterStacks|ScratchStacks stacks: The stacks to use,
+           defaults to the stacks of the buffer.
         """
         self.sync_stop = False
 
+        if stacks is None:
+            stacks = gtk_ed.stacks
+
         start = gtk_ed.get_iter_at_line(start_line)
         ":type: Gtk.TextIter"
 
@@ -420,6 +732,8 @@ class Highlighter(object):
                else gtk_ed.get_iter_at_line(end_line))
         ":type: Gtk.TextIter"
 
+        self.stop_line = end.get_line() + 1 if end.is_end() else end.get_line()
+
         if start.compare(end) < 0:
             strn = gtk_ed.get_text(start, end, True)
             ":type: unicode"
@@ -431,10 +745,10 @@ class Highlighter(object):
 
         if start_line == 0:
             subhl_stack = [self.root_highlighter]
-            gtk_ed.stacks.set(0, subhl_stack)
+            stacks.set(0, subhl_stack)
         else:
             try:
-                subhl_stack = list(gtk_ed.stacks.get(start_line))
+                subhl_stack = list(stacks.get(start_line))
             except TypeError:
                 subhl_stack = [self.root_highlighter]
 
@@ -446,6 +760,19 @@ class Highlighter(object):
         start_offset = start.get_offset()
         end_offset = end.get_offset()
 
+        def synced(line):
+            """
+            The stack at the start of line is the same as before, so the
+            buffer is synced from there: close the current region at the
+            start of that line and stop.
+            """
+            rstart = rstarts.pop() if rstarts else start_offset
+            results.append((subhl_stack[-1].gtk_tag, rstart,
+                            gtk_ed.get_iter_at_line(line).get_offset()))
+            self.sync_stop = True
+            self.stop_line = line
+            return results
+
         while subhl_stack:
             hl = subhl_stack[-1]
             matches = hl.pattern.finditer(strn, match_offset)
@@ -473,22 +800,13 @@ class Highlighter(object):
                 tk_end_offset = start_offset + m.end(i)
 
                 if start_line > current_line:
-                    for l in range(current_line + 1, start_line):
-                        gtk_ed.stacks.set(l, subhl_stack)
+                    # We exit as soon as the stack we're setting is == to the
+                    # existing one, since the buffer is synced
+                    for l in range(current_line + 1, start_line + 1):
+                        if stacks.set(l, subhl_stack):
+                            return synced(l)
                     current_line = start_line
 
-                    # We exit because the stack we're setting is == to the
-                    # existing one, so the buffer is synced
-                    if gtk_ed.stacks.set(current_line, subhl_stack):
-                        endi = gtk_ed.get_iter_at_line(current_line)
-                        endi.backward_char()
-                        endo = endi.get_offset()
-                        rstart = rstarts.pop() if rstarts else start_offset
-                        results.append((subhl_stack[-1].gtk_tag, rstart,
-                                        endo))
-                        self.sync_stop = True
-                        return results
-
                 # Stop pattern, this is the end of the region, we want to
                 # return to the parent highlighter after having yielded the
                 # location of the region stop-pattern.
@@ -538,91 +856,233 @@ class Highlighter(object):
         #  In this case, we want to set the stack correctly for the remaining
         #  lines
         for l in range(current_line + 1, end.get_line() + 1):
-            gtk_ed.stacks.set(l, subhl_stack)
+            if stacks.set(l, subhl_stack):
+                self.sync_stop = True
+                self.stop_line = min(self.stop_line, l)
+                break
 
         results.append((None, end_offset, end_offset))
         return results
 
-    def highlight_gen(self, gtk_ed, start_line, nb_lines):
+    def update_tags(self, gtk_ed, results, start_line, stop_line):
         """
+        Apply the results of highlight_info_gen to the lines from start_line
+        to stop_line (excluded). The tokens of each line are compared with
+        the ones applied previously, and tags are only updated on the lines
+        where they differ.
+
         :type gtk_ed: Gtk.TextBuffer
+        :type results: list[(Gtk.TextTag, int, int)]
         :type start_line: int
+        :type stop_line: int
+        :return: The number of lines whose tags were updated
         """
-        # t = time()
+        if stop_line <= start_line:
+            return 0
+
+        # Offsets of the start of each line, and of the end of the last one
+        offsets = []
+        it = gtk_ed.get_iter_at_line(start_line)
+        for _ in range(start_line, stop_line + 1):
+            offsets.append(it.get_offset())
+            it.forward_line()
+
+        nb_lines = stop_line - start_line
+        spans = [[] for _ in range(nb_lines)]
+
+        for tag, start, end in results:
+            if tag is None:
+                continue
+
+            index = max(bisect.bisect_right(offsets, start) - 1, 0)
+            while index < nb_lines and offsets[index] < end:
+                line_start = offsets[index]
+                span_start = max(start, line_start)
+                span_end = min(end, offsets[index + 1])
+                if span_start < span_end:
+                    spans[index].append(
+                        (tag, span_start - line_start, span_end - line_start))
+                index += 1
+
         start_it = gtk_ed.get_start_iter()
         end_it = gtk_ed.get_start_iter()
+        nb_updated = 0
 
-        if start_line == -1:
-            for tag, start, end in self.highlight_info_gen(gtk_ed, 0):
-                if tag:
-                    start_it.set_offset(start)
-                    end_it.set_offset(end)
-                    gtk_ed.apply_tag(tag, start_it, end_it)
-        else:
-            st_iter = gtk_ed.get_iter_at_line(start_line)
-            actions_list = self.highlight_info_gen(gtk_ed, start_line,
-                                                   start_line +
-                                                   max(nb_lines, self.nb_lines)
-                                                   )
+        for index, line_spans in enumerate(spans):
+            line = start_line + index
+            new_spans = tuple(line_spans)
+            old_spans = gtk_ed.spans.get(line)
+
+            if new_spans == old_spans:
+                continue
+
+            line_start = offsets[index]
+            start_it.set_offset(line_start)
+            end_it.set_offset(offsets[index + 1])
+
+            # The text of a modified line might carry any of our tags
+            old_tags = (gtk_ed.spans.tags if old_spans is None
+                        else set(tag for tag, _, _ in old_spans))
+            for tag in old_tags:
+                gtk_ed.remove_tag(tag, start_it, end_it)
+
+            for tag, start, end in new_spans:
+                start_it.set_offset(line_start + start)
+                end_it.set_offset(line_start + end)
+                gtk_ed.apply_tag(tag, start_it, end_it)
+
+            gtk_ed.spans.set(line, new_spans)
+            nb_updated += 1
+
+        return nb_updated
+
+    def highlight_lines(self, gtk_ed, start_line):
+        """
+        Lex the buffer from start_line, one window of self.nb_lines lines at
+        a time, until the highlighting is synchronized with the rest of the
+        buffer, and update the tags of the lines that changed.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :type start_line: int
+        :return: The number of lines that were lexed
+        """
+        initial_pass = gtk_ed.idle_highlight_id is not None
+
+        # Lines past the last known stack will be processed by the initial
+        # highlighting pass.
+        limit = (len(gtk_ed.stacks) - 1 if initial_pass
+                 else gtk_ed.get_line_count())
+
+        nb_lexed = 0
+        line = start_line
+
+        while line < limit:
+            end_line = line + self.nb_lines
+            if end_line >= limit:
+                end_line = limit if initial_pass else 0
 
-            # if not self.sync_stop:
-            #     actions_list = self.highlight_info_gen(gtk_ed, start_line)
+            results = self.highlight_info_gen(gtk_ed, line, end_line)
+            self.update_tags(gtk_ed, results, line, self.stop_line)
+            nb_lexed += self.stop_line - line
 
-            if actions_list:
-                end_it.set_offset(actions_list[-1][2])
-                gtk_ed.remove_all_tags(st_iter, end_it)
+            if self.sync_stop or self.stop_line <= line:
+                break
+
+            line = self.stop_line
+
+        return nb_lexed
+
+    def highlight_visible_lines(self, gtk_ed, first_line, last_line):
+        """
+        Speculatively highlight the given lines, assuming that no region is
+        opened at first_line. This is used to display highlighting as soon as
+        possible, the initial pass fixes it when it reaches these lines.
 
-                for tag, start, end in actions_list:
-                    start_it.set_offset(start)
-                    end_it.set_offset(end)
-                    if tag:
-                        gtk_ed.apply_tag(tag, start_it, end_it)
+        :type gtk_ed: Gtk.TextBuffer
+        :type first_line: int
+        :type last_line: int
+        """
+        results = self.highlight_info_gen(
+            gtk_ed, first_line, last_line + 1,
+            stacks=ScratchStacks(self.root_highlighter))
+        self.update_tags(gtk_ed, results, first_line, self.stop_line)
 
-        # print time() - t
+    def highlight_idle(self, gtk_ed):
+        """
+        One iteration of the initial highlighting pass, processing windows
+        of lines from the last known stack until the time budget is spent.
 
-    def gtk_highlight(self, gtk_ed):
-        self.highlight_gen(gtk_ed, -1, -1)
+        :type gtk_ed: Gtk.TextBuffer
+        :return: Whether the initial pass should go on
+        """
+        deadline = time.time() + self.idle_budget
 
-    def gtk_highlight_region(self, gtk_ed, start_line, nb_lines):
-        self.highlight_gen(gtk_ed, start_line, nb_lines)
+        while True:
+            line = len(gtk_ed.stacks) - 1
+            nb_lines = gtk_ed.get_line_count()
+            end_line = line + self.nb_lines
+
+            results = self.highlight_info_gen(
+                gtk_ed, line, 0 if end_line >= nb_lines else end_line)
+            self.update_tags(gtk_ed, results, line, self.stop_line)
+
+            if self.stop_line >= nb_lines:
+                gtk_ed.idle_highlight_id = None
+                if logger.active:
+                    logger.log(
+                        "{0} lines highlighted, stacks use {1} bytes".format(
+                            nb_lines, gtk_ed.stacks.memory_usage()))
+                return False
+
+            if time.time() >= deadline:
+                return True
+
+    def gtk_highlight(self, gtk_ed, visible_lines=None):
+        """
+        Start highlighting the whole buffer. The visible lines are
+        highlighted immediately, and the rest of the buffer is processed in
+        idle callbacks, from the beginning of the buffer.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :param (int, int) visible_lines: the first and last visible lines
+        """
+        if gtk_ed.idle_highlight_id:
+            GLib.source_remove(gtk_ed.idle_highlight_id)
+
+        gtk_ed.idle_highlight_id = None
+        gtk_ed.stacks = HighlighterStacks()
+
+        if visible_lines and visible_lines[0] > 0:
+            self.highlight_visible_lines(gtk_ed, *visible_lines)
+
+        if self.highlight_idle(gtk_ed):
+            gtk_ed.idle_highlight_id = GLib.idle_add(
+                self.highlight_idle, gtk_ed)
+
+    def gtk_highlight_region(self, gtk_ed, start_line):
+        """
+        Rehighlight the buffer after a modification at start_line.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :type start_line: int
+        """
+        nb_lexed = self.highlight_lines(gtk_ed, start_line)
+        gtk_ed.nb_lexed_lines = nb_lexed
+
+        if logger.active:
+            logger.log("{0} lines lexed after a modification at line {1}"
+                       .format(nb_lexed, start_line + 1))
 
     def init_highlighting(self, ed):
         gtk_ed = get_gtk_buffer(ed)
         gtk_ed.highlighting_initialized = True
         gtk_ed.stacks = HighlighterStacks()
+        gtk_ed.spans = HighlighterSpans(gtk_ed.get_line_count())
+        gtk_ed.nb_lexed_lines = 0
 
         if not hasattr(gtk_ed, "idle_highlight_id"):
             gtk_ed.idle_highlight_id = None
 
-        def action_handler(loc, nb_lines):
-            """:type loc: Gtk.TextIter"""
-            if gtk_ed.idle_highlight_id:
-                GLib.source_remove(gtk_ed.idle_highlight_id)
-
-            # Highlight all the rest of the buffer
-            self.gtk_highlight_region(gtk_ed, loc.get_line(), nb_lines)
-
         # noinspection PyUnusedLocal
         def highlighting_insert_text_before(buf, loc, text, length):
             buf.insert_loc = loc.to_tuple()
 
         # noinspection PyUnusedLocal
         def highlighting_insert_text(buf, loc, text, length):
-            nb_new_lines = len(text.split("\n")) - 1
+            nb_new_lines = text.count("\n")
             itr = buf.iter_from_tuple(buf.insert_loc)
             buf.stacks.insert_newlines(nb_new_lines, itr.get_line())
-            action_handler(itr, nb_new_lines + 1)
+            buf.spans.insert_newlines(nb_new_lines, itr.get_line())
+            self.gtk_highlight_region(buf, itr.get_line())
 
         def highlighting_delete_range_before(buf, loc, end):
-            buf.nb_deleted_lines = len(
-                buf.get_text(loc, end, True).split("\n")
-            ) - 1
+            buf.nb_deleted_lines = end.get_line() - loc.get_line()
 
         # noinspection PyUnusedLocal
         def highlighting_delete_range(buf, loc, end):
             buf.stacks.delete_lines(buf.nb_deleted_lines, loc.get_line())
-            # Recompute the highlighting of the 100 next lines
-            action_handler(loc, self.nb_lines)
+            buf.spans.delete_lines(buf.nb_deleted_lines, loc.get_line())
+            self.gtk_highlight_region(buf, loc.get_line())
 
         gtk_ed.connect_after("insert-text", highlighting_insert_text)
         gtk_ed.connect_after("delete-range", highlighting_delete_range)
@@ -630,6 +1090,28 @@ class Highlighter(object):
         gtk_ed.connect("insert-text", highlighting_insert_text_before)
 
 
+def visible_lines(ed):
+    """
+    Return the first and last lines visible in the current view of ed, or
+    None if they cannot be computed, for instance because the view is not
+    realized yet.
+
+    :type ed: GPS.EditorBuffer
+    :rtype: (int, int)|None
+    """
+    try:
+        tv = get_widgets_by_type(
+            Gtk.TextView, ed.current_view().pywidget())[-1]
+        rect = tv.get_visible_rect()
+        if rect.height <= 0:
+            return None
+        first = tv.get_line_at_y(rect.y)[0].get_line()
+        last = tv.get_line_at_y(rect.y + rect.height)[0].get_line()
+        return (first, last)
+    except Exception:
+        return None
+
+
 def gps_fun(fun):
     def __gps_to_gtk_fun(start, end, *args, **kwargs):
         gtk_ed = get_gtk_buffer(start.buffer())
@@ -4,8 +4,10 @@ Its aim is to integrate the jedi (python auto-completion API)
 into GPS.
 """
 
+import collections
 import os
 import sys
+import time
 from itertools import chain
 
 try:
@@ -33,6 +35,12 @@ TYPE_LABELS = {
 }
 
 
+LATENCY_SAMPLES = 200
+# Number of recent completion requests used to compute latency percentiles
+
+_latency_log = GPS.Logger("JEDI_LATENCY")
+
+
 class PythonResolver(CompletionResolver):
 
     """
@@ -44,11 +52,91 @@ class PythonResolver(CompletionResolver):
         # additional directories that module search will perform
         self.source_dirs = set([])
 
+        self.__project = None
+        self.__environment = None
+        # The jedi project and environment, reused until the source dirs
+        # change
+
+        self.__generation = 0
+        # Incremented for each request: the proposals of older requests
+        # are stale, and stop computing their results and documentation.
+
+        self.__latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def set_source_dirs(self, source_dirs):
+        """
+           Set the additional directories to search for modules
+        """
+        if source_dirs != self.source_dirs:
+            self.source_dirs = source_dirs
+            self.__project = None
+
+    def __get_project(self, file):
+        """
+           Return the jedi project, creating it if the source dirs changed
+        """
+        directory = file.directory()
+        if directory not in self.source_dirs:
+            self.source_dirs.add(directory)
+            self.__project = None
+
+        if self.__project is None:
+            # We can't rely on sys.path and must create a jedi.Project see
+            # extract from the online doc below:
+            #    If project is provided with a sys_path, that is going to be
+            #    used. If environment is provided, its sys.path will be used
+            #    (see Environment.get_sys_path);
+            #    Otherwise sys.path will match that of the default
+            #    environment of Jedi, which typically matches the sys path
+            #    that was used at the time when Jedi was imported.
+            self.__project = jedi.Project(
+                None, sys_path=sys.path + list(self.source_dirs))
+            self.__environment = self.__project.get_environment()
+        return self.__project
+
+    def __log_latency(self, start):
+        elapsed = (time.time() - start) * 1000
+        self.__latencies.append(elapsed)
+        if _latency_log.active:
+            samples = sorted(self.__latencies)
+
+            def percentile(p):
+                return samples[min(len(samples) - 1,
+                                   int(len(samples) * p / 100))]
+
+            _latency_log.log(
+                "completion: %.1fms (p50 %.1fms, p90 %.1fms, p99 %.1fms"
+                " over %d requests)" % (
+                    elapsed, percentile(50), percentile(90), percentile(99),
+                    len(samples)))
+
+    def __lazy_documentation(self, completion, generation):
+        """
+           Return a function that computes the documentation of a jedi
+           completion, unless a newer request has been made.
+        """
+        def documentation():
+            if generation != self.__generation:
+                return ""
+            return completion.docstring()
+        return documentation
+
+    def __proposals(self, proposals, generation):
+        """
+           Yield the proposals, until a newer request has been made.
+        """
+        for p in proposals:
+            if generation != self.__generation:
+                return
+            yield p
+
     def get_completions(self, loc):
         """
            Overridden method.
            Returns a list of completion objects for GPS.
         """
+        self.__generation += 1
+        generation = self.__generation
 
         # this works only on Python files
         if loc.buffer().file().language() != "python":
@@ -60,33 +148,27 @@ class PythonResolver(CompletionResolver):
                 (current_char in ['_', '.'] or current_char.isalnum())):
             return []
 
-        # We can't rely on sys.path and must create a jedi.Project see
-        # extract from the online doc below:
-        #    If project is provided with a sys_path, that is going to be used.
-        #    If environment is provided, its sys.path will be used
-        #    (see Environment.get_sys_path);
-        #    Otherwise sys.path will match that of the default environment of
-        #    Jedi, which typically matches the sys path that was used at the
-        #    time when Jedi was imported.
-
-        self.source_dirs.update([loc.buffer().file().directory()])
-        project = jedi.Project(None,
-                               sys_path=sys.path + list(self.source_dirs))
-
+        start = time.time()
+        file = loc.buffer().file()
         try:
+            project = self.__get_project(file)
+
             # filter out ^L in source text
             text = loc.buffer().get_chars()
             # text = text.replace('\x0c', ' ')
-            # Feed Jedi API
-            script = jedi.Script(code=text, project=project)
+            # Feed Jedi API. Giving the path lets jedi reuse its parse of
+            # the previous version of the file.
+            script = jedi.Script(code=text, path=file.path, project=project,
+                                 environment=self.__environment)
             completions = script.complete(line=loc.line(),
                                           column=loc.column() - 1)
 
-            # Sort, filter results
+            # Sort, filter results. The documentation, which is costly to
+            # compute, is only computed when displayed.
             result = sorted((CompletionProposal(
                 name=i.name,
                 label=i.name,
-                documentation=i.docstring(),
+                documentation=self.__lazy_documentation(i, generation),
                 language_category=TYPE_LABELS.get(
                     i.type, completion.CAT_UNKNOWN))
                 for i in completions
@@ -98,7 +180,8 @@ class PythonResolver(CompletionResolver):
                          loc.buffer().file().path)
             result = []
 
-        return result
+        self.__log_latency(start)
+        return self.__proposals(result, generation)
 
     def get_completion_prefix(self, loc):
         """
@@ -123,11 +206,11 @@ class Jedi_Module(Module):
         """
            Update resolver's source_dirs with user's working directory
         """
-        self.__resolver.source_dirs = set(
+        self.__resolver.set_source_dirs(set(
             chain.from_iterable(i.source_dirs()
                                 for i in [GPS.Project.root()] +
                                 GPS.Project.root().dependencies()
-                                if "python" in i.languages()))
+                                if "python" in i.languages())))
 
     # The followings are hooks:
 
@@ -26,6 +26,7 @@ following are provided:
 import GPS
 import sys
 import ast
+import bisect
 import os.path
 import gs_utils
 import os_utils
@@ -51,28 +52,19 @@ def get_last_body_statement(node):
 
 # noinspection PyPep8Naming
 class ASTVisitor(ast.NodeVisitor):
+    """
+    Computes the constructs for a list of statements. The constructs are
+    returned as tuples (category, visibility, name, profile, start, end_line,
+    entity), where start and entity are (line, column) tuples and lines are
+    relative to `first_line`. entity is None when it is the same as start.
+    """
 
-    def __init__(self, bufstr, clist):
-        self.buflines = bufstr.splitlines()
-        self.lines_offsets = [0 for _ in self.buflines]
-
-        for i in range(1, len(self.buflines)):
-            self.lines_offsets[i] = (self.lines_offsets[i - 1] +
-                                     len(self.buflines[i - 1]) + 1)
-
-        self.clist = clist
-
-    def get_offset(self, lineno, col):
-        return self.lines_offsets[lineno - 1] + col + 1
-
-    def make_tuple(self, line, col):
-        return line, col, self.get_offset(line, col)
+    def __init__(self, first_line=1):
+        self.first_line = first_line
+        self.constructs = []
 
-    def get_locations(self, n, kw=None):
-        end_line = n.end_line
-        start_pos = self.make_tuple(n.lineno, n.col_offset)
-        end_col = len(self.buflines[end_line - 1])
-        end_pos = self.make_tuple(end_line, end_col)
+    def add(self, n, category, visibility, name, profile, kw=None):
+        start = (n.lineno - self.first_line + 1, n.col_offset)
         if kw:
             # n.lineno value corresponds to the first line of the block.
             # I.E. if the function/class has decorators it will return the line
@@ -83,10 +75,12 @@ class ASTVisitor(ast.NodeVisitor):
                 line = max(line, d.lineno)
             if n.decorator_list:
                 line = line + 1
-            entity_pos = self.make_tuple(line, n.col_offset + len(kw) + 1)
-            return start_pos, end_pos, entity_pos
+            entity = (line - self.first_line + 1, n.col_offset + len(kw) + 1)
         else:
-            return start_pos, end_pos
+            entity = None
+        self.constructs.append((
+            category, visibility, name, profile, start,
+            n.end_lineno - self.first_line + 1, entity))
 
     def make_fn_profile(self, fn_node):
         args = fn_node.args
@@ -102,44 +96,16 @@ class ASTVisitor(ast.NodeVisitor):
 
     def visit_FunctionDef(self, n):
         self.generic_visit(n)
-        start_pos, end_pos, entity_pos = self.get_locations(n, "def ")
-        self.clist.add_construct(
-            CAT_FUNCTION, False, VISIBILITY_PUBLIC, n.name,
-            self.make_fn_profile(n), start_pos, end_pos, entity_pos
-        )
-
-    def generic_visit(self, n):
-        ast.NodeVisitor.generic_visit(self, n)
-        if getattr(n, "lineno", None):
-            end_line = n.lineno
-            if end_line:
-                for node_name in n._fields:
-                    _node = getattr(n, node_name)
-                    node = _node
-                    if isinstance(_node, list):
-                        if not _node:
-                            continue
-                        node = _node[-1]
-                    end_line = max(end_line, getattr(node, "end_line", 0))
-            n.end_line = end_line
-        else:
-            n.end_line = 0
+        self.add(n, CAT_FUNCTION, VISIBILITY_PUBLIC, n.name,
+                 self.make_fn_profile(n), "def ")
 
     def visit_ClassDef(self, n):
         self.generic_visit(n)
-        start_pos, end_pos, entity_pos = self.get_locations(n, "class ")
-        self.clist.add_construct(
-            CAT_TYPE, False, VISIBILITY_PUBLIC, n.name, "",
-            start_pos, end_pos, entity_pos
-        )
+        self.add(n, CAT_TYPE, VISIBILITY_PUBLIC, n.name, "", "class ")
 
     def add_private_construct(self, n, constructs_cat):
         self.generic_visit(n)
-        start_pos, end_pos = self.get_locations(n)
-        self.clist.add_construct(
-            constructs_cat, False, VISIBILITY_PRIVATE, "", "",
-            start_pos, end_pos, start_pos
-        )
+        self.add(n, constructs_cat, VISIBILITY_PRIVATE, "", "")
 
     def visit_While(self, n):
         self.add_private_construct(n, CAT_LOOP_STATEMENT)
@@ -151,20 +117,155 @@ class ASTVisitor(ast.NodeVisitor):
         self.add_private_construct(n, CAT_LOOP_STATEMENT)
 
 
+def _statement_start(n):
+    """The first line of a top-level statement, including decorators"""
+    return min([n.lineno] +
+               [d.lineno for d in getattr(n, "decorator_list", ())])
+
+
+class Constructs_Parser(object):
+    """
+    Computes the constructs of one file incrementally. The file is split
+    into blocks, one per top-level statement. When the text changes, only
+    the blocks that overlap the modified lines (and their neighbours) are
+    parsed again. The constructs of each block are cached, keyed by the
+    hash of its text, with line numbers relative to its start.
+    """
+
+    def __init__(self):
+        self.lines = []
+        # The lines of the text for which blocks were computed
+
+        self.blocks = []
+        # (first line, last line + 1, key) for each top-level statement,
+        # sorted, with 0-based line numbers
+
+        self.cache = {}
+        # key -> constructs (see ASTVisitor), for the blocks in self.blocks
+
+    def __parse(self, lines, first, last):
+        """
+        Parse lines[first:last], which starts at a top-level statement, and
+        return the corresponding blocks. Raises SyntaxError.
+        """
+        tree = ast.parse("\n".join(lines[first:last]))
+        blocks = []
+        for n in tree.body:
+            start = first + _statement_start(n) - 1
+            end = first + n.end_lineno
+            key = hash("\n".join(lines[start:end]))
+            if key not in self.cache:
+                visitor = ASTVisitor(_statement_start(n))
+                visitor.visit(n)
+                self.cache[key] = visitor.constructs
+            blocks.append((start, end, key))
+        return blocks
+
+    def parse(self, text, incremental=True):
+        """
+        Compute the blocks for the new text.
+        Raises SyntaxError, in which case the state is unchanged.
+        """
+        lines = text.split("\n")
+        old = self.lines
+        blocks = self.blocks
+
+        if not incremental or not old:
+            blocks = self.__parse(lines, 0, len(lines))
+        else:
+            # The modified lines are old[prefix:len(old) - suffix], and
+            # lines[prefix:len(lines) - suffix]
+            common = min(len(old), len(lines))
+            prefix = 0
+            while prefix < common and old[prefix] == lines[prefix]:
+                prefix += 1
+            suffix = 0
+            while (suffix < common - prefix
+                   and old[-1 - suffix] == lines[-1 - suffix]):
+                suffix += 1
+            if prefix == len(old) == len(lines):
+                return
+
+            changed_end = len(old) - suffix
+            delta = len(lines) - len(old)
+
+            # Parse again from the last block starting before the change
+            # (which the change might extend), to the end of the first
+            # block starting after the change (which might have new
+            # decorators).
+            starts = [b[0] for b in blocks]
+            first = bisect.bisect_right(starts, prefix) - 1
+            region_start = blocks[first][0] if first >= 0 else 0
+            last = bisect.bisect_left(starts, changed_end)
+            if last < len(blocks):
+                region_end = blocks[last][1]
+                after = blocks[last + 1:]
+            else:
+                region_end = len(old)
+                after = []
+
+            try:
+                region = self.__parse(
+                    lines, region_start, region_end + delta)
+            except SyntaxError:
+                # The change might affect the rest of the file, for instance
+                # by opening a multi-line string.
+                region = self.__parse(lines, 0, len(lines))
+                blocks = region
+            else:
+                blocks = (blocks[:max(first, 0)] + region +
+                          [(s + delta, e + delta, k) for s, e, k in after])
+
+        self.lines = lines
+        self.blocks = blocks
+        live = set(k for _, _, k in blocks)
+        self.cache = {k: v for k, v in self.cache.items() if k in live}
+
+    def add_constructs(self, clist):
+        """Add the constructs of the last successful parse to clist"""
+        lines = self.lines
+        offsets = [0] * len(lines)
+        for i in range(1, len(lines)):
+            offsets[i] = offsets[i - 1] + len(lines[i - 1]) + 1
+
+        def location(line, col):
+            return line, col, offsets[line - 1] + col + 1
+
+        for start, _, key in self.blocks:
+            for (category, visibility, name, profile, (line, col),
+                 end_line, entity) in self.cache[key]:
+                end_line += start
+                start_pos = location(line + start, col)
+                clist.add_construct(
+                    category, False, visibility, name, profile,
+                    start_pos,
+                    location(end_line, len(lines[end_line - 1])),
+                    location(entity[0] + start, entity[1])
+                    if entity else start_pos)
+
+
 # noinspection PyMethodMayBeStatic
 class PythonLanguage(GPS.Language):
 
     def __init__(self):
-        pass
+        self.parsers = {}
+        # File name -> Constructs_Parser, for the open files
+
+        GPS.Hook("file_closed").add(self.__forget_parser)
+
+    def __forget_parser(self, hook, file):
+        self.parsers.pop(file.name(), None)
 
     def parse_constructs(self, constructs_list, gps_file, string):
-        del gps_file
+        name = gps_file.name()
+        parser = self.parsers.get(name)
+        if parser is None:
+            parser = self.parsers[name] = Constructs_Parser()
         try:
-            tree = ast.parse(string)
-            tree.lineno = 0
-            ASTVisitor(string, constructs_list).visit(tree)
+            parser.parse(string)
         except SyntaxError:
-            pass
+            return
+        parser.add_constructs(constructs_list)
 
 
 class PythonSupport(object):
@@ -306,10 +407,11 @@ class PythonSupport(object):
 
             return (level, group)
 
-        source = e.get_chars(to=start).splitlines()
+        # Only the lines that are looked at are fetched from the editor
+        source = text_utils.Editor_Lines(e, start)
 
         # initialize
-        last = source[0]
+        last = None
         end = start
         previous_indent = 0
 
@@ -322,6 +424,9 @@ class PythonSupport(object):
                 end = e.at(i + 1, 1).end_of_line()
                 break
 
+        if last is None:
+            last = source[0]
+
         # STEP 1 parse parenthesis
         level, group = 0, []
 
@@ -642,8 +642,7 @@ class GNATcovPlugin(Module):
 
         # Update the GNATcoverage workflow Build Targets, creating them and
         # showing/hiding them appropriately. Also fill the custom targets.
-        process = GPS.Process(["gnatcov", "--help"])
-        help_msg = process.get_result()
+        help_msg = os_utils.probe_output(["gnatcov", "--help"])
         GPS.parse_xml(list_to_xml(
             self.BUILD_TARGET_MODELS).format(help=help_msg))
         self.update_worflow_build_targets()
@@ -744,7 +743,7 @@ class GNATcovPlugin(Module):
     @staticmethod
     def version(exe):
         latest_version = (23, 0)
-        version_out = GPS.Process(exe + " --version").get_result()
+        version_out = os_utils.probe_output([exe, "--version"])
 
         # Support a gnatcov built in dev mode
         if version_out == "GNATcoverage development-tree":
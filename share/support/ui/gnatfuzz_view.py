@@ -5,11 +5,14 @@ from modules import Module
 from gs_utils import make_interactive
 import pygps
 import workflows
-from workflows.promises import ProcessWrapper, TargetWrapper
+from workflows.promises import ProcessWrapper, TargetWrapper, Promise
 
 import os
 import json
 import glob
+import hashlib
+import time
+from collections import deque
 from gi.repository import Gtk, Gdk
 
 # The columns in the model
@@ -35,6 +38,18 @@ EXC_NAME = "Exception_Name"
 EXC_MESSAGE = "Exception_Message"
 EXC_INFO = "Exception_Information"
 
+# Markers around the json section in the output of the harness
+OUTPUT_START = "@@@GNATFUZZ_OUTPUT_START@@@"
+OUTPUT_END = "@@@GNATFUZZ_OUTPUT_END@@@"
+
+# The maximum number of harness runs executing at the same time
+TRIAGE_POOL_SIZE = max(1, min(8, os.cpu_count() or 1))
+
+# Directories modified more recently than this (in seconds) are listed
+# again on the next refresh, in case the file system timestamps are too
+# coarse to notice a second change.
+WATCH_MTIME_MARGIN = 2
+
 
 def coverage_executable():
     """Utility function, returns the executable instrumented for coverage"""
@@ -67,6 +82,46 @@ def fuzz_executable():
     return None
 
 
+def extract_output(output):
+    """Return the json section of the output of a harness run.
+    This is the last section between OUTPUT_START and OUTPUT_END, with the
+    line breaks removed.
+    """
+    start = output.rfind(OUTPUT_START)
+    if start < 0:
+        return ""
+    start = output.find("\n", start)
+    if start < 0:
+        return ""
+    end = output.find("\n" + OUTPUT_END, start)
+    return "".join(output[start + 1 : end if end >= 0 else None].splitlines())
+
+
+def stack_signature(info):
+    """Return the call stack found in the given Exception_Information, as
+    a tuple of offsets from the load address, so that it does not depend on
+    where the executable was loaded.
+    """
+    load = 0
+    frames = []
+    in_traceback = False
+    for line in info.splitlines():
+        if line.startswith("Load address:"):
+            try:
+                load = int(line.split(":", 1)[1].strip(), 16)
+            except ValueError:
+                pass
+        elif line.startswith("Call stack traceback locations:"):
+            in_traceback = True
+        elif in_traceback:
+            for word in line.split():
+                try:
+                    frames.append(int(word, 16) - load)
+                except ValueError:
+                    pass
+    return tuple(frames)
+
+
 class FuzzCrash(object):
     """This represents one crash identified by GNATfuzz"""
 
@@ -75,6 +130,176 @@ class FuzzCrash(object):
         self.label = ""
         self.message = ""
         self.params = []  # A list of tuples of the form ("param N", "value N")
+        self.signature = None  # Identifies the crashes with the same cause
+        self.duplicates = []  # The other crash files with the same signature
+        self.row = None  # The row of the crash in the view
+
+    def decode(self, json_str):
+        """Fill self from the json section of the harness output"""
+        try:
+            decoded = json.loads(json_str)
+
+            # Let's see if we have an exception
+            if TESTCASE_EXCEPTION in decoded:
+                exc = decoded[TESTCASE_EXCEPTION]
+                if (EXC_NAME in exc) and (EXC_MESSAGE in exc):
+                    self.message = f"{exc[EXC_NAME]} : {exc[EXC_MESSAGE]}"
+                    self.signature = (
+                        exc[EXC_NAME],
+                        exc[EXC_MESSAGE],
+                        stack_signature(exc.get(EXC_INFO, "")),
+                    )
+                else:
+                    self.message = "exception"
+
+            # Let's decode parameters
+            # First In parameters
+            if DECODED_IN_PARAMETERS in decoded:
+                for param in decoded[DECODED_IN_PARAMETERS]:
+                    if (
+                        (PARAM_NAME in param)
+                        and (PARAM_TYPE in param)
+                        and (PARAM_VALUE in param)
+                    ):
+                        value = param[PARAM_VALUE].strip()
+                        typ = param[PARAM_TYPE]
+                        self.params.append(
+                            (
+                                f"{param[PARAM_NAME]} : in {typ} :=",
+                                f"{value}",
+                            ),
+                        )
+                    else:
+                        self.params.append(("(unknown)", "(unknown)"))
+
+            # Now Out parameters
+            if DECODED_OUT_PARAMETERS in decoded:
+                for param in decoded[DECODED_OUT_PARAMETERS]:
+                    if (
+                        (PARAM_NAME in param)
+                        and (PARAM_TYPE in param)
+                        and (PARAM_VALUE in param)
+                    ):
+                        value = param[PARAM_VALUE].strip()
+                        typ = param[PARAM_TYPE]
+                        self.params.append(
+                            (
+                                f"{param[PARAM_NAME]} : out {typ} :=",
+                                f"{value}",
+                            ),
+                        )
+                    else:
+                        self.params.append(("(unknown)", "(unknown)"))
+
+            # Finally the function return
+            if DECODED_FUNCTION_RETURN in decoded:
+                function_return = decoded[DECODED_FUNCTION_RETURN]
+                if (FUNCTION_RETURN_TYPE in function_return) and (
+                    FUNCTION_RETURN_VALUE in function_return
+                ):
+                    value = function_return[FUNCTION_RETURN_VALUE].strip()
+                    rt = function_return[FUNCTION_RETURN_TYPE]
+                    self.params.append(
+                        (
+                            f"function return value : {rt} :=",
+                            f"{value}",
+                        ),
+                    )
+                else:
+                    self.params.append(("(unknown)", "(unknown)"))
+
+        except json.decoder.JSONDecodeError:
+            self.message = f"could not decode:\n{json_str}"
+
+
+class TriageCache(object):
+    """The json output of the harness for each crash file, saved across
+    sessions. Entries are keyed by the contents of the crash file and the
+    timestamp of the coverage executable, so that a rebuilt harness runs
+    again.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.modified = False
+        try:
+            with open(filename) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def key(self, crash_file, executable):
+        """Return the key for running executable on crash_file"""
+        h = hashlib.sha256()
+        try:
+            st = os.stat(executable)
+            h.update(f"{st.st_mtime_ns}:{st.st_size}:".encode())
+            with open(crash_file, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            return None
+        return h.hexdigest()
+
+    def get(self, key):
+        return self.entries.get(key) if key else None
+
+    def set(self, key, json_str):
+        if key:
+            self.entries[key] = json_str
+            self.modified = True
+
+    def save(self):
+        if self.modified:
+            try:
+                with open(self.filename, "w") as f:
+                    json.dump(self.entries, f)
+                self.modified = False
+            except OSError:
+                pass
+
+
+class CrashWatcher(object):
+    """Find the new crash and hang files in the output of the fuzzer. Only
+    the directories modified since the previous call are listed.
+    """
+
+    def __init__(self, fuzzer_output):
+        self.fuzzer_output = fuzzer_output
+        self.mtimes = {}  # The last known timestamp of each directory
+        self.fuzzer_dirs = []  # The gnatfuzz_* directories
+        self.seen = set()  # The files already returned
+
+    def _changed(self, directory):
+        """Whether directory may have changed since the previous call"""
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return False
+        if self.mtimes.get(directory) == mtime:
+            return False
+        if time.time() - mtime > WATCH_MTIME_MARGIN:
+            self.mtimes[directory] = mtime
+        return True
+
+    def new_files(self):
+        """Return the list of new crash and hang files, oldest first"""
+        if self._changed(self.fuzzer_output):
+            self.fuzzer_dirs = sorted(
+                glob.glob(os.path.join(self.fuzzer_output, "gnatfuzz_*"))
+            )
+
+        result = []
+        for fuzzer_dir in self.fuzzer_dirs:
+            for issue_type in ("crashes", "hangs"):
+                d = os.path.join(fuzzer_dir, issue_type)
+                if not self._changed(d):
+                    continue
+                for name in sorted(os.listdir(d)):
+                    path = os.path.join(d, name)
+                    if name.startswith("id") and path not in self.seen:
+                        self.seen.add(path)
+                        result.append(path)
+        return result
 
 
 class FuzzCrashList(object):
@@ -171,12 +396,21 @@ class FuzzCrashList(object):
         """Add the info for the given crash to the model"""
         it = self.store.append(None)
         self.store[it] = [crash.label, crash.message, crash.file, self.default_fg]
+        crash.row = Gtk.TreeRowReference.new(self.store, self.store.get_path(it))
 
         # Fill the parameters part of the crash
         for name, val in crash.params:
             param_it = self.store.append(it)
             self.store[param_it] = [name, val, "", self.default_fg]
 
+    def update_duplicates(self, crash):
+        """Show the number of duplicates of the given crash"""
+        if crash.row is not None and crash.row.valid():
+            it = self.store.get_iter(crash.row.get_path())
+            self.store[it][COL_TEST_MESSAGE] = (
+                f"{crash.message} ({len(crash.duplicates)} duplicates)"
+            )
+
 
 class GNATfuzzView(Module):
     """We're making use of the Module functionality to provide a native view"""
@@ -186,6 +420,11 @@ class GNATfuzzView(Module):
 
     def __init__(self):
         self.crashes = {}  # The known FuzzCrashes indexed by filename
+        self.signatures = {}  # The first FuzzCrash for each signature
+        self.candidate_crash_files = deque()  # The files to triage
+        self.watcher = None  # The CrashWatcher for the current session
+        self.triage_running = False  # Whether process_crashes is running
+        self.generation = 0  # Incremented when the view is cleared
         self.fcl = FuzzCrashList()
 
     def setup(self):
@@ -196,6 +435,12 @@ class GNATfuzzView(Module):
         """Clear the Fuzz crashes view"""
         global counter
         counter = 1
+        self.crashes = {}
+        self.signatures = {}
+        self.candidate_crash_files.clear()
+        self.watcher = None
+        self.triage_running = False
+        self.generation += 1
         t = pygps.get_widget_by_name("fuzz_crash_list_view")
         if t is not None:
             t.get_model().clear()
@@ -210,146 +455,125 @@ class GNATfuzzView(Module):
         # Nullify the widget field to avoid a dangling reference
         self.widget = None
 
-    def process_crashes(self, task):
-        """Workflow to read the crashes from the fuzzing session"""
-
+    def add_crash(self, candidate, json_str):
+        """Add the crash for the given file, from the json section of the
+        harness output. Crashes with the same exception and call stack as
+        a known crash are only counted as duplicates of that crash.
+        """
         global counter
 
-        while self.candidate_crash_files:
-            candidate = self.candidate_crash_files.pop()
-            if candidate not in self.crashes:
-                executable = coverage_executable()
-                # We're actually launching the executable to get the
-                # parameters that were passed to the crash, along with
-                # the actual crash message.
-                cl = [executable, candidate]
-                p = ProcessWrapper(cl)
-                status, output = yield p.wait_until_terminate()
-                c = FuzzCrash(candidate)
-
-                splits = candidate.split(os.sep)
-                issue_dir = splits[-2]
-
-                if issue_dir == "crashes":
-                    issue_label = "Crash"
-                elif issue_dir == "hangs":
-                    issue_label = "Hang"
-                else:
-                    issue_label = "Issue"
-
-                c.label = f"{str(counter)} ({issue_label})"
-                counter += 1
-                c.params = []
-
-                # Extract the json section of the output;
-                # it should start after "GNATfuzz : " and end at "^}"
-                json_str = ""
-                accumulating = False
-
-                # Replace this code when the output of harness programs
-                # is simpler to parse.
-                for line in output.splitlines():
-                    if line.startswith("@@@GNATFUZZ_OUTPUT_START@@@"):
-                        accumulating = True
-                        json_str = ""
-                    elif line == "@@@GNATFUZZ_OUTPUT_END@@@":
-                        accumulating = False
-                    elif accumulating:
-                        json_str += line
+        c = FuzzCrash(candidate)
+        c.decode(json_str)
 
-                try:
-                    decoded = json.loads(json_str)
-
-                    # Let's see if we have an exception
-                    if TESTCASE_EXCEPTION in decoded:
-                        exc = decoded[TESTCASE_EXCEPTION]
-                        if (EXC_NAME in exc) and (EXC_MESSAGE in exc):
-                            c.message = f"{exc[EXC_NAME]} : {exc[EXC_MESSAGE]}"
-                        else:
-                            c.message = "exception"
-
-                    # Let's decode parameters
-                    # First In parameters
-                    if DECODED_IN_PARAMETERS in decoded:
-                        for param in decoded[DECODED_IN_PARAMETERS]:
-                            if (
-                                (PARAM_NAME in param)
-                                and (PARAM_TYPE in param)
-                                and (PARAM_VALUE in param)
-                            ):
-                                value = param[PARAM_VALUE].strip()
-                                typ = param[PARAM_TYPE]
-                                c.params.append(
-                                    (
-                                        f"{param[PARAM_NAME]} : in {typ} :=",
-                                        f"{value}",
-                                    ),
-                                )
-                            else:
-                                c.params.append(("(unknown)", "(unknown)"))
-
-                    # Now Out parameters
-                    if DECODED_OUT_PARAMETERS in decoded:
-                        for param in decoded[DECODED_OUT_PARAMETERS]:
-                            if (
-                                (PARAM_NAME in param)
-                                and (PARAM_TYPE in param)
-                                and (PARAM_VALUE in param)
-                            ):
-                                value = param[PARAM_VALUE].strip()
-                                typ = param[PARAM_TYPE]
-                                c.params.append(
-                                    (
-                                        f"{param[PARAM_NAME]} : out {typ} :=",
-                                        f"{value}",
-                                    ),
-                                )
-                            else:
-                                c.params.append(("(unknown)", "(unknown)"))
-
-                    # Finally the function return
-                    if DECODED_FUNCTION_RETURN in decoded:
-                        function_return = decoded[DECODED_FUNCTION_RETURN]
-                        if (FUNCTION_RETURN_TYPE in function_return) and (
-                            FUNCTION_RETURN_VALUE in function_return
-                        ):
-                            value = function_return[FUNCTION_RETURN_VALUE].strip()
-                            rt = function_return[FUNCTION_RETURN_TYPE]
-                            c.params.append(
-                                (
-                                    f"function return value : {rt} :=",
-                                    f"{value}",
-                                ),
-                            )
-                        else:
-                            c.params.append(("(unknown)", "(unknown)"))
-
-                except json.decoder.JSONDecodeError:
-                    c.message = f"could not decode:\n{json_str}"
-
-                self.fcl.add_crash(c)
+        first = self.signatures.get(c.signature) if c.signature else None
+        if first is not None:
+            first.duplicates.append(candidate)
+            self.crashes[candidate] = first
+            self.fcl.update_duplicates(first)
+            return
+
+        splits = candidate.split(os.sep)
+        issue_dir = splits[-2]
+
+        if issue_dir == "crashes":
+            issue_label = "Crash"
+        elif issue_dir == "hangs":
+            issue_label = "Hang"
+        else:
+            issue_label = "Issue"
+
+        c.label = f"{str(counter)} ({issue_label})"
+        counter += 1
+
+        self.crashes[candidate] = c
+        if c.signature:
+            self.signatures[c.signature] = c
+        self.fcl.add_crash(c)
+
+    def process_crashes(self, task):
+        """Workflow to read the crashes from the fuzzing session.
+        The coverage executable is run on up to TRIAGE_POOL_SIZE candidates
+        at the same time, unless the result is already in the triage cache.
+        """
+        generation = self.generation
+        executable = coverage_executable()
+        cache = TriageCache(
+            os.path.join(self.project_dir, "gnatfuzz_triage_cache.json")
+        )
+        running = {}  # The cache key for each running candidate
+        finished = []  # (candidate, output) for the runs not processed yet
+        wakeup = [None]  # The promise the workflow is waiting on
+
+        def on_terminate(candidate, result):
+            finished.append((candidate, result[1]))
+            if wakeup[0] is not None:
+                p = wakeup[0]
+                wakeup[0] = None
+                p.resolve()
+
+        try:
+            while self.candidate_crash_files or running:
+                while self.candidate_crash_files and len(running) < TRIAGE_POOL_SIZE:
+                    candidate = self.candidate_crash_files.popleft()
+                    if candidate in self.crashes or candidate in running:
+                        continue
+                    key = cache.key(candidate, executable)
+                    json_str = cache.get(key)
+                    if json_str is not None:
+                        self.add_crash(candidate, json_str)
+                        continue
+
+                    # We're actually launching the executable to get the
+                    # parameters that were passed to the crash, along with
+                    # the actual crash message.
+                    running[candidate] = key
+                    p = ProcessWrapper([executable, candidate])
+                    p.wait_until_terminate().then(
+                        lambda result, c=candidate: on_terminate(c, result)
+                    )
+
+                if running and not finished:
+                    wakeup[0] = Promise()
+                    yield wakeup[0]
+
+                if generation != self.generation:
+                    # The view was cleared, these results are obsolete
+                    return
+
+                for candidate, output in finished:
+                    json_str = extract_output(output)
+                    key = running.pop(candidate)
+
+                    # Do not remember the output of a harness that failed,
+                    # for instance because it could not start: it runs again
+                    # on the next refresh.
+                    try:
+                        json.loads(json_str)
+                        cache.set(key, json_str)
+                    except json.decoder.JSONDecodeError:
+                        pass
+                    self.add_crash(candidate, json_str)
+                del finished[:]
+
+        finally:
+            cache.save()
+            if generation == self.generation:
+                self.triage_running = False
 
     def refresh(self):
         """Refresh the view"""
         self.project_dir = os.path.dirname(GPS.Project.root().file().name())
-        self.candidate_crash_files = []
-
-        # Get a list of all candidate crash and hang files
-        for issue_type in ("crashes", "hangs"):
-            self.candidate_crash_files.extend(
-                glob.glob(
-                    os.path.join(
-                        self.project_dir,
-                        "session",
-                        "fuzzer_output",
-                        "gnatfuzz_*",
-                        issue_type,
-                        "id*",
-                    )
-                )
-            )
-        # Process the candidate crash files
-        workflows.task_workflow("processing crashes", self.process_crashes)
+        fuzzer_output = os.path.join(self.project_dir, "session", "fuzzer_output")
+
+        # Get the list of new candidate crash and hang files
+        if self.watcher is None or self.watcher.fuzzer_output != fuzzer_output:
+            self.watcher = CrashWatcher(fuzzer_output)
+        self.candidate_crash_files.extend(self.watcher.new_files())
+
+        # Process the candidate crash files, unless this is already running
+        if self.candidate_crash_files and not self.triage_running:
+            self.triage_running = True
+            workflows.task_workflow("processing crashes", self.process_crashes)
 
     def create_view(self):
         self.refresh()
@@ -127,6 +127,30 @@ class Styles(object):
         return s
 
 
+def _item_ids(json):
+    """
+    Return the ids of all items and links defined in the JSON data for a
+    diagram, including nested items and link labels, without creating them.
+    """
+    ids = []
+    stack = list(json.get('items', []))
+    for link in json.get('links', []):
+        stack.append(link)
+        for label in (link.get('label'),
+                      (link.get('from') or {}).get('label'),
+                      (link.get('to') or {}).get('label')):
+            if label:
+                stack.append(label)
+
+    while stack:
+        o = stack.pop()
+        id = o.get('id')
+        if id is not None:
+            ids.append(id)
+        stack.extend(o.get('vbox') or o.get('hbox') or [])
+    return ids
+
+
 class JSON_Diagram_File():
     """
     A JSON file that contains the definition of multiple diagrams.
@@ -143,6 +167,10 @@ class JSON_Diagram_File():
         self.diagrams = []
         self.index = []  # (id, children (JSON Array))
         self.factory = factory
+        self.__diagrams = {}  # id -> diagram
+        self.__children = {}  # diagram id -> children (JSON Array)
+        self.__items = {}     # item id -> diagram that contains it
+        self.__item_ids = []  # the item ids of each diagram
         self.__load(data)
 
     def contains(self, id):
@@ -151,10 +179,7 @@ class JSON_Diagram_File():
         without loading it.
         :return boolean: Existence of diagram with name id within self
         """
-        for d in self.diagrams:
-            if d.id == id:
-                return True
-        return False
+        return id in self.__diagrams
 
     def get(self, id=None):
         """
@@ -162,29 +187,57 @@ class JSON_Diagram_File():
         :param str id: if None, returns the first diagram
         :return: an instance of JSON_Diagram
         """
-        for d in self.diagrams:
-            if d.id == id:
-                d.ensure()
-                return d
-
-        if self.diagrams:
+        d = self.__diagrams.get(id)
+        if d is None and self.diagrams:
             d = self.diagrams[0]
+        if d is not None:
             d.ensure()
-            return d
-        return None
+        return d
+
+    def get_children(self, id):
+        """
+        Return the children of a diagram, as found in its JSON data,
+        without creating the diagram.
+        :return: a JSON Array, or None if there is no such diagram
+        """
+        return self.__children.get(id)
 
     def get_diagram_for_item(self, id):
         """
-        Return the diagram to use for a given item
+        Return the diagram to use for a given item.
+        Only the diagram containing the item is created.
         :return:  (GPS.Diagram, Item)
         """
-        for d in self.diagrams:
+        d = self.__items.get(id)
+        if d is not None:
             d.ensure()
             it = d.get_item(id)
             if it:
                 return (d, it)
         return None
 
+    def add_diagrams(self, other):
+        """
+        Add all diagrams from another JSON_Diagram_File to self. The
+        diagrams already in self take precedence when ids are duplicated.
+        :param JSON_Diagram_File other: the file to add
+        """
+        for (id, children), diag, item_ids in zip(
+                other.index, other.diagrams, other.__item_ids):
+            self.__add(id, children, diag, item_ids)
+
+    def __add(self, id, children, diag, item_ids):
+        """
+        Register a new diagram in self and in the indexes
+        """
+        self.index.append((id, children))
+        self.diagrams.append(diag)
+        self.__item_ids.append(item_ids)
+        self.__diagrams.setdefault(id, diag)
+        self.__children.setdefault(id, children)
+        for item_id in item_ids:
+            self.__items.setdefault(item_id, diag)
+
     def clear_selection(self):
         """
         Clear the selection in all diagrams.
@@ -238,15 +291,15 @@ class JSON_Diagram_File():
             self.templates[id] = t
 
         for d in data.get('diagrams', []):
-            # ??? should build diagrams only when they are displayed
-            self.index.append((d.get('id'), d.get('children', [])))
-
+            # The diagrams are only built when they are displayed (see
+            # JSON_Diagram.ensure), but their ids and the ids of their
+            # items are indexed now so that lookups do not build them.
             if self.factory is None:
                 diag = JSON_Diagram(file=self, json=d)   # A new diagram
             else:
                 diag = self.factory(file=self, json=d)
 
-            self.diagrams.append(diag)
+            self.__add(d.get('id'), d.get('children', []), diag, _item_ids(d))
 
 
 class JSON_Diagram(B.Diagram):
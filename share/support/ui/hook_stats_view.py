@@ -0,0 +1,128 @@
+"""
+This plugin implements the "Hook Statistics" view, which displays the
+cost of the python callbacks connected to each hook, as recorded by
+hook_stats when the HOOK_STATS trace is active.
+"""
+
+import hook_stats
+from modules import Module
+from gs_utils import make_interactive
+from gi.repository import Gtk, GLib, GObject
+
+REFRESH_MS = 1000
+
+COL_HOOK = 0
+COL_CALLBACK = 1
+COL_CALLS = 2
+COL_TOTAL = 3
+COL_MEAN = 4
+COL_MAX = 5
+COL_STATUS = 6
+
+
+class Hook_Stats_Widget(object):
+
+    def __init__(self):
+        self.box = Gtk.VBox()
+
+        hbox = Gtk.HBox()
+        self.box.pack_start(hbox, False, False, 0)
+        self.label = Gtk.Label()
+        self.label.set_alignment(0.0, 0.5)
+        hbox.pack_start(self.label, True, True, 3)
+        reset = Gtk.Button("Reset")
+        reset.connect("clicked", self.__on_reset)
+        hbox.pack_end(reset, False, False, 0)
+
+        self.store = Gtk.ListStore(
+            GObject.TYPE_STRING, GObject.TYPE_STRING, GObject.TYPE_INT,
+            GObject.TYPE_DOUBLE, GObject.TYPE_DOUBLE, GObject.TYPE_DOUBLE,
+            GObject.TYPE_STRING)
+        self.store.set_sort_column_id(COL_TOTAL, Gtk.SortType.DESCENDING)
+
+        self.view = Gtk.TreeView(self.store)
+        for title, column in (("Hook", COL_HOOK),
+                              ("Callback", COL_CALLBACK),
+                              ("Calls", COL_CALLS),
+                              ("Total (ms)", COL_TOTAL),
+                              ("Mean (ms)", COL_MEAN),
+                              ("Max (ms)", COL_MAX),
+                              ("Status", COL_STATUS)):
+            cell = Gtk.CellRendererText()
+            col = Gtk.TreeViewColumn(title, cell, text=column)
+            if column in (COL_TOTAL, COL_MEAN, COL_MAX):
+                col.set_cell_data_func(cell, self.__format_ms, column)
+            col.set_sort_column_id(column)
+            col.set_resizable(True)
+            self.view.append_column(col)
+
+        scroll = Gtk.ScrolledWindow()
+        scroll.add(self.view)
+        self.box.pack_start(scroll, True, True, 0)
+
+        self.refresh()
+        self.timeout = GLib.timeout_add(REFRESH_MS, self.__on_timeout)
+        self.box.connect("destroy", self.__on_destroy)
+
+    def __format_ms(self, column, cell, model, iter, data):
+        cell.set_property("text", "%.2f" % model[iter][data])
+
+    def __on_reset(self, button):
+        hook_stats.reset()
+        self.refresh()
+
+    def __on_timeout(self):
+        self.refresh()
+        return True
+
+    def __on_destroy(self, widget):
+        GLib.source_remove(self.timeout)
+
+    def refresh(self):
+        if not hook_stats.enabled:
+            self.label.set_text(
+                "Activate the HOOK_STATS trace to record statistics")
+            return
+
+        stats = hook_stats.get_stats()
+        self.label.set_text("%d callbacks, %.1fms in total" % (
+            len(stats), sum(s.total for s in stats) * 1000))
+
+        # Update the rows in place, to preserve the selection and sort
+        rows = {(row[COL_HOOK], row[COL_CALLBACK]): row.iter
+                for row in self.store}
+        for s in stats:
+            values = [s.hook, s.label, s.calls, s.total * 1000,
+                      s.mean * 1000, s.max * 1000,
+                      "demoted" if s.demoted else ""]
+            it = rows.get((s.hook, s.label))
+            if it is None:
+                self.store.append(values)
+            else:
+                self.store.set(it, list(range(len(values))), values)
+
+
+class Hook_Stats_View(Module):
+    """ A GPS module, providing the hook statistics view """
+
+    view_title = "Hook Statistics"
+
+    def __init__(self):
+        self.widget = None
+
+    def setup(self):
+        make_interactive(
+            self.get_view,
+            category="Views",
+            description=(
+                "Open (or reuse if it already exists) the 'Hook Statistics'"
+                " view, which shows the time spent in python hook"
+                " callbacks"),
+            name="open Hook Statistics")
+
+    def on_view_destroy(self):
+        self.widget = None
+
+    def create_view(self):
+        self.widget = Hook_Stats_Widget()
+        return self.widget.box
@@ -230,6 +230,8 @@ class Clearcase(core_staging.Emulate_Staging,
 
     @core.run_in_background
     def async_fetch_status_for_all_files(self, from_user, extra_files=[]):
+        if from_user:
+            self._reset_sent_statuses()
         index = self.set_status_index
         self.set_status_index += 1
 
@@ -13,6 +13,11 @@ import types
 import platform
 
 
+_STATUS_CHUNK = 500
+# Number of files sent to GPS between two checks of the time budget in
+# async_set_status_for_remaining_files
+
+
 GPS.VCS2.Status = gs_utils.enum(
         NO_VCS=0,
         UNMODIFIED=2**0,
@@ -248,6 +253,7 @@ class VCS(GPS.VCS2):
         self.working_dir = working_dir
         self.default_status = default_status
         self._extensions = []   # the decorators that apply to self
+        self.__sent = {}   # File -> (status, version, repo_version) in GPS
 
         # Check which decorators apply
         for d in self._class_extensions:
@@ -471,6 +477,30 @@ class VCS(GPS.VCS2):
     # Services #
     ############
 
+    def _set_file_status(self, files, status, version="", repo_version=""):
+        """
+        Override GPS.VCS2._set_file_status to only send to GPS the files
+        whose status actually changed.
+        """
+        if isinstance(files, GPS.File):
+            files = [files]
+
+        s = (status, version, repo_version)
+        changed = [f for f in files if self.__sent.get(f) != s]
+        if changed:
+            for f in changed:
+                self.__sent[f] = s
+            super(VCS, self)._set_file_status(
+                changed, status, version, repo_version)
+
+    def _reset_sent_statuses(self):
+        """
+        Forget which statuses were sent to GPS, so that the next calls to
+        `_set_file_status` send them all again. Engines call this when the
+        user forces a refresh, since GPS might have forgotten some of them.
+        """
+        self.__sent = {}
+
     def set_status_for_all_files(self, files=set()):
         """
         A proxy that lets you set statuses of individual files, and on
@@ -506,9 +536,10 @@ class VCS(GPS.VCS2):
             def __init__(self):
                 self._seen = set()
                 self._cache = {}    # (status,version,repo_version) -> [File]
-                self.__iterator = None
-                self.__status = None
-                self.__index = 0
+                self.__work = []     # [(status,version,repo_version), [File]]
+                self.__index = 0     # first file to send in self.__work[-1]
+                self.__done = 0      # number of files sent
+                self.__total = 0
 
             def __enter__(self):
                 return self
@@ -555,41 +586,47 @@ class VCS(GPS.VCS2):
 
             def async_set_status_for_remaining_files(self,
                                                      files=set(),
-                                                     msecs=100,
-                                                     step=5000):
+                                                     msecs=10,
+                                                     budget=20):
                 """
                 asynchronous version of set_status_remaining_files.
                 This prevent a GUI freeze when setting the state of thousand
-                of files at once.
+                of files at once: every `msecs` milliseconds, files are sent
+                for at most `budget` milliseconds. The progress is reported
+                after each slice via the "vcs_file_status_progress" hook.
                 """
+                to_set = [f for f in files if f not in self._seen]
+                if to_set:
+                    self._cache.setdefault(
+                        (vcs.default_status, "", ""), []).extend(to_set)
+
+                self.__work = list(self._cache.items())
+                self.__total = sum(len(s[1]) for s in self.__work)
+                self.__done = 0
+
                 def handler():
-                    if self.__status:
-                        s_files = self._cache[self.__status]
-                        if self.__index + step > len(s_files):
-                            vcs._set_file_status(
-                                s_files[self.__index:],
-                                self.__status[0],
-                                self.__status[1],
-                                self.__status[2])
+                    deadline = time.time() + budget / 1000.0
+                    while self.__work:
+                        s, s_files = self.__work[-1]
+                        chunk = s_files[
+                            self.__index:self.__index + _STATUS_CHUNK]
+                        vcs._set_file_status(chunk, s[0], s[1], s[2])
+                        self.__index += len(chunk)
+                        self.__done += len(chunk)
+                        if self.__index >= len(s_files):
+                            self.__work.pop()
                             self.__index = 0
-                            try:
-                                self.__status = next(self.__iter)
-                            except StopIteration:
-                                GPS.Hook("vcs_file_status_finished").run()
-                                return False
-                        else:
-                            vcs._set_file_status(
-                                s_files[self.__index:self.__index + step],
-                                self.__status[0],
-                                self.__status[1],
-                                self.__status[2])
-                            self.__index = self.__index + step
-                    return True
-
-                self.__iter = iter(list(self._cache))
-                try:
-                    self.__status = next(self.__iter)
-                except StopIteration:
+                        if time.time() >= deadline:
+                            break
+
+                    GPS.Hook("vcs_file_status_progress").run(
+                        self.__done, self.__total)
+                    if self.__work:
+                        return True
+                    GPS.Hook("vcs_file_status_finished").run()
+                    return False
+
+                if not self.__work:
                     GPS.Hook("vcs_file_status_finished").run()
                     return False
                 GLib.timeout_add(msecs, handler)
@@ -675,6 +712,8 @@ class File_Based_VCS(VCS):
             args=[d for d in project.source_dirs(recursive=False)])
 
     def async_fetch_status_for_all_files(self, from_user):
+        if from_user:
+            self._reset_sent_statuses()
         self._compute_status([])  # all files
 
 
@@ -1,8 +1,14 @@
 import GPS
 from . import core
+import collections
+import difflib
+import hashlib
+import json
 import os
 import os_utils
 import re
+import sys
+import time
 import workflows
 from workflows.promises import ProcessWrapper, join, Promise
 import datetime
@@ -23,6 +29,387 @@ LOCAL_CHANGES_ID = 'Local change'
 _version = None
 # Git version
 
+_CACHE_MAX_FILES = 16
+# Number of HEAD listings and histories kept on disk
+
+
+def _git_version_at_least(*version):
+    """
+    Whether the version of git is known and at least `version`
+    """
+    return _version is not None and _version >= list(version)
+
+
+def _cache_dir():
+    """
+    The directory where the git support saves data across sessions
+    """
+    return os.path.join(GPS.get_home_dir(), 'vcs_cache', 'git')
+
+
+def _save_in_cache(filename, contents):
+    """
+    Save `contents` in `filename`, and remove the oldest files from the
+    cache directory. Failures are only logged: the cache is only an
+    optimization.
+    """
+    try:
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(filename + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(contents)
+        os.replace(filename + '.tmp', filename)
+
+        files = [os.path.join(directory, f) for f in os.listdir(directory)]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for f in files[_CACHE_MAX_FILES:]:
+            os.remove(f)
+    except (IOError, OSError) as e:
+        GPS.Logger("GIT").log("Cannot save %s: %s" % (filename, e))
+
+
+_STAGED_STATUS = {
+    'M': GPS.VCS2.Status.STAGED_MODIFIED,
+    'A': GPS.VCS2.Status.STAGED_ADDED,
+    'D': GPS.VCS2.Status.STAGED_DELETED,
+    'R': GPS.VCS2.Status.STAGED_RENAMED,
+    'C': GPS.VCS2.Status.STAGED_COPIED,
+    '?': GPS.VCS2.Status.UNTRACKED,
+    '!': GPS.VCS2.Status.IGNORED}
+
+
+def _status_from_xy(xy):
+    """
+    Convert the two letters status code of "git status --porcelain" into
+    a GPS.VCS2.Status
+    """
+    if xy in ('DD', 'AU', 'UD', 'UA', 'DU', 'AA', 'UU'):
+        return GPS.VCS2.Status.CONFLICT
+
+    status = _STAGED_STATUS.get(xy[0], 0)
+    if xy[1] == 'M':
+        status = status | GPS.VCS2.Status.MODIFIED
+    elif xy[1] == 'D':
+        status = status | GPS.VCS2.Status.DELETED
+    return status
+
+
+class _Porcelain_V2_Parser(object):
+    """
+    Parse the output of "git status --porcelain=v2 -z" as it is emitted by
+    the process, and call `on_status(path, xy)` for each file.
+    """
+
+    def __init__(self, on_status):
+        self.on_status = on_status
+        self.__partial = ''
+        # The last record, until its terminating NUL has been seen
+        self.__skip_next = False
+        # Whether the next record is the original path of a rename
+
+    def __call__(self, output):
+        if output is None:
+            return
+        records = (self.__partial + output).split('\0')
+        self.__partial = records.pop()
+        for r in records:
+            if self.__skip_next:
+                self.__skip_next = False
+            elif r[:2] == '1 ':
+                # 1 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <path>
+                fields = r.split(' ', 8)
+                self.on_status(fields[8], fields[1].replace('.', ' '))
+            elif r[:2] == '2 ':
+                # 2 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <X><score> <path>
+                # followed by a record with the original path
+                fields = r.split(' ', 9)
+                self.on_status(fields[9], fields[1].replace('.', ' '))
+                self.__skip_next = True
+            elif r[:2] == 'u ':
+                # u <XY> <sub> <m1> <m2> <m3> <mW> <h1> <h2> <h3> <path>
+                fields = r.split(' ', 10)
+                self.on_status(fields[10], fields[1])
+            elif r[:2] in ('? ', '! '):
+                self.on_status(r[2:], r[0] * 2)
+
+
+_BLAME_CACHE_SIZE = 16
+# Number of files for which the blame information is kept in memory
+
+
+class _Blame(object):
+    """
+    The annotations of a file, as computed by "git blame" for a given
+    contents of the file and a given HEAD.
+    """
+
+    def __init__(self, head, digest, lines):
+        self.head = head
+        self.digest = digest
+        self.lines = lines
+        # The contents of the file, to compute the changes on next blame
+
+        self.ids = [None] * len(lines)
+        self.texts = [None] * len(lines)
+        # The commit id and annotation for each line, None until known
+
+        self.__info = {}
+        # Annotation for each commit id seen in the output of git
+        self.__group = None
+        # (id, first line, number of lines) for the group being parsed
+
+    def reuse(self, previous, visitor, file):
+        """
+        Copy the annotations of the lines unchanged since `previous`, which
+        was computed for the same HEAD, and report them to `visitor`.
+
+        :return: the list of (first, last) ranges of lines (starting at 1)
+           that need to be blamed again
+        """
+        ranges = []
+        matcher = difflib.SequenceMatcher(None, previous.lines, self.lines)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                self.ids[j1:j2] = previous.ids[i1:i2]
+                self.texts[j1:j2] = previous.texts[i1:i2]
+                visitor.annotations(
+                    file, j1 + 1, self.ids[j1:j2], self.texts[j1:j2])
+            elif j2 > j1:
+                ranges.append((j1 + 1, j2))
+        return ranges
+
+    def parse(self, line):
+        """
+        Parse one line of "git blame --incremental".
+
+        :return: (first line, ids, texts) when a group of lines is
+           complete, None otherwise
+        """
+        if self.__group is None:
+            id, _, final, count = line.split(' ')
+            self.__group = (id, int(final), int(count))
+
+        elif line.startswith('author '):
+            self.__info[self.__group[0]] = line[7:17]  # at most 10 chars
+
+        elif line.startswith('committer-time '):
+            id = self.__group[0]
+            d = datetime.datetime.fromtimestamp(
+                int(line[15:])).strftime('%Y%m%d')
+            self.__info[id] = '%s %10s %s' % (d, self.__info[id], id[0:7])
+
+        elif line.startswith('filename '):
+            # Last line of the group
+            id, first, count = self.__group
+            self.__group = None
+            self.ids[first - 1:first - 1 + count] = [id] * count
+            self.texts[first - 1:first - 1 + count] = (
+                [self.__info[id]] * count)
+            return (first, self.ids[first - 1:first - 1 + count],
+                    self.texts[first - 1:first - 1 + count])
+
+        return None
+
+
+_HISTORY_FORMAT = '--pretty=tformat:%H@@%P@@%an@@%cD@@%s'
+# Format of "git log" for _Commit_Graph.add
+
+
+def _history_line(visitor, id, parents, author, date, subject, decoration,
+                  flags, has_local):
+    """
+    Report one commit to the History view.
+
+    :param str decoration: the refs pointing to the commit, as output by
+       "%D" in "git log"
+    :param bool has_local: whether there are uncommitted changes, which are
+       reported as a dummy child of HEAD
+    """
+    if not decoration:
+        branch_descr = None
+    else:
+        branch_descr = []
+        for b in decoration.split(','):
+            b = b.strip()
+
+            # ??? How do we detect other remotes
+            if b.startswith('origin/'):
+                f = (b, GPS.VCS2.Commit.Kind.REMOTE)
+            elif b.startswith("HEAD"):
+                f = (b, GPS.VCS2.Commit.Kind.HEAD)
+                # Append a dummy entry if we have local changes, and
+                # we have the HEAD
+                if has_local:
+                    visitor.history_line(GPS.VCS2.Commit(
+                        LOCAL_CHANGES_ID,
+                        '',
+                        '',
+                        '<uncommitted changes>',
+                        parents=[id],
+                        flags=GPS.VCS2.Commit.Flags.UNCOMMITTED |
+                        GPS.VCS2.Commit.Flags.UNPUSHED))
+
+            elif b.startswith("tag: "):
+                f = (b[5:], GPS.VCS2.Commit.Kind.TAG)
+            else:
+                f = (b, GPS.VCS2.Commit.Kind.LOCAL)
+
+            branch_descr.append(f)
+
+    visitor.history_line(GPS.VCS2.Commit(
+        id, author, date, subject, parents, branch_descr, flags=flags))
+
+
+class _Commit_Graph(object):
+    """
+    The commits reachable from HEAD and from all branches, tags and
+    remotes, with their metadata and parents, in topological order.
+    The graph is saved on disk, so that refreshing the history only needs
+    to fetch the commits added since the last refresh, even in a new
+    session.
+    """
+
+    VERSION = 1
+
+    def __init__(self, filename):
+        self.filename = filename
+
+        self.tips = {}
+        # The decoration of the refs the graph was computed for (see
+        # Git.__ref_tips)
+
+        self.commits = {}
+        # Maps commit ids to (parents, author, date, subject)
+
+        self.order = []
+        # All commit ids, children before parents
+
+        try:
+            with open(filename, encoding='utf-8') as f:
+                data = json.load(f)
+            if data['version'] == _Commit_Graph.VERSION:
+                self.tips = data['tips']
+                self.commits = data['commits']
+                self.order = data['order']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        _save_in_cache(self.filename, json.dumps({
+            'version': _Commit_Graph.VERSION,
+            'tips': self.tips,
+            'commits': self.commits,
+            'order': self.order}))
+
+    def add(self, line):
+        """
+        Add a commit from one line of output of "git log", using
+        _HISTORY_FORMAT.
+
+        :return: the id of the commit, or None if the line is invalid or
+           the commit is already known
+        """
+        fields = line.split('@@', 4)
+        if len(fields) != 5 or fields[0] in self.commits:
+            return None
+        id, parents, author, date, subject = fields
+        self.commits[id] = (parents.split(), author, date, subject)
+        return id
+
+    def update(self, tips, added):
+        """
+        Record the new tips of the refs and the commits `added` for them,
+        and forget about commits no longer reachable, for instance after
+        a branch was deleted or rebased.
+        """
+        reachable = set(tips)
+        order = []
+        for id in added + self.order:
+            if id in reachable:
+                order.append(id)
+                reachable.update(self.commits[id][0])
+            else:
+                del self.commits[id]
+        self.tips = tips
+        self.order = order
+
+
+class _History_Walker(object):
+    """
+    Report the commits of a _Commit_Graph to the History view, up to
+    `max_lines` of them (or all if None).
+
+    Commits must be visited children first: the refs a commit is reachable
+    from are then known when it is visited, which is used to skip commits
+    that are no longer reachable, and to compute the unpushed commits (those
+    reachable from HEAD but not from a remote) without walking the whole
+    graph.
+    """
+
+    REF = 1
+    HEAD = 2
+    REMOTE = 4
+
+    def __init__(self, graph, tips, visitor, max_lines, current_branch_only,
+                 has_local):
+        self.graph = graph
+        self.tips = tips
+        self.visitor = visitor
+        self.remaining = max_lines
+        self.has_local = has_local
+        self.wanted = (_History_Walker.HEAD if current_branch_only
+                       else _History_Walker.REF)
+
+        self.reachable = {}
+        # The refs each commit not visited yet is reachable from
+
+        self.has_remote = False
+        # Whether there is a remote, without which no commit is unpushed
+
+        for id, decoration in tips.items():
+            kind = _History_Walker.REF
+            for b in decoration.split(','):
+                b = b.strip()
+                if b.startswith('HEAD'):
+                    kind |= _History_Walker.HEAD
+                elif b.startswith('origin/'):
+                    kind |= _History_Walker.REMOTE
+            self.reachable[id] = kind
+            if kind & _History_Walker.REMOTE:
+                self.has_remote = True
+
+    @property
+    def done(self):
+        """
+        Whether no more commits need to be reported
+        """
+        return self.remaining == 0 or not self.reachable
+
+    def visit(self, id):
+        kind = self.reachable.pop(id, 0)
+        if kind == 0:
+            return
+
+        parents, author, date, subject = self.graph.commits[id]
+        for p in parents:
+            self.reachable[p] = self.reachable.get(p, 0) | kind
+
+        if kind & self.wanted and self.remaining != 0:
+            if self.remaining is not None:
+                self.remaining -= 1
+            if self.has_remote and (
+                    kind & (_History_Walker.HEAD | _History_Walker.REMOTE) ==
+                    _History_Walker.HEAD):
+                flags = GPS.VCS2.Commit.Flags.UNPUSHED
+            else:
+                flags = 0
+            _history_line(
+                self.visitor, id, parents, author, date, subject,
+                decoration=self.tips.get(id),
+                flags=flags,
+                has_local=self.has_local)
+
 
 @core.register_vcs(default_status=GPS.VCS2.Status.NO_VCS)
 class Git(core.VCS):
@@ -44,9 +431,21 @@ class Git(core.VCS):
     def __init__(self, *args, **kwargs):
         super(Git, self).__init__(*args, **kwargs)
 
-        self._non_default_files = None
-        # Files with a non-default status
-        self.__set_git_version()
+        self.__snapshot = {}
+        # Status of all files, as sent to GPS on the last refresh: maps
+        # paths relative to the working directory to a GPS.VCS2.Status
+
+        self.__tree = None
+        # (commit id, list of relative paths) for the last HEAD listing
+
+        self.__version = self.__set_git_version()
+        # A promise resolved once the version of git is known
+
+        self.__history = None
+        # The _Commit_Graph, loaded when the history is first needed
+
+        self.__blames = collections.OrderedDict()
+        # The last _Blame computed for each file, most recent last
 
     def _git(self, args, block_exit=False, **kwargs):
         """
@@ -67,65 +466,73 @@ class Git(core.VCS):
         f = f.replace("\\", "/")
         return f
 
-    def __git_ls_tree(self, s):
+    def __head_tree(self):
         """
-        Compute all files under version control
-        :param list all_files: will be modified to include the list of files
+        Compute all files under version control in HEAD, as paths relative
+        to the working directory.
+        The listing of a given commit never changes, so it is kept in memory
+        and saved on disk for each commit id, which saves the cost of running
+        "git ls-tree" on large repositories across sessions.
         """
-        non_default_files = s.files_with_explicit_status
-        p = self._git(['ls-tree', '-r', 'HEAD', '--name-only'])
-        while True:
-            line = yield p.wait_line()
-            if line is None:
-                break
-            f = GPS.File(os.path.join(self.working_dir.path, line))
-            if f not in non_default_files:
-                s.set_status(f, GPS.VCS2.Status.UNMODIFIED)
+        p = self._git(['rev-parse', '--verify', '-q', 'HEAD'],
+                      ignore_error=True)
+        status, output = yield p.wait_until_terminate()
+        commit = output.strip()
+        if status != 0 or not commit:
+            yield []   # no commit yet
+            return
+
+        if self.__tree is not None and self.__tree[0] == commit:
+            yield self.__tree[1]
+            return
+
+        cache = os.path.join(_cache_dir(), 'ls-tree-%s' % commit)
+        try:
+            with open(cache, encoding='utf-8') as f:
+                paths = f.read().split('\0')
+            GPS.Logger("GIT").log("ls-tree for %s read from cache" % commit)
+        except (IOError, OSError, ValueError):
+            p = self._git(['ls-tree', '-r', '-z', '--name-only', commit])
+            status, output = yield p.wait_until_terminate()
+            paths = [path for path in output.split('\0') if path]
+            if status == 0:
+                _save_in_cache(cache, '\0'.join(paths))
 
-    def __git_status(self, s):
+        self.__tree = (commit, paths)
+        yield paths
+
+    def __git_status(self, statuses):
         """
         Run and parse "git status"
-        :param s: the result of calling self.set_status_for_all_files
+        :param dict statuses: will be modified to map the relative path of
+           each file reported by git to its GPS.VCS2.Status
         """
+        def on_status(path, xy):
+            # Filter some obvious files to speed things up
+            if path[-2:] != '.o' and path[-4:] != '.ali':
+                statuses[path] = _status_from_xy(xy)
+
+        if _git_version_at_least(2, 11):
+            args = ['-c', 'core.untrackedCache=true']
+            if (sys.platform in ('win32', 'darwin')
+                    and _git_version_at_least(2, 36)):
+                # Builtin file system monitor, so that git does not need to
+                # scan the whole working tree on each refresh.
+                args += ['-c', 'core.fsmonitor=true']
+            p = self._git(
+                args + ['status', '--porcelain=v2', '-z', '--ignored'])
+            parser = _Porcelain_V2_Parser(on_status)
+            yield p.stream.subscribe(parser)   # wait until p terminates
+            return
+
         def on_line(line):
             if len(line) > 3:
-                if line[0:2] in ('DD', 'AU', 'UD', 'UA', 'DU', 'AA', 'UU'):
-                    status = GPS.VCS2.Status.CONFLICT
+                # If the path contains whitespaces then the output can be
+                # surrounded by '"' => remove them
+                if line[3] == '"' and line[-1] == '"':
+                    on_status(line[4:-1], line[0:2])
                 else:
-                    status = 0
-
-                    if line[0] == 'M':
-                        status = GPS.VCS2.Status.STAGED_MODIFIED
-                    elif line[0] == 'A':
-                        status = GPS.VCS2.Status.STAGED_ADDED
-                    elif line[0] == 'D':
-                        status = GPS.VCS2.Status.STAGED_DELETED
-                    elif line[0] == 'R':
-                        status = GPS.VCS2.Status.STAGED_RENAMED
-                    elif line[0] == 'C':
-                        status = GPS.VCS2.Status.STAGED_COPIED
-                    elif line[0] == '?':
-                        status = GPS.VCS2.Status.UNTRACKED
-                    elif line[0] == '!':
-                        status = GPS.VCS2.Status.IGNORED
-
-                    if line[1] == 'M':
-                        status = status | GPS.VCS2.Status.MODIFIED
-                    elif line[1] == 'D':
-                        status = status | GPS.VCS2.Status.DELETED
-
-                # Filter some obvious files to speed things up
-                if line[-3:] != '.o' and line[-5:] != '.ali':
-                    # If the path contains whitespaces then the output can be
-                    # surrounded by '"' => remove them
-                    if line[3] == '"' and line[-1] == '"':
-                        path = line[4:-1]
-                    else:
-                        path = line[3:]
-                    s.set_status(
-                        GPS.File(
-                            os.path.join(self.working_dir.path, path)),
-                        status)
+                    on_status(line[3:], line[0:2])
 
         if _version and _version in [1, 7, 2]:
             ignored = []
@@ -165,32 +572,57 @@ class Git(core.VCS):
         :param List(GPS.File) extra_files: files for which we need to
            set the status eventually
         """
-
+        # An explicit refresh from the user sends every status again, in
+        # case GPS's own cache is out of date.
+        if from_user:
+            self.__snapshot = {}
+            self._reset_sent_statuses()
+
+        # The output of "git status" depends on the version of git
+        yield self.__version
+
+        timings = []
+        start = time.time()
+
+        statuses = {}
+        yield self.__git_status(statuses)
+        timings.append(('status', time.time() - start))
+
+        # Files in HEAD but not in the output of "git status" are unmodified.
+        # The listing only changes with HEAD, so it is not recomputed on
+        # each refresh.
+        start = time.time()
+        tree = yield self.__head_tree()
+        for path in tree:
+            if path not in statuses:
+                statuses[path] = GPS.VCS2.Status.UNMODIFIED
+        timings.append(('ls-tree', time.time() - start))
+
+        # Only report the changes since the previous snapshot: GPS keeps the
+        # status of the other files in its own cache.
+        start = time.time()
         s = self.set_status_for_all_files()
+        previous = self.__snapshot
+        changes = 0
+        for path, status in statuses.items():
+            if previous.pop(path, None) != status:
+                s.set_status(
+                    GPS.File(os.path.join(self.working_dir.path, path)),
+                    status)
+                changes += 1
+        for path in previous:
+            # No longer known to git, for instance a removed untracked file
+            s.set_status(
+                GPS.File(os.path.join(self.working_dir.path, path)),
+                self.default_status)
+            changes += 1
+        self.__snapshot = statuses
+        timings.append(('diff', time.time() - start))
 
-        # Do we need to reset the "ls-tree" cache ? After the initial
-        # loading, this list no longer changes without also impacting the
-        # output of "git status", so we do not need to execute it again.
-        if from_user or self._non_default_files is None:
-            yield self.__git_status(s)
-            self._non_default_files = s.files_with_explicit_status
-            yield self.__git_ls_tree(s)
-        else:
-            # Reuse caches: we do not need to recompute the full list of files
-            # for git, since this will not change without also changing the
-            # output of "git status". We also do not reset the default status
-            # for all the files not in the git status output: that might be a
-            # slow operation that is blocking GPS. Instead, we only reset the
-            # default status for files that used to be in "git status" (for
-            # instance modified files), and are no longer there (either after
-            # a "reset" or a "commit").
-
-            yield self.__git_status(s)
-            nondefault = s.files_with_explicit_status
-            now_default = self._non_default_files.difference(nondefault)
-            self._non_default_files = nondefault
-            for f in now_default:
-                s.set_status(f, GPS.VCS2.Status.UNMODIFIED)
+        GPS.Logger("GIT").log(
+            "status refresh: %s, %d files, %d changes" % (
+                ", ".join("%s %.3fs" % t for t in timings),
+                len(statuses), changes))
 
         s.async_set_status_for_remaining_files()
 
@@ -289,8 +721,95 @@ class Git(core.VCS):
         status, _ = yield p.wait_until_terminate()
         yield status != 0
 
+    def __ref_tips(self):
+        """
+        Compute the commits pointed to by HEAD and by all branches, tags and
+        remotes.
+
+        :returntype: a dict mapping commit ids to their decoration, as
+           output by "%D" in "git log"
+        """
+        tips = {}
+        p = self._git(
+            ['log', '--no-walk=unsorted', '--pretty=tformat:%H@@%D',
+             '--branches', '--tags', '--remotes', 'HEAD'],
+            ignore_error=True)
+        while True:
+            line = yield p.wait_line()
+            if line is None:
+                break
+            if '@@' in line:
+                id, decoration = line.split('@@', 1)
+                tips[id] = decoration
+        yield tips
+
     @core.run_in_background
     def async_fetch_history(self, visitor, filter):
+        max_lines = filter[0]
+        for_file = filter[1]
+        pattern = filter[2]
+        current_branch_only = filter[3]
+        branch_commits_only = filter[4]
+
+        if for_file or pattern:
+            yield self.__fetch_filtered_history(visitor, filter)
+            return
+
+        if self.__history is None:
+            self.__history = _Commit_Graph(os.path.join(
+                _cache_dir(),
+                'history-%s.json' % hashlib.sha1(
+                    self.working_dir.path.encode('utf-8')).hexdigest()))
+        graph = self.__history
+
+        (tips, has_local) = yield join(
+            self.__ref_tips(),
+            self._has_local_changes())
+
+        walker = _History_Walker(
+            graph, tips, visitor,
+            max_lines=None if branch_commits_only else max_lines,
+            current_branch_only=current_branch_only,
+            has_local=has_local)
+
+        # Fetch the commits that are not in the cache yet. None of them is
+        # an ancestor of a cached commit, so they come first in the order
+        # and can be reported while they are parsed.
+
+        added = []
+        new_tips = [id for id in tips if id not in graph.commits]
+        if new_tips:
+            p = self._git(
+                ['log', '--topo-order', '--ignore-missing', _HISTORY_FORMAT] +
+                new_tips + ['--not'] + list(graph.tips))
+            while True:
+                line = yield p.wait_line()
+                if line is None:
+                    break
+                id = graph.add(line)
+                if id is not None:
+                    added.append(id)
+                    walker.visit(id)
+
+        for id in graph.order:
+            if walker.done:
+                break
+            walker.visit(id)
+
+        GPS.Logger("GIT").log(
+            "history: %d cached commits, %d new commits" % (
+                len(graph.order), len(added)))
+
+        if added or tips != graph.tips:
+            graph.update(tips, added)
+            graph.save()
+
+    def __fetch_filtered_history(self, visitor, filter):
+        """
+        Fetch the history when filtering on a file or a pattern. This runs
+        "git log" with the corresponding filters, instead of using the
+        commit graph.
+        """
         # Compute, in parallel, needed pieces of information
         (unpushed, has_local) = yield join(
             self._unpushed_local_changes(),
@@ -338,47 +857,13 @@ class Git(core.VCS):
                 GPS.Logger("GIT").log("finished git-status")
                 break
 
-            id, parents, author, branches, date, subject = line.split('@@')
-            parents = parents.split()
-            branches = None if not branches else branches.split(',')
-
-            flags = 0
-            if id in unpushed:
-                flags |= GPS.VCS2.Commit.Flags.UNPUSHED
-
-            if branches is None:
-                branch_descr = None
-            else:
-                branch_descr = []
-                for b in branches:
-                    b = b.strip()
-
-                    # ??? How do we detect other remotes
-                    if b.startswith('origin/'):
-                        f = (b, GPS.VCS2.Commit.Kind.REMOTE)
-                    elif b.startswith("HEAD"):
-                        f = (b, GPS.VCS2.Commit.Kind.HEAD)
-                        # Append a dummy entry if we have local changes, and
-                        # we have the HEAD
-                        if has_local:
-                            visitor.history_line(GPS.VCS2.Commit(
-                                LOCAL_CHANGES_ID,
-                                '',
-                                '',
-                                '<uncommitted changes>',
-                                parents=[id],
-                                flags=GPS.VCS2.Commit.Flags.UNCOMMITTED |
-                                GPS.VCS2.Commit.Flags.UNPUSHED))
-
-                    elif b.startswith("tag: "):
-                        f = (b[5:], GPS.VCS2.Commit.Kind.TAG)
-                    else:
-                        f = (b, GPS.VCS2.Commit.Kind.LOCAL)
-
-                    branch_descr.append(f)
-
-            visitor.history_line(GPS.VCS2.Commit(
-                id, author, date, subject, parents, branch_descr, flags=flags))
+            id, parents, author, branches, date, subject = line.split(
+                '@@', 5)
+            _history_line(
+                visitor, id, parents.split(), author, date, subject,
+                decoration=branches,
+                flags=GPS.VCS2.Commit.Flags.UNPUSHED if id in unpushed else 0,
+                has_local=has_local)
             nb_added_lines += 1
 
         GPS.Logger("GIT").log(
@@ -483,37 +968,60 @@ class Git(core.VCS):
 
     @core.run_in_background
     def async_annotations(self, visitor, file):
-        info = {}   # for each commit id, the annotation
-        current_id = None
-        first_line = 1
-        lines = []
-        ids = []
-
-        p = self._git(['blame', '--porcelain', file.path])
-        while True:
-            line = yield p.wait_line()
-            if line is None:
-                break
-
-            if current_id is None:
-                current_id = line.split(' ', 1)[0]
-
-            elif line[0] == '\t':
-                # The line of code, which we ignore
-                lines.append(info[current_id])
-                ids.append(current_id)
-                current_id = None
-
-            elif line.startswith('author '):
-                info[current_id] = line[7:17]  # at most 10 chars
-
-            elif line.startswith('committer-time '):
-                d = datetime.datetime.fromtimestamp(
-                    int(line[15:])).strftime('%Y%m%d')
-                info[current_id] = '%s %10s %s' % (
-                    d, info[current_id], current_id[0:7])
-
-        visitor.annotations(file, first_line, ids, lines)
+        # Annotations only depend on the contents of the file and on HEAD:
+        # reuse the previous ones when neither changed, and only blame the
+        # modified lines when only the file changed.
+
+        p = self._git(['rev-parse', '--verify', '-q', 'HEAD'],
+                      ignore_error=True)
+        _, head = yield p.wait_until_terminate()
+        try:
+            with open(file.path, 'rb') as f:
+                contents = f.read()
+        except (IOError, OSError):
+            contents = b''
+
+        # Split lines the way git does
+        lines = contents.decode('utf-8', 'replace').split('\n')
+        if lines[-1] == '':
+            lines.pop()
+
+        previous = self.__blames.pop(file.path, None)
+        blame = _Blame(
+            head.strip(), hashlib.sha1(contents).hexdigest(), lines)
+
+        if previous is None or previous.head != blame.head:
+            ranges = None
+        elif previous.digest == blame.digest:
+            ranges = []
+            blame = previous
+            if blame.ids:
+                visitor.annotations(file, 1, blame.ids, blame.texts)
+        else:
+            ranges = blame.reuse(previous, visitor, file)
+
+        if ranges is None or ranges:
+            # Report each group of lines as soon as git has found the commit
+            # it comes from, instead of waiting for the whole file.
+            args = ['blame', '--incremental']
+            for first, last in ranges or []:
+                args.append('-L%d,%d' % (first, last))
+            p = self._git(args + ['--', file.path])
+            while True:
+                line = yield p.wait_line()
+                if line is None:
+                    break
+                group = blame.parse(line)
+                if group is not None:
+                    visitor.annotations(file, group[0], group[1], group[2])
+
+            if None in blame.ids:
+                # git failed, do not keep partial annotations
+                return
+
+        self.__blames[file.path] = blame
+        while len(self.__blames) > _BLAME_CACHE_SIZE:
+            self.__blames.popitem(last=False)
 
     def _branches(self, visitor):
         """
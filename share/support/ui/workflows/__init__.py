@@ -118,6 +118,7 @@ is executed.
 
 import inspect
 import sys
+import time
 import GPS
 import workflows.promises as promises
 import traceback
@@ -134,6 +135,10 @@ workflows_target_name_set = set()
 # Table of exit handlers for build targets implemented via workflows
 exit_handlers_table = {}
 
+# The maximum time, in milliseconds, that a workflow run by task_workflow
+# spends executing its generators each time its task is executed
+task_budget_ms = 20
+
 
 def run_registered_workflows(workflow_name, target_name, main_name):
     """ Find workflow and run it with the driver.
@@ -183,6 +188,227 @@ def peel_traceback_to(tb, frame):
     return tb
 
 
+class Workflow(promises.Promise):
+    """
+    The execution state of a workflow, as created by `driver` or
+    `task_workflow`.
+
+    This is a promise, resolved when the workflow has finished executing,
+    or rejected if it raised an uncaught exception or was cancelled.
+
+    Continuations are queued rather than run recursively: when a promise
+    is resolved while the workflow is executing (for instance because it
+    was already resolved when it was yielded), the workflow simply
+    executes its next step in the same loop, so long chains of fast yields
+    do not grow the Python stack.
+
+    :ivar list gen_stack: the stack of generators, similar to a call stack.
+       The first one is the original generator and the last one is the
+       most recently spawned one.
+    :ivar int steps: the number of generator steps executed so far.
+    :ivar float latency: the total time, in seconds, between the
+       resolution of the promises that the workflow waited on and the
+       moment the workflow was resumed.
+    :ivar float max_latency: the longest of these delays, in seconds.
+    """
+
+    def __init__(self, gen_inst, autorun=True):
+        """
+        :param bool autorun: whether to resume the workflow as soon as the
+           promise it waits on is resolved. Otherwise, the owner of the
+           workflow is responsible for calling `run`.
+        """
+        super(Workflow, self).__init__()
+        self.gen_stack = [gen_inst]
+        self.steps = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.cancelled = False
+
+        self.__autorun = autorun
+        self.__running = False
+        self.__waiting = None      # The promise the workflow is waiting on
+        self.__resolved_at = None  # When that promise was resolved
+
+        # The value to send to the current generator, and the exception to
+        # throw into it, if any
+        self.__return_val = None
+        self.__exc_info = None
+
+        # The last value yielded by the current generator, which becomes
+        # the value returned to its parent when it terminates
+        self.__last = None
+
+    @property
+    def ready(self):
+        """Whether the workflow can execute its next step right away"""
+        return (bool(self.gen_stack) and self.__waiting is None
+                and not self.cancelled)
+
+    def run(self, budget_ms=None):
+        """
+        Execute the workflow until it waits on a promise that is not yet
+        resolved, terminates, or (when `budget_ms` is not None) has run
+        for more than `budget_ms` milliseconds.
+        """
+        if self.__running:
+            return   # the running loop will execute the next steps
+
+        self.__running = True
+        deadline = (None if budget_ms is None
+                    else time.time() + budget_ms / 1000.0)
+        try:
+            while self.ready:
+                if self.__resolved_at is not None:
+                    delay = time.time() - self.__resolved_at
+                    self.__resolved_at = None
+                    self.latency += delay
+                    self.max_latency = max(self.max_latency, delay)
+
+                self.__step()
+                if deadline is not None and time.time() >= deadline:
+                    break
+        finally:
+            self.__running = False
+
+        if self.cancelled and self.gen_stack:
+            # cancel() was called from the workflow itself
+            self.__close()
+
+    def cancel(self):
+        """
+        Stop executing the workflow. GeneratorExit is raised in each of its
+        generators, starting with the most recently spawned one, so that
+        their `finally` clauses are executed, then the workflow is rejected.
+        """
+        if self.cancelled or self._state != promises.Promise.PENDING:
+            return
+
+        self.cancelled = True
+        self.__waiting = None
+        if not self.__running:
+            self.__close()
+
+    def __close(self):
+        while self.gen_stack:
+            gen = self.gen_stack.pop()
+            try:
+                gen.close()
+            except Exception:
+                GPS.Logger("WORKFLOW").log(
+                    "Exception while cancelling workflow: %s" %
+                    traceback.format_exc())
+        self.reject("cancelled")
+
+    def __on_resolved(self, promise, value):
+        if promise is not self.__waiting:
+            return   # the workflow has been cancelled
+
+        self.__waiting = None
+        self.__resolved_at = time.time()
+        self.__return_val = value
+        self.__exc_info = None
+        self.__last = None
+
+        if self.__autorun:
+            self.run()
+
+    def __step(self):
+        """Execute one step of the current generator"""
+        gen = self.gen_stack[-1]
+        self.steps += 1
+
+        try:
+            if self.__exc_info is not None:
+                # If the previous round raised an exception, propagate it
+                # to this generator.
+                el = gen.throw(*self.__exc_info)
+            elif self.__return_val is not None:
+                # If there's feedback from previous event, tell the
+                # generator.
+                el = gen.send(self.__return_val)
+            else:
+                # Otherwise just go to the next step.
+                el = next(gen)
+
+        except StopIteration:
+            # The current generator just done: discard it so we can resume
+            # its parent generator with the last value it yielded.
+            self.gen_stack.pop()
+            el = self.__last
+
+        except BaseException as e:
+            # The current generator aborted because of an uncaught
+            # exception: discard it and let the next round propagate the
+            # exception to its "caller".
+            self.gen_stack.pop()
+
+            # For debugging purpose, keep exception information so that at
+            # the end, the user can have a traceback that is focused on its
+            # generators.
+            exc_type, exc_value, exc_tb = sys.exc_info()
+            GPS.Logger("WORKFLOW").log(
+                "Unexpected exception in workflow: %s %s" %
+                (e, " ".join(traceback.format_tb(exc_tb))))
+
+            # Strip the traceback to only keep the user part. Be careful
+            # about currentframe: on some implementations it can return
+            # None.
+            frame = inspect.currentframe()
+            if frame:
+                exc_tb = peel_traceback_to(exc_tb, frame)
+                # We want a traceback that do not contain this frame: peel
+                # one more level!
+                if exc_tb:
+                    exc_tb = exc_tb.tb_next
+            self.__exc_info = (exc_type, exc_value, exc_tb)
+            self.__finish_if_done()
+            return
+
+        if isinstance(el, types.GeneratorType):
+            # The last generator performed some kind of "call": schedule to
+            # run the child generator for the next round.
+            self.gen_stack.append(el)
+            el = None
+        elif isinstance(el, promises.Promise):
+            # If the last generator yielded a promise, resume its execution
+            # when the promise is ready. If it already is, this only marks
+            # the workflow as ready for the next round.
+            # ??? Should we connect to reject to cancel the whole workflow?
+            self.__last = None
+            self.__waiting = el
+            el.then(lambda value: self.__on_resolved(el, value))
+            return
+
+        # Clean state for the next round.
+        self.__last = el
+        self.__return_val = el
+        self.__exc_info = None
+        self.__finish_if_done()
+
+    def __finish_if_done(self):
+        if self.gen_stack:
+            return
+
+        # There's nothing to execute anymore: just log any uncaught
+        # exception.
+        if self.__exc_info is not None:
+            message = (
+                'Uncaught exception in workflows:\n'
+                '{}\n'.format(
+                    ''.join(traceback.format_exception(*self.__exc_info)))
+            )
+            # This one is for debugging/testing convenience.
+            GPS.Console('Messages').write(message)
+            # This one is for automatic issue detection in testsuites. This
+            # should also ring a bell while analysis post-mortem GNAT Studio
+            # logs.
+            GPS.Logger('TESTSUITE.EXCEPTIONS').log(message)
+            self.reject(message)
+        else:
+            self.resolve(self.__return_val)
+
+
 def driver(gen_inst):
     """
     This is the main driver for workflows. You can pass your worklow (which is
@@ -216,108 +442,16 @@ def driver(gen_inst):
     Generators can throw exceptions: these will be propagated to the generator
     that spawned them.
 
-    :return: a promise, that will be resolved when the workflow has finished
-      executing. This can in general be ignored, since as described above
-      `driver` will automatically chain things. In some contexts it might be
-      useful to use this promise though.
+    :return: a `Workflow`, which is a promise that will be resolved when the
+      workflow has finished executing. This can in general be ignored, since
+      as described above `driver` will automatically chain things. In some
+      contexts it might be useful to use this promise though, for instance
+      to cancel the workflow.
     """
 
-    promise = promises.Promise()
-
-    # Stack of generators, similar to a call stack. The first one is the
-    # original generator and the last one is the most recently spawned one.
-    gen_stack = [gen_inst]
-
-    def resume(return_val=None):
-        """Resume execution for this workflow."""
-        el = None
-        exc_info = None
-
-        while gen_stack:
-            gen = gen_stack[-1]
-            try:
-                if exc_info is not None:
-                    # If the previous round raised an exception, propagate it
-                    # to this generator.
-                    el = gen.throw(*exc_info)
-                elif return_val is not None:
-                    # If there's feedback from previous event, tell the
-                    # generator.
-                    el = gen.send(return_val)
-                else:
-                    # Otherwise just go to the next step.
-                    el = next(gen)
-
-            except StopIteration:
-                # The current generator just done: discard it so we can resume
-                # its parent generator.
-                gen_stack.pop()
-
-            except BaseException as e:
-                # The current generator aborted because of an uncaught
-                # exception: discard it and let the next round propagate the
-                # exception to its "caller".
-                gen_stack.pop()
-
-                # For debugging purpose, keep exception information so that at
-                # the end, the user can have a traceback that is focused on its
-                # generators.
-                exc_type, exc_value, exc_tb = sys.exc_info()
-                GPS.Logger("WORKFLOW").log(
-                    "Unexpected exception in workflow: %s %s" %
-                    (e, " ".join(traceback.format_tb(exc_tb))))
-
-                # Strip the traceback to only keep the user part. Be careful
-                # about currentframe: on some implementations it can return
-                # None.
-                frame = inspect.currentframe()
-                if frame:
-                    exc_tb = peel_traceback_to(exc_tb, frame)
-                    # We want a traceback that do not contain this frame: peel
-                    # one more level!
-                    if exc_tb:
-                        exc_tb = exc_tb.tb_next
-                exc_info = (exc_type, exc_value, exc_tb)
-                continue
-
-            if isinstance(el, types.GeneratorType):
-                # The last generator performed some kind of "call": schedule to
-                # run the child generator for the next round.
-                gen_stack.append(el)
-                el = None
-            elif isinstance(el, promises.Promise):
-                # If the last generator yielded a promise, schedule to resume
-                # its execution when the promise is ready.
-                # ??? Should we connect to reject to cancel the whole workflow?
-                el.then(resume)
-                return
-
-            # Clean state for the next round.
-            return_val = el
-            exc_info = None
-
-        # If we reach this point, there's nothing to execute anymore: just log
-        # any uncaught exception.
-        if exc_info is not None:
-            message = (
-                'Uncaught exception in workflows:\n'
-                '{}\n'.format(''.join(traceback.format_exception(*exc_info)))
-            )
-            # This one is for debugging/testing convenience.
-            GPS.Console('Messages').write(message)
-            # This one is for automatic issue detection in testsuites. This
-            # should also ring a bell while analysis post-mortem GNAT Studio
-            # logs.
-            GPS.Logger('TESTSUITE.EXCEPTIONS').log(message)
-            promise.reject(message)
-        else:
-            promise.resolve(return_val)
-
-    # We just created a new execution state (gen_stack), so technically we are
-    # resuming it below.
-    resume()
-
-    return promise
+    workflow = Workflow(gen_inst)
+    workflow.run()
+    return workflow
 
 
 def run_as_workflow(workflow):
@@ -369,10 +503,12 @@ def task_workflow(task_name, workflow, active=False, **kwargs):
     as long as the task is running - if the task is interrupted, the workflow
     is never resumed. The ``active`` parameter controls whether the task is
     run immediately when GS is idle or whether it's monitored by a timeout
-    function (100ms).
+    function (100ms). Each time the task runs, the workflow executes as many
+    steps as possible in `task_budget_ms` milliseconds.
 
     Unless it is interrupted, the task returns with success once the workflow
-    completes.
+    completes. The workflow is available as ``task.workflow``: calling its
+    ``cancel`` method stops it and terminates the task.
 
     For instance:
 
@@ -411,69 +547,27 @@ def task_workflow(task_name, workflow, active=False, **kwargs):
         # The task manager might try to run "execute" right after the creation
         # of the task, ie before it has been given the necessary attributes
         # to manage the workflow. In this case, simply wait.
-        if not hasattr(t, 'gen_stack'):
+        if not hasattr(t, 'workflow'):
             return GPS.Task.EXECUTE_AGAIN
 
-        # If there are no generators left, nothing to do, leave the task.
-        if not t.gen_stack:
-            return GPS.Task.SUCCESS
+        # Execute as many steps as possible in the time budget. If a promise
+        # is running, this does nothing and we simply wait for this promise
+        # to return.
+        t.workflow.run(budget_ms=task_budget_ms)
 
-        # If this is set, this means that a promise is running. Simply wait
-        # for this promise to return.
-        if t.wait:
-            return GPS.Task.EXECUTE_AGAIN
-
-        # Act on the first generator in the stack
-        gen = t.gen_stack[-1]
-
-        try:
-            if t.return_val is not None:
-                # If we previously had a value to return, send it to the
-                # generator...
-                el = gen.send(t.return_val)
-                t.return_val = None
-            else:
-                # ... otherwise simply next the generator
-                el = next(gen)
-        except StopIteration:
-            # We reached the end of the generator: pop the stack and continue.
-            t.gen_stack.pop()
-            return GPS.Task.EXECUTE_AGAIN
-
-        if isinstance(el, types.GeneratorType):
-            # The last generator performed some kind of "call": schedule to
-            # run the child generator for the next round.
-            t.gen_stack.append(el)
-            el = None
-            return GPS.Task.EXECUTE_AGAIN
-
-        elif isinstance(el, promises.Promise):
-            # If the last generator yielded a promise, schedule to resume
-            # its execution when the promise is ready.
-
-            def resume(rv):
-                t.return_val = rv
-                t.wait = False
-
-            # We set 'wait' to True, this will be unset when the promise
-            # resolves.
-            t.wait = True
-            el.then(resume)
+        if t.workflow.gen_stack and not t.workflow.cancelled:
             return GPS.Task.EXECUTE_AGAIN
+        elif t.workflow._state == promises.Promise.RESOLVED:
+            return GPS.Task.SUCCESS
         else:
-            # The generator returned something which is neither a promise
-            # nor another generator: treat this as a yielded result.
-            t.return_val = el
-            return GPS.Task.EXECUTE_AGAIN
+            return GPS.Task.FAILURE
 
     # Create a task with our execute function
     t = GPS.Task(task_name, execute, active=active)
 
-    # We have created a task object: here are the fields that are going
-    # to be used for handling the workflow for it.
-    t.gen_stack = [workflow(t, **kwargs)]  # The stack of generators
-    t.return_val = None    # the value returned by the last generator call
-    t.wait = False         # A promise is running and the task should wait
+    # We have created a task object: attach the workflow to it. The workflow
+    # is only executed by the task.
+    t.workflow = Workflow(workflow(t, **kwargs), autorun=False)
     return t
 
 
@@ -305,6 +305,31 @@ def join(*args):
     return p
 
 
+wait_time = 0.0
+# The total time, in seconds, spent waiting on the promises returned by the
+# primitives of this module that wait for a delay or a condition. The
+# testsuite reports it for each test.
+
+_POLL_MIN_MSECS = 10
+_POLL_MAX_MSECS = 500
+# The bounds of the delay between two checks of wait_until's predicate, when
+# there is no event to check it on.
+
+
+def _timed(p):
+    """
+    Add the time until `p` is resolved to `wait_time`, and return `p`.
+    """
+    start = time.time()
+
+    def on_resolved(value):
+        global wait_time
+        wait_time += time.time() - start
+
+    p.then(on_resolved)
+    return p
+
+
 def timeout(msecs):
     """
     This primitive allows the user to delay execution of the rest of a workflow
@@ -326,7 +351,7 @@ def timeout(msecs):
         return False
 
     GLib.timeout_add(msecs, timeout_handler)
-    return p
+    return _timed(p)
 
 
 def wait_idle():
@@ -340,6 +365,63 @@ def wait_idle():
     return p
 
 
+def wait_until(predicate, hooks=(), timeout=0):
+    """
+    This primitive allows the writer of a workflow to wait until
+    `predicate()` returns True. The promise is resolved with True, or with
+    False if `timeout` (when not 0) milliseconds have elapsed first.
+
+    The predicate is first checked in an idle callback, then each time one
+    of `hooks` is run (also in an idle callback, so that GPS has finished
+    handling the event). When no hook can tell that the predicate may have
+    changed, it is polled instead, with delays starting at _POLL_MIN_MSECS
+    and doubling up to _POLL_MAX_MSECS.
+
+        yield wait_until(lambda: not GPS.Task.list(),
+                         hooks=["task_finished"])
+    """
+    p = Promise()
+    delay = _POLL_MIN_MSECS
+    check_id = None
+    timeout_id = None
+
+    def finish(result):
+        for h in hooks:
+            GPS.Hook(h).remove(on_hook)
+        for source in (check_id, timeout_id):
+            if source is not None:
+                GLib.source_remove(source)
+        p.resolve(result)
+
+    def check():
+        nonlocal check_id, delay
+        check_id = None
+        if predicate():
+            finish(True)
+        elif not hooks:
+            check_id = GLib.timeout_add(delay, check)
+            delay = min(2 * delay, _POLL_MAX_MSECS)
+        return False
+
+    def on_hook(hook, *args):
+        nonlocal check_id
+        if check_id is None:
+            check_id = GLib.idle_add(check)
+
+    def on_timeout():
+        nonlocal timeout_id
+        timeout_id = None
+        finish(False)
+        return False
+
+    for h in hooks:
+        GPS.Hook(h).add(on_hook)
+    if timeout > 0:
+        timeout_id = GLib.timeout_add(timeout, on_timeout)
+    check_id = GLib.idle_add(check)
+    return _timed(p)
+
+
 known_tasks = ["debugger output monitor 1", "refreshing Runtime menu"]
 # List of background tasks that are known to be running in the background
 
@@ -358,14 +440,13 @@ def wait_tasks(other_than=None):
     p = Promise()
     filt = other_than or []
 
-    def timeout_handler():
-        if not [x for x in GPS.Task.list() if x.name() not in filt]:
-            process_all_events()
-            GLib.idle_add(lambda: p.resolve())
-            return False
-        return True   # will try again
+    def on_terminated(result):
+        process_all_events()
+        GLib.idle_add(lambda: p.resolve())
 
-    GLib.timeout_add(200, timeout_handler)
+    wait_until(
+        lambda: not [x for x in GPS.Task.list() if x.name() not in filt],
+        hooks=["task_finished"]).then(on_terminated)
     return p
 
 
@@ -376,13 +457,10 @@ def wait_specific_tasks(names):
     """
     p = Promise()
 
-    def timeout_handler():
-        if not [x for x in GPS.Task.list() if x.name() in names]:
-            GLib.idle_add(lambda: p.resolve())
-            return False
-        return True   # will try again
-
-    GLib.timeout_add(200, timeout_handler)
+    wait_until(
+        lambda: not [x for x in GPS.Task.list() if x.name() in names],
+        hooks=["task_finished"]).then(
+            lambda result: GLib.idle_add(lambda: p.resolve()))
     return p
 
 
@@ -483,6 +561,117 @@ def wait_signal(widget, signal_name, *args):
     return p
 
 
+def _can_search_from_offset(pattern):
+    """
+    Whether searching `pattern` in a text from an offset just after a
+    newline gives the same result as searching the text that follows that
+    offset.
+    """
+    src = pattern.pattern
+    return (isinstance(src, str) and '\\A' not in src and '(?<' not in src
+            and ('^' not in src or pattern.flags & re.MULTILINE))
+
+
+class _Output_Buffer(object):
+    """
+    The output of a process that has not been consumed yet by
+    wait_until_match or wait_line.
+    New output is queued as a list of chunks, which are only merged when
+    a match is attempted. Consuming a match only moves an offset in the
+    merged text, so the rest of the output is not copied for each match.
+    """
+
+    def __init__(self):
+        self.__chunks = []
+        self.__text = ""
+        self.__pos = 0       # start of the unconsumed text
+        self.__scanned = 0   # no newline in __text between __pos and this
+
+    def append(self, output):
+        if output:
+            self.__chunks.append(output)
+
+    def __merge(self):
+        if self.__chunks:
+            self.__chunks.insert(0, self.__text[self.__pos:])
+            self.__text = "".join(self.__chunks)
+            self.__chunks = []
+            self.__scanned -= self.__pos
+            self.__pos = 0
+
+    def __consume(self, end):
+        if end == len(self.__text):
+            self.__text = ""
+            end = 0
+        self.__pos = self.__scanned = end
+
+    def search(self, pattern, from_offset):
+        """
+        Consume the output up to the first match of `pattern`, and return
+        the matched text, or None if there is no match yet.
+
+        :param bool from_offset: whether the pattern can be searched from
+           the current offset when it follows a newline (see
+           `_can_search_from_offset`). Otherwise the unconsumed text is
+           copied first, so that anchors match at its beginning.
+        """
+        self.__merge()
+        if self.__pos and (
+                not from_offset or self.__text[self.__pos - 1] != '\n'):
+            self.__text = self.__text[self.__pos:]
+            self.__scanned -= self.__pos
+            self.__pos = 0
+
+        m = pattern.search(self.__text, self.__pos)
+        if m is None:
+            return None
+        self.__consume(m.end(0))
+        return m.group(0)
+
+    def next_line(self):
+        """
+        Consume the next line of output and return it without its trailing
+        newline, or None if no complete line is available yet.
+        """
+        self.__merge()
+        eol = self.__text.find('\n', max(self.__pos, self.__scanned))
+        if eol < 0:
+            self.__scanned = len(self.__text)
+            return None
+        line = self.__text[self.__pos:eol]
+        self.__consume(eol + 1)
+        return line
+
+
+class _Line_Splitter(object):
+    """
+    Split the chunks emitted by a process stream into lists of complete
+    lines, one list per chunk. See `ProcessWrapper.line_batches`.
+    """
+
+    def __init__(self):
+        self.partial = []   # chunks of the current incomplete line
+
+    def __call__(self, out_stream, output):
+        if '\n' not in output:
+            if output:
+                self.partial.append(output)
+            return
+
+        if self.partial:
+            self.partial.append(output)
+            output = "".join(self.partial)
+        lines = output.split('\n')
+        last = lines.pop()
+        self.partial = [last] if last else []
+        out_stream.emit(lines)
+
+    def oncompleted(self, out_stream, status):
+        if self.partial:
+            out_stream.emit(["".join(self.partial)])
+            self.partial = []
+
+
 class ProcessWrapper(object):
     """
     ProcessWrapper is an advanced process manager
@@ -541,11 +730,16 @@ class ProcessWrapper(object):
         # the stream that includes all output from the process
         self.__stream = None
 
-        # __current_pattern = regexp that user waiting for in the output
+        # __current_pattern = regexp that user waiting for in the output,
+        # or None when waiting for the next line
         self.__current_pattern = None
 
+        # Whether __current_pattern can be searched from an offset in
+        # __output
+        self.__from_offset = False
+
         # __output = a buffer for current output of self.__process
-        self.__output = ""
+        self.__output = _Output_Buffer()
 
         # __whether process has finished
         self.finished = False
@@ -638,8 +832,8 @@ class ProcessWrapper(object):
         Called by GPS everytime there's output coming
         """
         if self.__current_promise is not None:
-            self.__output += unmatch
-            self.__output += match
+            self.__output.append(unmatch)
+            self.__output.append(match)
             self.__check_pattern_and_resolve()
         if self.__stream is not None:
             self.__stream.emit(unmatch)
@@ -660,10 +854,13 @@ class ProcessWrapper(object):
         of the tool, and resolve the promise if possible.
         """
         if self.__current_promise is not None:
-            p = self.__current_pattern.search(self.__output)
-            if p:
-                self.__output = self.__output[p.end(0):]
-                self.__resolve_promise(p.group(0))
+            if self.__current_pattern is None:
+                found = self.__output.next_line()
+            else:
+                found = self.__output.search(
+                    self.__current_pattern, self.__from_offset)
+            if found is not None:
+                self.__resolve_promise(found)
             elif self.finished:
                 # We will never be able to match anyway
                 self.__resolve_promise(None)
@@ -676,7 +873,7 @@ class ProcessWrapper(object):
         """
         self.finished = True
         if self.__current_promise is not None:
-            self.__output += remaining_output
+            self.__output.append(remaining_output)
             self.__check_pattern_and_resolve()
 
         if self.__stream is not None:
@@ -723,7 +920,15 @@ class ProcessWrapper(object):
             self.__current_pattern = re.compile(pattern, re.MULTILINE)
         else:
             self.__current_pattern = pattern
+        self.__from_offset = _can_search_from_offset(self.__current_pattern)
 
+        return self.__wait(timeout)
+
+    def __wait(self, timeout=0):
+        """
+        Create the promise for the current pattern, and resolve it
+        immediately if possible.
+        """
         p = self.__current_promise = Promise()
 
         # Can we resolve immediately ?
@@ -744,15 +949,13 @@ class ProcessWrapper(object):
 
         :return: a promise
         """
-        p = Promise()
-
-        s = self.wait_until_match("^.*\n")
-        if s is None:
-            p.resolve(None)   # already finished
-        else:
-            s.then(lambda line: p.resolve(line[:-1] if line else None))
+        if self.finished:
+            p = Promise()
+            p.resolve(None)
+            return p
 
-        return p
+        self.__current_pattern = None
+        return self.__wait()
 
     @property
     def stream(self):
@@ -813,25 +1016,33 @@ class ProcessWrapper(object):
            the output.
         """
 
-        class map_to_line:
-            def __init__(self):
-                self.buffer = ""
-                self.__re = re.compile('^.*\n')
+        def emit_lines(out_stream, batch):
+            for line in batch:
+                out_stream.emit(line)
 
-            def __call__(self, out_stream, output):
-                self.buffer += output
-                while True:
-                    p = self.__re.search(self.buffer)
-                    if not p:
-                        break
-                    out_stream.emit(p.group(0)[:-1])
-                    self.buffer = self.buffer[p.end(0):]
+        return self.line_batches.flatMap(emit_lines)
 
-            def oncompleted(self, out_stream, status):
-                if self.buffer:
-                    out_stream.emit(self.buffer)
+    @property
+    def line_batches(self):
+        """
+        A stream that emits, for each chunk of output, the list of lines
+        that were completed by this chunk. The lines do not include the
+        trailing newline. This is similar to `lines`, but the subscribers
+        are only called once per chunk, which is faster for tools that
+        output a large number of lines::
 
-        return self.stream.flatMap(map_to_line())
+            def onlines(lines):
+                for line in lines:
+                    pass   # do something with the line
+
+            @run_as_workflow
+            def execute():
+                p = ProcessWrapper(...)
+                yield p.line_batches.subscribe(onlines)
+
+        :returntype: a stream, resolved when the process terminates.
+        """
+        return self.stream.flatMap(_Line_Splitter())
 
     def wait_until_terminate(self, show_if_error=False):
         """
@@ -252,6 +252,14 @@ class BasicTestDriver(GPSTestDriver):
                 # ... and no output: that's a PASS
                 self.result.set_status(TestStatus.PASS)
 
+        # Report the time the test spent waiting in the workflows
+        # primitives, as recorded by run_test_driver
+        wait_time = os.path.join(wd, "wait_time.out")
+        if os.path.exists(wait_time):
+            with open(wait_time, "r") as f:
+                self.result.log += "\ntotal wait time: {}s\n".format(
+                    f.read().strip())
+
         if is_error:
             self.result.log += self._capture_for_developers()
 
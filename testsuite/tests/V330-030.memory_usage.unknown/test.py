@@ -25,4 +25,8 @@ def run_test():
 
     #... with an 'unknown' size
     gps_assert(model.get_value(model.get_iter_first(), 3), "2.45 KB / unknown",
-               "The Memory Usage View is empty while it should not")
\ No newline at end of file
+               "The Memory Usage View is empty while it should not")
+
+    # The symbols are listed under their module
+    gps_assert("_ada_main_2" in str(dump_tree_model(model, 1)), True,
+               "The symbols of the modules are not displayed")
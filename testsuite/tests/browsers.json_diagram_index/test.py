@@ -0,0 +1,64 @@
+"""
+Benchmark loading a JSON diagram file with 10k subsystems, as generated
+for large Simulink models, and looking up diagrams and items in it.
+Lookups should only create the diagram that contains the item.
+"""
+
+import time
+from gs_utils.internal.utils import run_test_driver, gps_assert, record_time
+
+NB_SUBSYSTEMS = 10000
+
+
+def subsystem(idx):
+    return {"id": "sub%d" % idx,
+            "children": [],
+            "items": [{"id": "block%d" % idx,
+                       "vbox": [{"id": "label%d" % idx,
+                                 "text": "Subsystem %d" % idx}]}]}
+
+
+@run_test_driver
+def run():
+    data = {"diagrams": [{"id": "root",
+                          "children": [{"name": "Sub%d" % idx,
+                                        "diagram": "sub%d" % idx}
+                                       for idx in range(NB_SUBSYSTEMS)],
+                          "items": []}]}
+    data["diagrams"].extend(subsystem(idx)
+                            for idx in range(NB_SUBSYSTEMS // 2))
+    other = {"diagrams": [subsystem(idx) for idx in
+                          range(NB_SUBSYSTEMS // 2, NB_SUBSYSTEMS)]}
+
+    t = time.time()
+    diags = GPS.Browsers.Diagram.load_json_data(data)
+    diags.add_diagrams(GPS.Browsers.Diagram.load_json_data(other))
+
+    for idx in range(NB_SUBSYSTEMS):
+        gps_assert(diags.get_children("sub%d" % idx), [],
+                   "sub%d should be indexed" % idx)
+
+    last = NB_SUBSYSTEMS - 1
+    d, it = diags.get_diagram_for_item("label%d" % last)
+    elapsed = time.time() - t
+
+    gps_assert(d.id, "sub%d" % last, "wrong diagram for the item")
+    gps_assert(it.text, "Subsystem %d" % last, "wrong item")
+    gps_assert(diags.contains("sub%d" % last), True,
+               "added diagrams should be found")
+    gps_assert(diags.contains("unknown"), False,
+               "unknown diagrams should not be found")
+    gps_assert(diags.get_diagram_for_item("unknown"), None,
+               "unknown items should not be found")
+    gps_assert(diags.get("sub0").get_item("block1"), None,
+               "items should only be found in their diagram")
+
+    created = [x.id for x in diags.diagrams
+               if x._JSON_Diagram__json is None]
+    gps_assert(created, ["sub0", "sub%d" % last],
+               "only the requested diagrams should be created")
+
+    GPS.Logger("TESTSUITE").log(
+        "Loading and looking up {0} subsystems: {1:.3f}s".format(
+            NB_SUBSYSTEMS, elapsed))
+    record_time(elapsed)
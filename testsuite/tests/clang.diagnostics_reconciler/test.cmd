@@ -0,0 +1 @@
+$GPS -Pp --load=python:test.py --traceoff=GPS.LSP.CPP_SUPPORT
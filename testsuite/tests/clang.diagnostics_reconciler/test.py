@@ -0,0 +1,43 @@
+"""
+Check that reconciling the clang live diagnostics twice does not duplicate
+their messages, even when their text contains characters escaped in the
+markup, and that the messages removed by the user are created again.
+"""
+
+import GPS
+from clang_support import Diagnostics_Reconciler
+from gs_utils.internal.utils import run_test_driver, gps_assert, wait_idle
+
+
+@run_test_driver
+def run_test():
+    path = GPS.File("main.c").path
+    diagnostics = [
+        (path, 3, 3, 3, "cannot convert 'std::vector<int>' to 'int &'"),
+        (path, 1, 1, 2, "unused \"main\""),
+    ]
+
+    def count():
+        return len(
+            GPS.Message.list(category=Diagnostics_Reconciler.CATEGORY))
+
+    reconciler = Diagnostics_Reconciler()
+    reconciler.update(diagnostics)
+    yield wait_idle()
+    gps_assert(count(), 2, "Wrong number of messages after the first update")
+
+    reconciler.update(diagnostics)
+    yield wait_idle()
+    gps_assert(count(), 2, "The messages were duplicated")
+
+    reconciler.update(diagnostics[:1])
+    yield wait_idle()
+    gps_assert(count(), 1, "The obsolete message was not removed")
+
+    GPS.Locations.remove_category(Diagnostics_Reconciler.CATEGORY)
+    reconciler.update(diagnostics)
+    yield wait_idle()
+    gps_assert(count(), 2, "The messages removed by the user were lost")
+
+    reconciler.clear()
+    gps_assert(count(), 0, "The messages were not cleared")
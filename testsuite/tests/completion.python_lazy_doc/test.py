@@ -0,0 +1,36 @@
+"""
+Check that the python resolver computes the documentation of its
+proposals on demand, and that the proposals of a request stop when a
+newer request is made.
+"""
+
+import GPS
+import jedi_support
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_tasks, known_tasks)
+
+
+@run_test_driver
+def run_test():
+    buf = GPS.EditorBuffer.get(GPS.File("foo.py"))
+    yield wait_tasks(other_than=known_tasks)
+    loc = buf.at(2, 6)
+    resolver = jedi_support.PythonResolver()
+
+    resolver.get_completion_prefix(loc)
+    proposals = list(resolver.get_completions(loc))
+    path = [p for p in proposals if p.name == "path"]
+    gps_assert(len(path), 1, "os.path should be proposed")
+    gps_assert(callable(path[0].documentation), True,
+               "The documentation should not be computed yet")
+    gps_assert(path[0].get_data_as_list()[2], "",
+               "The documentation should be retrieved on demand")
+    gps_assert(path[0].get_documentation() != "", True,
+               "The documentation should be computed on demand")
+
+    stale = resolver.get_completions(loc)
+    fresh = list(resolver.get_completions(loc))
+    gps_assert(len(fresh), len(proposals),
+               "The same request should give the same proposals")
+    gps_assert(list(stale), [],
+               "A stale request should not return proposals")
@@ -0,0 +1,8 @@
+with B;
+
+package body A is
+   procedure Run is
+   begin
+      B.Run;
+   end Run;
+end A;
@@ -0,0 +1,3 @@
+package body B is
+   procedure Run is null;
+end B;
@@ -0,0 +1,8 @@
+with A;
+with C;
+
+procedure Main is
+begin
+   A.Run;
+   C.Run;
+end Main;
@@ -0,0 +1 @@
+$GPS -Ptest --load=python:test.py --traceoff=GPS.LSP.ADA_SUPPORT
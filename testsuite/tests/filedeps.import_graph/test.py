@@ -0,0 +1,140 @@
+"""
+Check the import graph of a compiled project: imports, reverse
+dependencies, and which files are queried again when the cross-reference
+information is updated. Then check the algorithms on a synthetic graph:
+shortest paths, bounded paths and cycles, which Ada units cannot have.
+"""
+
+import GPS
+import import_graph
+import os
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_tasks, recompute_xref)
+
+EDGES = {
+    "main": ["a", "c"],
+    "a": ["d"],
+    "d": ["b"],
+    "c": ["b"],
+    "b": ["e"],
+    "e": ["f"],
+    "f": ["e"],
+}
+
+
+def f(name):
+    return GPS.File(name + ".c")
+
+
+class Synthetic_Graph(import_graph.Import_Graph):
+
+    def __init__(self):
+        super(Synthetic_Graph, self).__init__(include_implicit=True)
+        self.queries = 0
+
+    def imports(self, file):
+        result = self._imports.get(file)
+        if result is None:
+            self.queries += 1
+            name = file.base_name()[:-2]
+            result = self._imports[file] = [
+                f(n) for n in EDGES.get(name, [])]
+        return result
+
+    def build(self):
+        for name in EDGES:
+            self.imports(f(name))
+        self._complete = True
+
+
+def names(path):
+    return [p.base_name()[:-2] for p in path]
+
+
+def check_project():
+    g = import_graph.get_graph(include_implicit=False)
+
+    def ada(name):
+        return GPS.File(name)
+
+    def imports(name):
+        return sorted(p.base_name() for p in g.imports(ada(name)))
+
+    def stale():
+        return sorted(p.base_name() for p in g.stale_files())
+
+    # Nothing is known before the project is compiled
+    gps_assert(imports("main.adb"), [], "No import before compilation")
+    gps_assert(imports("b.ads"), [], "No import before compilation")
+    gps_assert(imports("b.adb"), ["b.ads"], "A body imports its spec")
+    gps_assert(stale(), ["b.adb", "b.ads", "main.adb"],
+               "The files without imports should be stale")
+
+    GPS.execute_action("Build All")
+    yield wait_tasks()
+    recompute_xref()
+    yield wait_tasks()
+
+    gps_assert(stale(), [], "The stale files should have been forgotten")
+    gps_assert(imports("main.adb"), ["a.ads", "c.ads"],
+               "Wrong imports of main.adb")
+    gps_assert(imports("a.adb"), ["a.ads", "b.ads"],
+               "Wrong imports of a.adb")
+    gps_assert(imports("c.ads"), ["b.ads"], "Wrong imports of c.ads")
+    gps_assert(imports("b.ads"), [], "b.ads is a leaf")
+    gps_assert(sorted(p.base_name() for p in g.importers(ada("b.ads"))),
+               ["a.adb", "b.adb", "c.ads"], "Wrong importers of b.ads")
+    gps_assert([p.base_name()
+                for p in g.shortest_path(ada("main.adb"), ada("b.ads"))],
+               ["main.adb", "c.ads", "b.ads"], "Wrong shortest path")
+
+    # A leaf is not queried again on the next updates
+    gps_assert(stale(), [], "A leaf should not be stale")
+    GPS.Hook("xref_updated").run()
+    gps_assert(ada("b.ads") in g._imports, True,
+               "A leaf should not be forgotten")
+
+    # A modified file is
+    stamp = os.path.getmtime(ada("c.ads").path)
+    os.utime(ada("c.ads").path, (stamp + 10, stamp + 10))
+    gps_assert(stale(), ["c.ads"], "A modified file should be stale")
+    GPS.Hook("xref_updated").run()
+    gps_assert(ada("c.ads") in g._imports, False,
+               "A modified file should be forgotten")
+    gps_assert(imports("c.ads"), ["b.ads"], "Wrong imports of c.ads")
+    gps_assert(stale(), [], "c.ads should have been queried again")
+
+
+@run_test_driver
+def run_test():
+    yield check_project()
+
+    g = Synthetic_Graph()
+
+    gps_assert(names(g.shortest_path(f("main"), f("b"))),
+               ["main", "c", "b"], "Wrong shortest path")
+    gps_assert(g.shortest_path(f("b"), f("main")), None,
+               "There should be no path")
+    gps_assert(names(g.shortest_path(f("main"), f("f"))),
+               ["main", "c", "b", "e", "f"], "Wrong longer path")
+    queries = g.queries
+    g.shortest_path(f("main"), f("f"))
+    gps_assert(g.queries, queries,
+               "Imports should only be queried once per file")
+
+    gps_assert(sorted(names(p) for p in g.all_paths(f("main"), f("b"), 3)),
+               [["main", "a", "d", "b"], ["main", "c", "b"]],
+               "Wrong paths up to length 3")
+    gps_assert([names(p) for p in g.all_paths(f("main"), f("b"), 2)],
+               [["main", "c", "b"]], "Wrong paths up to length 2")
+
+    gps_assert(sorted(names(g.importers(f("b")))), ["c", "d"],
+               "Wrong importers")
+
+    cycles = [sorted(names(c))
+              for c in g.strongly_connected_components() if len(c) > 1]
+    gps_assert(cycles, [["e", "f"]], "Wrong cycles")
+
+    g.invalidate([f("c")])
+    gps_assert(sorted(names(g.importers(f("b")))), ["c", "d"],
+               "Wrong importers after invalidation")
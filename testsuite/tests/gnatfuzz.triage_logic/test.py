@@ -0,0 +1,191 @@
+"""
+Test the triage logic of the GNATfuzz view, which does not need a fuzzing
+session: the parsing of the harness output, the crash signatures, the
+triage cache and the crash files watcher. Also check that the output of a
+harness that failed is not cached.
+"""
+
+import collections
+import json
+import os
+import time
+import workflows
+import gnatfuzz_view
+from gnatfuzz_view import (
+    extract_output, stack_signature, FuzzCrash, TriageCache, CrashWatcher,
+    GNATfuzzView, OUTPUT_START, OUTPUT_END)
+from gs_utils.internal.utils import run_test_driver, gps_assert
+
+EXCEPTION = {
+    "Testcase_Exception": {
+        "Exception_Name": "CONSTRAINT_ERROR",
+        "Exception_Message": "a.adb:3 overflow check failed",
+        "Exception_Information":
+            "Load address: 0x%x\n"
+            "Call stack traceback locations:\n"
+            "0x%x 0x%x\n"},
+    "Decoded_In_Parameters": [
+        {"Parameter_Name": "X", "Parameter_Type": "Integer",
+         "Parameter_Value": " 2147483647 "}],
+    "Decoded_Function_Return": {
+        "Function_Return_Type": "Integer",
+        "Function_Return_Value": "0"},
+}
+
+
+def exception_json(load):
+    """The harness output for EXCEPTION, loaded at the given address"""
+    result = json.loads(json.dumps(EXCEPTION))
+    exc = result["Testcase_Exception"]
+    exc["Exception_Information"] %= (load, load + 0x10, load + 0x20)
+    return json.dumps(result)
+
+
+def touch(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_extract_output():
+    output = "\n".join([
+        "garbage", OUTPUT_START, "{\"a\":", "1}", OUTPUT_END,
+        OUTPUT_START, "{\"b\":", "2}", OUTPUT_END, "more garbage"])
+    gps_assert(extract_output(output), "{\"b\":2}",
+               "The last section should be extracted, without line breaks")
+    gps_assert(extract_output("the harness did not start"), "",
+               "No section in the output")
+    gps_assert(extract_output(OUTPUT_START + "\n{}\n"), "{}",
+               "An unterminated section goes up to the end")
+
+
+def test_signatures():
+    first = FuzzCrash("crashes/id:000")
+    first.decode(exception_json(0x400000))
+    gps_assert(first.message,
+               "CONSTRAINT_ERROR : a.adb:3 overflow check failed",
+               "Wrong exception message")
+    gps_assert(first.params,
+               [("X : in Integer :=", "2147483647"),
+                ("function return value : Integer :=", "0")],
+               "Wrong parameters")
+    gps_assert(first.signature[2], (0x10, 0x20),
+               "The stack should be relative to the load address")
+
+    # The same crash, with the executable loaded at another address
+    second = FuzzCrash("crashes/id:001")
+    second.decode(exception_json(0x7f0000))
+    gps_assert(second.signature, first.signature,
+               "The signature should not depend on the load address")
+
+    gps_assert(stack_signature("no traceback"), (), "Empty signature")
+
+    failed = FuzzCrash("crashes/id:002")
+    failed.decode("")
+    gps_assert(failed.message.startswith("could not decode"), True,
+               "An empty output cannot be decoded")
+    gps_assert(failed.signature, None, "No signature without output")
+
+
+def test_triage_cache():
+    executable = os.path.abspath("harness")
+    crash = os.path.abspath("crash_file")
+    touch(executable, "1")
+    touch(crash, "input")
+
+    cache = TriageCache(os.path.abspath("triage.json"))
+    key = cache.key(crash, executable)
+    gps_assert(cache.get(key), None, "The cache should be empty")
+    cache.set(key, "{}")
+    cache.save()
+
+    gps_assert(TriageCache(os.path.abspath("triage.json")).get(key), "{}",
+               "The cache was not saved")
+
+    os.utime(executable, (1000000, 1000000))
+    gps_assert(cache.key(crash, executable) != key, True,
+               "A new executable should change the key")
+    gps_assert(cache.key("no such file", executable), None,
+               "No key for a missing crash file")
+
+
+def test_crash_watcher():
+    output = os.path.abspath("fuzzer_output")
+    crashes = os.path.join(output, "gnatfuzz_1", "crashes")
+    touch(os.path.join(crashes, "id:000"), "a")
+    touch(os.path.join(crashes, "README.txt"), "")
+
+    watcher = CrashWatcher(output)
+    gps_assert(watcher.new_files(), [os.path.join(crashes, "id:000")],
+               "The crash file was not found")
+    gps_assert(watcher.new_files(), [], "The crash file was found twice")
+
+    touch(os.path.join(crashes, "id:001"), "b")
+    touch(os.path.join(output, "gnatfuzz_2", "hangs", "id:000"), "c")
+    gps_assert(watcher.new_files(),
+               [os.path.join(crashes, "id:001"),
+                os.path.join(output, "gnatfuzz_2", "hangs", "id:000")],
+               "The new files were not found")
+
+    # Once the directories are old enough, they are only listed again when
+    # their timestamp changes
+    old = time.time() - 10
+    for d in (output, crashes, os.path.join(output, "gnatfuzz_2", "hangs")):
+        os.utime(d, (old, old))
+    watcher.new_files()
+    touch(os.path.join(crashes, "id:002"), "d")
+    os.utime(crashes, (old, old))
+    gps_assert(watcher.new_files(), [],
+               "Unchanged directories should not be listed")
+    os.utime(crashes, None)
+    gps_assert(watcher.new_files(), [os.path.join(crashes, "id:002")],
+               "The modified directory was not listed")
+
+
+class Fake_View(object):
+    """The state of GNATfuzzView used by process_crashes"""
+
+    def __init__(self, candidates):
+        self.generation = 0
+        self.project_dir = os.path.abspath(".")
+        self.candidate_crash_files = collections.deque(candidates)
+        self.crashes = {}
+        self.triage_running = True
+
+    def add_crash(self, candidate, json_str):
+        self.crashes[candidate] = json_str
+
+
+@run_test_driver
+def run_test():
+    test_extract_output()
+    test_signatures()
+    test_triage_cache()
+    test_crash_watcher()
+
+    # A harness that only produces an output for some crash files
+    harness = os.path.abspath("fake_harness")
+    touch(harness,
+          "#!/bin/sh\n"
+          "grep -q good \"$1\" || exit 1\n"
+          "printf '%%s\\n' '%s' '%s' '%s'\n"
+          % (OUTPUT_START, exception_json(0), OUTPUT_END))
+    os.chmod(harness, 0o755)
+    good = os.path.abspath("crashes/id:good")
+    bad = os.path.abspath("crashes/id:bad")
+    touch(good, "good")
+    touch(bad, "bad")
+
+    coverage_executable = gnatfuzz_view.coverage_executable
+    gnatfuzz_view.coverage_executable = lambda: harness
+    try:
+        view = Fake_View([good, bad])
+        yield workflows.driver(GNATfuzzView.process_crashes(view, None))
+    finally:
+        gnatfuzz_view.coverage_executable = coverage_executable
+
+    gps_assert(sorted(view.crashes), sorted([good, bad]),
+               "Both crashes should be reported")
+    with open("gnatfuzz_triage_cache.json") as f:
+        gps_assert(list(json.load(f).values()), [exception_json(0)],
+                   "Only the output that could be decoded should be cached")
@@ -0,0 +1,88 @@
+"""
+Benchmark the saving of 50 GNATprove runs of a synthetic proof tree, in
+which each run only modifies a few files: the files are only stored once,
+and restoring a run gives back its files.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+import GPS
+import gnatprove_runs
+from gs_utils.internal.utils import run_test_driver, gps_assert, record_time
+
+NB_RUNS = 50
+NB_KEPT = 10
+NB_FILES = 200
+NB_MODIFIED = 5
+FILE_SIZE = 20000
+
+
+def write(path, seed):
+    with open(path, "w") as f:
+        f.write(("%s\n" % seed) * (FILE_SIZE // (len(str(seed)) + 1)))
+
+
+def snapshot(directory):
+    result = {}
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), "rb") as f:
+            result[name] = hashlib.sha256(f.read()).hexdigest()
+    return result
+
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(d, f))
+               for d, _, files in os.walk(directory) for f in files)
+
+
+@run_test_driver
+def run_test():
+    artifacts = GPS.Project.root().artifacts_dir()
+    tree = os.path.join(artifacts, "gnatprove")
+    os.makedirs(tree, exist_ok=True)
+    for idx in range(NB_FILES):
+        write(os.path.join(tree, "unit_%d.spark" % idx), idx)
+
+    GPS.Preference(gnatprove_runs.NB_MAX_PREF).set(NB_KEPT)
+    manager = gnatprove_runs.run_manager
+    manager.reload_from_disk()
+
+    snapshots = {}
+    elapsed = 0.0
+    for run in range(NB_RUNS):
+        for idx in range(NB_MODIFIED):
+            unit = (run * NB_MODIFIED + idx) % NB_FILES
+            write(os.path.join(tree, "unit_%d.spark" % unit),
+                  "run %d unit %d" % (run, unit))
+
+        start = time.time()
+        manager.add_run("run %d" % run, "GNATprove_Parser", [tree], "")
+        elapsed += time.time() - start
+        snapshots[max(manager.runs)] = snapshot(tree)
+
+    usage = disk_usage(os.path.join(artifacts, "saved_runs"))
+    tree_size = disk_usage(tree)
+    GPS.Logger("TESTSUITE").log(
+        "{0} runs saved in {1:.1f}ms each, {2:.1f}MB for {3} runs kept"
+        " instead of {4:.1f}MB".format(
+            NB_RUNS, elapsed * 1000 / NB_RUNS, usage / 1e6, NB_KEPT,
+            NB_KEPT * tree_size / 1e6))
+    record_time(elapsed)
+
+    gps_assert(len(manager.runs), NB_KEPT, "Wrong number of runs kept")
+    gps_assert(usage < 2 * tree_size, True, "Files are not deduplicated")
+
+    # The log gives back the same runs
+    runs = sorted(manager.runs)
+    manager.reload_from_disk()
+    gps_assert(sorted(manager.runs), runs, "Wrong runs after reload")
+
+    # Restore the oldest run kept
+    manager.materialize(runs[0])
+    gps_assert(snapshot(tree), snapshots[runs[0]], "Wrong restored files")
+
+    shutil.rmtree(os.path.join(artifacts, "saved_runs"))
+    shutil.rmtree(tree)
+    os.remove(os.path.join(artifacts, "runs.log"))
@@ -0,0 +1,53 @@
+"""
+Check that after an edit, the highlighting engine only lexes the lines up
+to where the highlighter stacks converge with the ones computed before,
+and lexes the rest of the buffer when they never converge.
+"""
+
+import GPS
+from pygps import get_gtk_buffer
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_idle, wait_until_true)
+
+NB_FUNCTIONS = 2000
+FUNCTION_LINES = 4
+
+
+def generate(name):
+    with open(name, "w") as f:
+        for idx in range(NB_FUNCTIONS):
+            f.write("def function_%d(a):\n"
+                    "    \"\"\"Documentation\"\"\"\n"
+                    "    return a + %d\n"
+                    "\n" % (idx, idx))
+
+
+@run_test_driver
+def run_test():
+    generate("big.py")
+    buf = GPS.EditorBuffer.get(GPS.File("big.py"))
+    gtk_ed = get_gtk_buffer(buf)
+    yield wait_until_true(lambda: gtk_ed.idle_highlight_id is None)
+    yield wait_idle()
+
+    # The 'return' line of a function in the middle of the buffer
+    line = FUNCTION_LINES * NB_FUNCTIONS // 2 + 3
+
+    buf.insert(buf.at(line, 16), "1")
+    gps_assert(gtk_ed.nb_lexed_lines <= 2, True,
+               "Too many lines lexed after a one character edit: %d"
+               % gtk_ed.nb_lexed_lines)
+
+    buf.insert(buf.at(line + 1, 1), 's = """a\nb\nc"""\n')
+    gps_assert(gtk_ed.nb_lexed_lines <= 5, True,
+               "Too many lines lexed after a closed string: %d"
+               % gtk_ed.nb_lexed_lines)
+
+    # An unclosed string changes the highlighting up to the end of the
+    # buffer
+    remaining = buf.lines_count() - line
+    buf.insert(buf.at(line, 1), '"""')
+    gps_assert(gtk_ed.nb_lexed_lines >= remaining, True,
+               "The lines after an unclosed string were not lexed: %d"
+               % gtk_ed.nb_lexed_lines)
+    buf.close(force=True)
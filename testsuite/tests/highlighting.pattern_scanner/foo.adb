@@ -0,0 +1,5 @@
+procedure Foo is
+   Bar : Integer := 1;
+begin
+   Bar := Bar + Bar;
+end Foo;
@@ -0,0 +1,72 @@
+"""
+Benchmark the Pattern_Scanner shared by Regexp_Highlighter and
+Text_Highlighter, against searching the editor with each highlighter.
+Both should highlight the same locations.
+"""
+
+import time
+from gs_utils.internal.utils import run_test_driver, gps_assert, record_time
+from gs_utils.highlighter import Regexp_Highlighter, Text_Highlighter, \
+    OverlayStyle, pattern_scanner
+from workflows.promises import wait_idle
+
+NB_COPIES = 2000
+
+
+def overlays_at(buf, line, column):
+    return sorted(o.name() for o in buf.at(line, column).get_overlays()
+                  if o.name() in ("Todo_Style", "Bar_Style"))
+
+
+@run_test_driver
+def run():
+    buf = GPS.EditorBuffer.get(GPS.File("foo.adb"))
+    buf.insert(buf.at(2, 1),
+               "   --  TODO: increment Bar\n   Bar := Bar + 1;\n"
+               * NB_COPIES)
+
+    todo = Regexp_Highlighter(
+        regexp="TODO.*",
+        style=OverlayStyle(name="Todo_Style", background="#FF7979"))
+    bar = Text_Highlighter(
+        text="Bar", whole_word=True,
+        style=OverlayStyle(name="Bar_Style", background="#79FF79"))
+    yield wait_idle()
+
+    last = 2 * NB_COPIES
+    gps_assert(overlays_at(buf, last, 25), ["Bar_Style", "Todo_Style"],
+               "Both highlighters should apply in the TODO comment")
+    gps_assert(overlays_at(buf, last + 1, 11), ["Bar_Style"],
+               "Bar should be highlighted after the comment")
+
+    start = buf.beginning_of_buffer()
+    end = buf.end_of_buffer()
+
+    t = time.time()
+    for h in (todo, bar):
+        h.style.remove(buf)
+        h.process(start, end)
+    search_time = time.time() - t
+
+    gps_assert(overlays_at(buf, last, 25), ["Bar_Style", "Todo_Style"],
+               "Searching the editor should give the same result")
+
+    t = time.time()
+    for h in (todo, bar):
+        h.style.remove(buf)
+    pattern_scanner().process(start, end)
+    scanner_time = time.time() - t
+
+    gps_assert(overlays_at(buf, last, 25), ["Bar_Style", "Todo_Style"],
+               "The scanner should highlight the whole range")
+
+    GPS.Logger("TESTSUITE").log(
+        "Highlighting {0} lines: {1:.3f}s searching the editor, "
+        "{2:.3f}s with the pattern scanner".format(
+            buf.lines_count(), search_time, scanner_time))
+    record_time(scanner_time)
+
+    todo.stop()
+    bar.stop()
+    gps_assert(overlays_at(buf, last, 25), [],
+               "Stopping the highlighters should remove the overlays")
@@ -0,0 +1,74 @@
+"""
+Compare the runs of lines stored by HighlighterStacks with a plain list of
+stacks, on random sequences of set/get/insert_newlines/delete_lines.
+"""
+
+import random
+from highlighter.engine import HighlighterStacks
+from gs_utils.internal.utils import run_test_driver, gps_assert
+
+NB_SEQUENCES = 200
+NB_OPERATIONS = 200
+STACKS = [(), ("a", ), ("b", ), ("a", "b")]
+
+
+def check_sequence(rand):
+    """
+    Apply random operations to both stores, and return a description of the
+    first difference, or None.
+    """
+    stacks = HighlighterStacks()
+    expected = [()]
+
+    for step in range(NB_OPERATIONS):
+        op = rand.random()
+        if op < 0.4:
+            index = rand.randint(0, len(expected))
+            stack = rand.choice(STACKS)
+            same = stacks.set(index, list(stack))
+            if index == len(expected):
+                expected.append(stack)
+                expected_same = False
+            else:
+                expected_same = expected[index] == stack
+                expected[index] = stack
+            if same != expected_same:
+                return "set(%d) returned %s" % (index, same)
+
+        elif op < 0.6:
+            nb_lines = rand.randint(0, 5)
+            after = rand.randint(0, len(expected) + 2)
+            stacks.insert_newlines(nb_lines, after)
+            if after + 1 < len(expected):
+                expected[after + 1:after + 1] = [()] * nb_lines
+
+        elif op < 0.8:
+            nb_lines = rand.randint(0, 5)
+            at = rand.randint(0, len(expected))
+            stacks.delete_lines(nb_lines, at)
+            if at + 1 < len(expected):
+                del expected[at + 1:at + 1 + nb_lines]
+
+        else:
+            index = rand.randint(0, len(expected) + 1)
+            stack = stacks.get(index)
+            if stack != (expected[index] if index < len(expected) else None):
+                return "get(%d) returned %s" % (index, stack)
+
+        if len(stacks) != len(expected):
+            return "wrong length after %d operations" % (step + 1, )
+
+    lines = [stack for stack, length in stacks.runs()
+             for _ in range(length)]
+    if lines != expected:
+        return "wrong runs"
+    return None
+
+
+@run_test_driver
+def run_test():
+    rand = random.Random(1)
+    for seq in range(NB_SEQUENCES):
+        gps_assert(check_sequence(rand), None,
+                   "HighlighterStacks differs from a list in sequence %d"
+                   % seq)
@@ -0,0 +1,55 @@
+"""
+Check that hook callbacks are instrumented when hook_stats is enabled, and
+that a callback exceeding the latency budget gets demoted to run from a
+timeout, only once for a burst of calls.
+"""
+
+import time
+import GPS
+import hook_stats
+from gs_utils import hook
+from gs_utils.internal.utils import run_test_driver, gps_assert
+from workflows.promises import timeout
+
+hook_stats.enabled = True
+calls = []
+
+
+@hook("buffer_edited")
+def slow_on_edit(file):
+    calls.append(file.base_name())
+    time.sleep(0.01)
+
+
+@run_test_driver
+def run_test():
+    label = hook_stats.callback_label(slow_on_edit)
+    foo = GPS.File("foo.adb")
+    hook_stats.set_latency_budget(5)
+
+    for _ in range(hook_stats.DEMOTE_AFTER):
+        GPS.Hook("buffer_edited").run(foo)
+
+    stats = [s for s in hook_stats.get_stats() if s.label == label]
+    gps_assert(len(stats), 1, "The callback should be instrumented")
+    s = stats[0]
+    gps_assert(s.hook, "buffer_edited", "Wrong hook recorded")
+    gps_assert(s.calls, hook_stats.DEMOTE_AFTER, "Wrong number of calls")
+    gps_assert(s.max >= 0.01, True, "Wrong maximum latency")
+    gps_assert(s.demoted, True,
+               "The callback should be demoted after exceeding the budget")
+
+    del calls[:]
+    for _ in range(10):
+        GPS.Hook("buffer_edited").run(foo)
+    gps_assert(calls, [], "A demoted callback should not run immediately")
+
+    yield timeout(hook_stats.DEMOTED_DELAY_MS * 3)
+    gps_assert(calls, ["foo.adb"],
+               "A demoted callback should run once for a burst of calls")
+
+    hook_stats.set_latency_budget(None)
+    hook_stats.demote("buffer_edited", label, False)
+    GPS.Hook("buffer_edited").run(foo)
+    gps_assert(calls, ["foo.adb", "foo.adb"],
+               "A restored callback should run immediately")
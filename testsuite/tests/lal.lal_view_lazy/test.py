@@ -0,0 +1,68 @@
+"""
+Check that the Libadalang view only creates the rows on the path to the
+cursor in compact mode, and that it creates rows lazily in full mode.
+"""
+
+import GPS
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_tasks, wait_idle, known_tasks,
+    get_widget_by_name)
+
+NB_BLOCKS = 100
+NB_STATEMENTS = 20
+LINE = 1160
+COLUMN = 7
+
+
+def generate(name):
+    with open(name, "w") as f:
+        f.write("procedure Foo is\nbegin\n")
+        for _ in range(NB_BLOCKS):
+            f.write("   declare\n   begin\n")
+            f.write("      null;\n" * NB_STATEMENTS)
+            f.write("   end;\n")
+        f.write("end Foo;\n")
+
+
+def rows(model, parent=None):
+    """Return the labels and lines of all the rows below parent, except
+       the placeholders of rows not expanded yet.
+    """
+    result = []
+    it = model.iter_children(parent)
+    while it is not None:
+        if model[it][0]:
+            result.append((model[it][0], model[it][2]))
+        result.extend(rows(model, it))
+        it = model.iter_next(it)
+    return result
+
+
+@run_test_driver
+def run_test():
+    generate("foo.adb")
+    GPS.Project.recompute()
+    GPS.execute_action("open Libadalang")
+
+    buf = GPS.EditorBuffer.get(GPS.File("foo.adb"))
+    yield wait_tasks(other_than=known_tasks)
+    buf.current_view().goto(buf.at(LINE, COLUMN))
+    yield wait_idle()
+
+    model = get_widget_by_name("lal_view tree").get_model()
+    compact = rows(model)
+    gps_assert(compact[-1], ("<b>NullStmt</b> null;", LINE),
+               "The deepest row should be the statement at the cursor")
+    gps_assert(len(compact) < 15, True,
+               "Only the path to the cursor should be shown: %s" % compact)
+
+    get_widget_by_name("lal_view full toggle").clicked()
+    yield wait_idle()
+
+    model = get_widget_by_name("lal_view tree").get_model()
+    full = rows(model)
+    gps_assert(("<b>NullStmt</b> null;", LINE) in full, True,
+               "The path to the cursor should be expanded")
+    gps_assert(len(full) < 300, True,
+               "Only the expanded rows should be created, got %d"
+               % len(full))
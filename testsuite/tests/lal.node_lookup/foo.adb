@@ -0,0 +1,13 @@
+procedure Foo is
+   X : Integer := 1;
+
+   procedure Bar (Y : Integer) is
+   begin
+      X := X + Y + Y;
+   end Bar;
+
+   function Baz return Integer is (X * 2);
+begin
+   Bar (Baz);
+   Bar (X);
+end Foo;
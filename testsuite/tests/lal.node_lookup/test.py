@@ -0,0 +1,59 @@
+"""
+Check that the indexed node lookups of lal_utils return the same nodes as
+a full traversal of the tree, and that the index follows buffer edits.
+"""
+
+import GPS
+import libadalang as lal
+import lal_utils
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_tasks, wait_idle, known_tasks)
+
+
+def find(buf, line, column, kind_name):
+    unit = buf.get_analysis_unit()
+    return unit.root.find(lambda x: x.sloc_range.start.line == line and
+                          x.sloc_range.start.column == column and
+                          x.kind_name == kind_name)
+
+
+@run_test_driver
+def run_test():
+    f = GPS.File("foo.adb")
+    buf = GPS.EditorBuffer.get(f)
+    yield wait_tasks(other_than=known_tasks)
+
+    queries = [(1, 1, "SubpBody"),
+               (2, 4, "ObjectDecl"),
+               (4, 4, "SubpBody"),
+               (6, 7, "AssignStmt"),
+               (6, 12, "BinOp"),
+               (9, 4, "ExprFunction"),
+               (11, 4, "CallStmt"),
+               (11, 4, "Identifier"),
+               (12, 9, "Identifier"),
+               (12, 9, "CallStmt"),
+               (3, 1, "ObjectDecl")]
+    expected = [find(buf, *q) for q in queries]
+    gps_assert(lal_utils.nodes(f, queries), expected,
+               "Batch lookup differs from a full traversal")
+    for q, e in zip(queries, expected):
+        gps_assert(lal_utils.node(f, *q), e, "Wrong node for %s" % (q, ))
+
+    # Nested nodes of the same kind start at the same location: the
+    # outermost one is returned
+    gps_assert(lal_utils.node(f, 6, 12, "BinOp").text, "X + Y + Y",
+               "Wrong nested node")
+
+    gps_assert(lal_utils.declaration(f, 4, 4, lal.SubpBody).kind_name,
+               "SubpBody", "Wrong declaration")
+    gps_assert(lal_utils.declaration(f, 4, 4, lal.ObjectDecl), None,
+               "No object is declared there")
+
+    # Insert a line: declarations move down
+    buf.insert(buf.at(2, 1), "   Z : Integer := 2;\n")
+    yield wait_idle()
+    gps_assert(lal_utils.declaration(f, 5, 4, lal.SubpBody).kind_name,
+               "SubpBody", "The index was not updated after an edit")
+    gps_assert(lal_utils.declaration(f, 4, 4, lal.SubpBody), None,
+               "The index still has the old location")
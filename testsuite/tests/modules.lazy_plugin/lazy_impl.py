@@ -0,0 +1,17 @@
+"""
+A plugin loaded on demand by the modules.lazy_plugin test.
+"""
+
+from modules import Module
+
+calls = []
+
+
+class Lazy_Module(Module):
+
+    def setup(self):
+        calls.append("setup")
+
+
+def run():
+    calls.append("run")
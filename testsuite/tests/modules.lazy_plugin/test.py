@@ -0,0 +1,33 @@
+"""
+Check that a plugin declared with make_lazy_interactive is only imported
+when its action is executed, and that its modules are set up before the
+action runs.
+"""
+
+import os
+import sys
+import GPS
+from gs_utils import make_lazy_interactive
+from gs_utils.internal.utils import run_test_driver, gps_assert
+
+sys.path.insert(0, os.getcwd())
+make_lazy_interactive(
+    "lazy_impl", "run", name="lazy plugin action",
+    description="An action from a lazily loaded plugin")
+
+
+@run_test_driver
+def run_test():
+    gps_assert("lazy_impl" in sys.modules, False,
+               "The plugin should not be imported at startup")
+
+    GPS.execute_action("lazy plugin action")
+    lazy_impl = sys.modules.get("lazy_impl")
+    gps_assert(lazy_impl is not None, True,
+               "The plugin should be imported by its action")
+    gps_assert(lazy_impl.calls, ["setup", "run"],
+               "The plugin should be set up before the action runs")
+
+    GPS.execute_action("lazy plugin action")
+    gps_assert(lazy_impl.calls, ["setup", "run", "run"],
+               "The plugin should only be set up once")
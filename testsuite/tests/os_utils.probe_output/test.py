@@ -0,0 +1,66 @@
+"""
+Check that the outputs of the tool probes are cached until the executable
+changes, and that they are refreshed in the background when a callback is
+given.
+"""
+
+import os
+import os_utils
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_until_true)
+
+TOOL = os.path.abspath("probe_tool")
+RUNS = os.path.abspath("runs.txt")
+
+
+def write_tool(version, mtime):
+    """Create the tool, which prints `version` and records each run"""
+    with open(TOOL, "w") as f:
+        f.write("#!/bin/sh\necho run >> %s\necho %s\n" % (RUNS, version))
+    os.chmod(TOOL, 0o755)
+    os.utime(TOOL, (mtime, mtime))
+
+
+def runs():
+    if not os.path.exists(RUNS):
+        return 0
+    with open(RUNS) as f:
+        return len(f.readlines())
+
+
+@run_test_driver
+def run_test():
+    cmd = [TOOL, "--version"]
+
+    write_tool("v1", 1000000)
+    gps_assert(os_utils.probe_output(cmd).strip(), "v1", "Wrong output")
+    gps_assert(runs(), 1, "The tool should have run once")
+
+    gps_assert(os_utils.probe_output(cmd).strip(), "v1",
+               "Wrong cached output")
+    gps_assert(runs(), 1, "The output should have been cached")
+
+    # A new executable (mtime and size) invalidates the cache
+    write_tool("v2", 2000000)
+    gps_assert(os_utils.probe_output(cmd).strip(), "v2",
+               "The cache was not invalidated by a new executable")
+    gps_assert(runs(), 2, "The tool should have run again")
+
+    # Same size, but a different mtime
+    write_tool("v3", 3000000)
+    gps_assert(os_utils.probe_output(cmd).strip(), "v3",
+               "The cache was not invalidated by a new mtime")
+    gps_assert(runs(), 3, "The tool should have run again")
+
+    # With on_update, the previous output is returned and the tool runs in
+    # the background
+    updates = []
+    write_tool("version 4", 4000000)
+    gps_assert(os_utils.probe_output(cmd, on_update=updates.append).strip(),
+               "v3", "The previous output should be returned immediately")
+    yield wait_until_true(lambda: len(updates) > 0)
+    gps_assert([u.strip() for u in updates], ["version 4"],
+               "on_update was not called with the new output")
+    gps_assert(os_utils.probe_output(cmd).strip(), "version 4",
+               "The refreshed output was not cached")
+    gps_assert(runs(), 4, "The tool should have run once in the background")
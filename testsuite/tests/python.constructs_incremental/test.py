@@ -0,0 +1,81 @@
+"""
+Benchmark the computation of python constructs while typing in a 20k lines
+file: parsing only the modified top-level statements should give the same
+constructs as parsing the whole file, much faster.
+"""
+
+import time
+import GPS
+from python_support import Constructs_Parser
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_idle, record_time)
+
+NB_FUNCTIONS = 2000
+NB_KEYS = 20
+
+
+class Constructs_List(object):
+    def __init__(self):
+        self.constructs = []
+
+    def add_construct(self, *args):
+        self.constructs.append(args)
+
+
+def generate(name):
+    with open(name, "w") as f:
+        for idx in range(NB_FUNCTIONS):
+            f.write("@decorator\n"
+                    "def function_%d(a, b):\n"
+                    "    for x in a:\n"
+                    "        if x:\n"
+                    "            b += x\n"
+                    "    return b\n"
+                    "\n"
+                    "\n"
+                    "\n" % idx)
+
+
+def compute(parser, text, incremental):
+    """As PythonLanguage.parse_constructs"""
+    clist = Constructs_List()
+    try:
+        parser.parse(text, incremental)
+    except SyntaxError:
+        # Typing goes through invalid states
+        return []
+    parser.add_constructs(clist)
+    return clist.constructs
+
+
+@run_test_driver
+def run_test():
+    generate("big.py")
+    buf = GPS.EditorBuffer.get(GPS.File("big.py"))
+    yield wait_idle()
+
+    incremental = Constructs_Parser()
+    full = Constructs_Parser()
+    compute(incremental, buf.get_chars(), True)
+
+    times = {True: 0.0, False: 0.0}
+    # At the end of 'b += x' in the middle of the file
+    loc = buf.at(NB_FUNCTIONS * 9 // 2 + 5, 19)
+    for ch in " + 1" * (NB_KEYS // 4):
+        buf.insert(loc, ch)
+        loc = loc.forward_char(1)
+        text = buf.get_chars()
+        results = {}
+        for parser, mode in ((incremental, True), (full, False)):
+            start = time.time()
+            results[mode] = compute(parser, text, mode)
+            times[mode] += time.time() - start
+        gps_assert(results[True], results[False],
+                   "Incremental and full parsing differ")
+
+    gps_assert(len(results[True]), NB_FUNCTIONS * 3, "Wrong constructs")
+    GPS.Logger("TESTSUITE").log(
+        "outline refresh: {0:.1f}ms before, {1:.1f}ms after".format(
+            times[False] * 1000 / NB_KEYS, times[True] * 1000 / NB_KEYS))
+    record_time(times[True])
+    buf.close(force=True)
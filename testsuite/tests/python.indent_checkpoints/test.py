@@ -0,0 +1,67 @@
+"""
+Benchmark the python auto indentation in a 50k lines file: thanks to the
+parentheses states saved every few lines, the time needed to indent a new
+line should not depend on its position in the file. Also check that these
+states are invalidated when the buffer is modified before them.
+"""
+
+import time
+import GPS
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_idle, record_time)
+
+NB_FUNCTIONS = 10000
+NB_KEYS = 10
+
+
+def generate(name):
+    with open(name, "w") as f:
+        for idx in range(NB_FUNCTIONS):
+            f.write("def function_%d(a, b):\n"
+                    "    x = call(a,\n"
+                    "             b)\n"
+                    "\n"
+                    "\n" % idx)
+
+
+def new_line(buf, line):
+    """Press enter at the end of line, return the new indentation"""
+    buf.main_cursor().move(buf.at(line, 1).end_of_line())
+    GPS.execute_action("Python Auto Indentation")
+    return buf.main_cursor().location().column() - 1
+
+
+def benchmark(buf, line):
+    # The first new line saves the parentheses states up to this line
+    gps_assert(new_line(buf, line), 13, "Wrong indentation in call")
+    start = time.time()
+    for _ in range(NB_KEYS):
+        gps_assert(new_line(buf, line), 13, "Wrong indentation in call")
+    return (time.time() - start) / NB_KEYS
+
+
+@run_test_driver
+def run_test():
+    generate("big.py")
+    buf = GPS.EditorBuffer.get(GPS.File("big.py"))
+    yield wait_idle()
+
+    # On the 'x = call(a,' lines, each benchmark adds NB_KEYS + 1 lines
+    shallow = benchmark(buf, 5 * 10 + 2)
+    deep = benchmark(buf, 5 * (NB_FUNCTIONS - 10) + 2 + NB_KEYS + 1)
+    GPS.Logger("TESTSUITE").log(
+        "new line: {0:.1f}ms at the top, {1:.1f}ms at the bottom".format(
+            shallow * 1000, deep * 1000))
+    gps_assert(deep < shallow * 5 + 0.01, True,
+               "Indentation depends on the position in the file")
+    record_time(deep)
+
+    # After the 'b)' line of the last function
+    last = 5 * (NB_FUNCTIONS - 1) + 3 + 2 * (NB_KEYS + 1)
+    gps_assert(new_line(buf, last), 4, "Wrong indentation after call")
+
+    # An unclosed bracket at the top of the file invalidates the states
+    buf.insert(buf.at(1, 1), "x = [\n")
+    gps_assert(new_line(buf, last + 1), 5,
+               "The parentheses states were not invalidated")
+    buf.close(force=True)
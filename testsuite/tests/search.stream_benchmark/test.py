@@ -0,0 +1,70 @@
+"""
+Benchmark GPS.Search.stream on a generated project with 5000 files, and
+check that it returns the results in batches, honors its limit and can
+be cancelled.
+"""
+
+import os
+import re
+import time
+import GPS
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_tasks, record_time)
+
+NB_FILES = 5000
+
+
+def generate_project():
+    os.mkdir("gen")
+    for idx in range(NB_FILES):
+        with open(os.path.join("gen", "pkg_%04d.ads" % idx), "w") as f:
+            f.write("package Pkg_%04d is\nend Pkg_%04d;\n" % (idx, idx))
+    with open("gen.gpr", "w") as f:
+        f.write('project Gen is\n   for Source_Dirs use ("gen");\n'
+                'end Gen;\n')
+
+
+def collect(stream):
+    results = []
+    batches = 0
+    while True:
+        batch = yield stream.next_batch()
+        if batch is None:
+            break
+        batches += 1
+        results.extend(batch)
+    yield (results, batches)
+
+
+@run_test_driver
+def run_test():
+    generate_project()
+    GPS.Project.load("gen.gpr")
+    yield wait_tasks()
+
+    start = time.time()
+    stream = GPS.Search.stream(GPS.Search.FILE_NAMES, "pkg_004")
+    results, batches = yield collect(stream)
+    total = time.time() - start
+
+    # Results highlight the matched text with markup
+    gps_assert(sorted(re.sub("<[^>]*>", "", r.short) for r in results),
+               ["pkg_%04d.ads" % idx for idx in range(40, 50)],
+               "Wrong results")
+    gps_assert(stream.finished, True, "The stream should be finished")
+    gps_assert(stream.stats[0].results, 10, "Wrong provider statistics")
+    gps_assert(batches >= 1, True, "Results should come in batches")
+
+    limited = GPS.Search.stream(GPS.Search.FILE_NAMES, "pkg_", limit=3)
+    results, _ = yield collect(limited)
+    gps_assert(len(results), 3, "The limit should be honored")
+
+    cancelled = GPS.Search.stream(GPS.Search.FILE_NAMES, "pkg_")
+    cancelled.cancel()
+    batch = yield cancelled.next_batch()
+    gps_assert(batch, None, "A cancelled search should have no results")
+
+    GPS.Logger("TESTSUITE").log(
+        "first result after {0:.3f}s, {1:.3f}s in total ({2})".format(
+            stream.first_result, total, stream.stats))
+    record_time(total)
@@ -0,0 +1,4 @@
+procedure Foo (X : in out Integer) is
+begin
+   X := X + 1;
+end Foo;
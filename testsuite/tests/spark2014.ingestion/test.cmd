@@ -0,0 +1,7 @@
+# The SPARK plugin is only loaded when gnatprove is on the PATH
+mkdir -p bin
+printf '#!/bin/sh\nexit 0\n' > bin/gnatprove
+chmod +x bin/gnatprove
+export PATH=`pwd`/bin:$PATH
+
+$GPS -Ptest --load=python:test.py
@@ -0,0 +1,63 @@
+"""
+Feed a large output to the GNATprove parser: the messages are created in
+time-budgeted batches, and all of them exist once on_exit has flushed the
+remaining lines. Also check that the .spark files are only parsed again
+when they are modified.
+"""
+
+import json
+import os
+import GPS
+import spark2014
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, timeout)
+
+NB_MESSAGES = 20000
+
+
+def count():
+    return len(GPS.Message.list(category=spark2014.messages_category))
+
+
+def write_spark_file(path, rule, mtime):
+    with open(path, "w") as f:
+        json.dump({"proof": [{"msg_id": 1, "rule": rule}]}, f)
+    os.utime(path, (mtime, mtime))
+
+
+@run_test_driver
+def run_test():
+    parser = spark2014.GNATprove_Parser(None)
+    output = "".join(
+        "foo.adb:3:%d: medium: overflow check might fail %d\n"
+        % (idx % 10 + 1, idx) for idx in range(NB_MESSAGES))
+
+    parser.on_stdout(output, None)
+    gps_assert(count(), 0, "The messages should be created in batches")
+
+    yield timeout(spark2014.ingestion_interval_ms * 5)
+    created = count()
+    gps_assert(0 < created < NB_MESSAGES, True,
+               "Only some of the messages should be created in a batch: %d"
+               % created)
+
+    parser.on_exit(0, None)
+    gps_assert(count(), NB_MESSAGES,
+               "All the messages should exist after on_exit")
+
+    # The .spark files are cached until their timestamp or size changes
+    spark_file = os.path.abspath("foo.spark")
+    write_spark_file(spark_file, "RULE_A", 1000000)
+    parser.parsejson("foo", spark_file)
+    gps_assert(parser.extra_info["foo", 1]["rule"], "RULE_A",
+               "Wrong extra info")
+
+    write_spark_file(spark_file, "RULE_B", 1000000)
+    parser.parsejson("foo", spark_file)
+    gps_assert(parser.extra_info["foo", 1]["rule"], "RULE_A",
+               "The unmodified .spark file should not be parsed again")
+
+    write_spark_file(spark_file, "RULE_B", 2000000)
+    parser.parsejson("foo", spark_file)
+    gps_assert(parser.extra_info["foo", 1]["rule"], "RULE_B",
+               "The modified .spark file should be parsed again")
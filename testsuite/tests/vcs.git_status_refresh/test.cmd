@@ -0,0 +1,20 @@
+which git > /dev/null 2>&1 || exit 99
+
+# Disable VCS and enable VCS2 explicitly
+GPS="$GPS --traceon=GPS.VCS.MODULE"
+
+init_repo() {
+  git init
+  git config user.email '<>'
+  git config user.name gps
+  echo 'project Prj is end Prj;' > prj.gpr
+  echo 'procedure A is begin null; end A;' > a.adb
+  echo 'procedure B is begin null; end B;' > b.adb
+  git add prj.gpr a.adb b.adb
+  git commit -m init
+  echo '--  modified' >> b.adb
+}
+
+init_repo > /dev/null 2>&1
+
+$GPS -P prj.gpr --load=python:test.py
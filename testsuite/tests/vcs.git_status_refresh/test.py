@@ -0,0 +1,35 @@
+"""
+Check that the git statuses are only sent to GPS when they change, except
+when the user forces a refresh: all the statuses are then sent again.
+"""
+
+import GPS
+from gs_utils.internal.utils import (
+    run_test_driver, gps_assert, wait_idle, timeout)
+
+
+@run_test_driver
+def run_test():
+    sent = []
+    set_file_status = GPS.VCS2._set_file_status
+
+    def spy(self, files, *args):
+        sent.extend(f.base_name() for f in files)
+        return set_file_status(self, files, *args)
+
+    GPS.VCS2._set_file_status = spy
+
+    # Wait for the statuses computed when the project was loaded
+    yield wait_idle()
+    yield timeout(1000)
+    vcs = GPS.VCS2.active_vcs()
+
+    del sent[:]
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    yield timeout(500)
+    gps_assert(sent, [], "Unchanged statuses were sent again")
+
+    yield vcs.async_fetch_status_for_all_files(from_user=True)
+    yield timeout(500)
+    gps_assert(sorted(sent), ["a.adb", "b.adb", "prj.gpr"],
+               "A refresh from the user should send every status")
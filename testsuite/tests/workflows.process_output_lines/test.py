@@ -0,0 +1,96 @@
+"""
+Benchmark splitting the output of a process into lines, with the
+ProcessWrapper output layer and with the previous implementation, which
+searched and copied the whole accumulated output for each line.
+Also check that all the lines of a real process are received.
+"""
+
+import re
+import time
+from gs_utils.internal.utils import run_test_driver, gps_assert, record_time
+from workflows.promises import ProcessWrapper, _Output_Buffer
+
+NB_LINES = 100000
+CHUNK_SIZE = 65536
+
+
+def chunks():
+    text = "".join("line %d of the output\n" % idx
+                   for idx in range(NB_LINES))
+    return [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
+
+
+def legacy_wait_lines(output):
+    """The previous wait_line: search and copy the whole output"""
+    pattern = re.compile("^.*\n", re.MULTILINE)
+    buffer = ""
+    result = []
+    for chunk in output:
+        buffer += chunk
+        while True:
+            p = pattern.search(buffer)
+            if not p:
+                break
+            buffer = buffer[p.end(0):]
+            result.append(p.group(0)[:-1])
+    return result
+
+
+def wait_lines(output):
+    buffer = _Output_Buffer()
+    result = []
+    for chunk in output:
+        buffer.append(chunk)
+        while True:
+            line = buffer.next_line()
+            if line is None:
+                break
+            result.append(line)
+    return result
+
+
+def lines_per_sec(func, output):
+    t = time.time()
+    result = func(output)
+    elapsed = time.time() - t
+    gps_assert(len(result), NB_LINES, "wrong number of lines")
+    gps_assert(result[-1], "line %d of the output" % (NB_LINES - 1),
+               "wrong last line")
+    return elapsed, NB_LINES / max(elapsed, 1e-6)
+
+
+@run_test_driver
+def run():
+    output = chunks()
+    _, legacy_rate = lines_per_sec(legacy_wait_lines, output)
+    elapsed, rate = lines_per_sec(wait_lines, output)
+
+    GPS.Logger("TESTSUITE").log(
+        "wait_line: {0:.0f} lines/s, previously {1:.0f} lines/s".format(
+            rate, legacy_rate))
+
+    cmd = ["python", "-c",
+           "for i in range(%d): print('line %%d' %% i)" % NB_LINES]
+
+    batches = []
+    t = time.time()
+    p = ProcessWrapper(cmd)
+    yield p.line_batches.subscribe(batches.append)
+    batches_time = time.time() - t
+
+    received = [line.rstrip('\r') for batch in batches for line in batch]
+    gps_assert(len(received), NB_LINES, "line_batches missed lines")
+    gps_assert(received[-1], "line %d" % (NB_LINES - 1),
+               "wrong last line from line_batches")
+
+    lines = []
+    t = time.time()
+    p = ProcessWrapper(cmd)
+    yield p.lines.subscribe(lines.append)
+    lines_time = time.time() - t
+    gps_assert(len(lines), NB_LINES, "lines missed lines")
+
+    GPS.Logger("TESTSUITE").log(
+        "{0} lines from a process: {1:.3f}s with line_batches,"
+        " {2:.3f}s with lines".format(NB_LINES, batches_time, lines_time))
+    record_time(elapsed + batches_time + lines_time)
@@ -0,0 +1,75 @@
+"""
+Check that workflows run long chains of already resolved promises without
+recursion, that task workflows run several steps per tick, and that
+cancelling a workflow executes the finally clauses of its generators.
+"""
+
+import time
+import workflows
+from gs_utils.internal.utils import run_test_driver, gps_assert, record_time
+from workflows.promises import Promise, timeout
+
+NB_STEPS = 100000
+
+
+def resolved(value):
+    p = Promise()
+    p.resolve(value)
+    return p
+
+
+def double(value):
+    yield value * 2
+
+
+def chain(task=None):
+    total = 0
+    for idx in range(NB_STEPS):
+        value = yield resolved(idx)
+        total += yield double(value)
+    yield total
+
+
+@run_test_driver
+def run():
+    t = time.time()
+    result = []
+    wf = workflows.driver(chain())
+    wf.then(result.append)
+    elapsed = time.time() - t
+    steps = wf.steps
+    gps_assert(result, [NB_STEPS * (NB_STEPS - 1)],
+               "the workflow should complete synchronously")
+
+    task = workflows.task_workflow("chain", chain)
+    while task.workflow.gen_stack:
+        yield timeout(100)
+    gps_assert(task.workflow.steps, steps,
+               "the task should execute the same steps")
+
+    log = []
+    pending = Promise()
+
+    def inner():
+        try:
+            yield pending
+            log.append("resumed")
+        finally:
+            log.append("inner")
+
+    def outer():
+        try:
+            yield inner()
+        finally:
+            log.append("outer")
+
+    wf = workflows.driver(outer())
+    wf.then(None, log.append)
+    wf.cancel()
+    pending.resolve(True)
+    gps_assert(log, ["inner", "outer", "cancelled"],
+               "cancel should close all the generators")
+
+    GPS.Logger("TESTSUITE").log(
+        "{0} steps in {1:.3f}s".format(steps, elapsed))
+    record_time(elapsed)